@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Admission control and per-stage concurrency limits.
+
+Two layers keep a traffic spike from turning into hundreds of simultaneous
+Azure OpenAI calls and pyodbc connections that all time out together:
+
+1. Request admission (endpoints): at most ADMISSION_MAX_ACTIVE pipeline runs
+   at once, up to ADMISSION_MAX_QUEUE more waiting for at most
+   ADMISSION_QUEUE_TIMEOUT_SECONDS. Anything beyond that is rejected at once
+   with AdmissionRejected, which the API turns into 429 + Retry-After.
+2. Stage limits (pipeline): each agent stage (planner, nl2sql, insights,
+   formatter) and the database stage (db) has its own semaphore, so a slow
+   stage queues its own work without starving the others.
+
+Queue depth, wait times and rejections are reported by stats().
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+DEFAULT_STAGE_LIMITS = {
+    "planner": 16,
+    "nl2sql": 16,
+    "insights": 16,
+    "formatter": 16,
+    "db": 8,
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when the server is saturated; retry_after is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Limiter:
+    """Semaphore with occupancy and wait-time counters (one semaphore per event loop)."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop_id = id(asyncio.get_running_loop())
+        with self._lock:
+            semaphore = self._semaphores.get(loop_id)
+            if semaphore is None:
+                semaphore = self._semaphores[loop_id] = asyncio.Semaphore(self.limit)
+            return semaphore
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns seconds spent waiting."""
+        semaphore = self._semaphore()
+        start = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return waited
+
+    def release(self):
+        with self._lock:
+            self.in_use -= 1
+        self._semaphore().release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_use": self.in_use,
+                "waiting": self.waiting,
+                "acquired": self.acquired,
+                "wait_avg_ms": round(self.wait_total / self.acquired * 1000, 1) if self.acquired else 0.0,
+                "wait_max_ms": round(self.wait_max * 1000, 1),
+            }
+
+
+class AdmissionTicket:
+    """An admitted request; release() exactly once when its run ends (extra calls are ignored)."""
+
+    def __init__(self, controller: "AdmissionController", waited: float):
+        self._controller = controller
+        self.waited = waited  # seconds spent in the admission queue
+        self._start = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._finish(time.perf_counter() - self._start)
+
+
+class AdmissionController:
+    """
+    Request admission queue plus per-stage semaphores (env overridable):
+
+        ADMISSION_MAX_ACTIVE             - concurrent pipeline runs (default 32)
+        ADMISSION_MAX_QUEUE              - requests allowed to wait for a run slot (default 64)
+        ADMISSION_QUEUE_TIMEOUT_SECONDS  - longest wait before a 429 (default 15)
+        STAGE_LIMIT_<STAGE>              - per-stage limits for PLANNER, NL2SQL, INSIGHTS,
+                                           FORMATTER (default 16) and DB (default 8)
+    """
+
+    def __init__(self):
+        self.max_queue = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+        self.queue_timeout = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "15"))
+        self._runs = _Limiter("pipeline", int(os.getenv("ADMISSION_MAX_ACTIVE", "32")))
+        self.stages = {
+            name: _Limiter(name, int(os.getenv(f"STAGE_LIMIT_{name.upper()}", str(default))))
+            for name, default in DEFAULT_STAGE_LIMITS.items()
+        }
+        self._lock = threading.Lock()
+        self._pending = 0  # admitted + queued, counted before any await so bursts can't overshoot
+        self._avg_run_seconds = 10.0  # EWMA of admitted run duration, seeds Retry-After
+        self._metrics = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+        }
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queue ahead of us drained at max_active per run time."""
+        ahead = max(self._pending - self._runs.limit, 0) + 1
+        return max(1, math.ceil(self._avg_run_seconds * ahead / self._runs.limit))
+
+    async def admit(self) -> AdmissionTicket:
+        """Take a run slot, waiting in the bounded queue; raises AdmissionRejected when saturated."""
+        runs = self._runs
+        with self._lock:
+            full = self._pending >= runs.limit + self.max_queue
+            if full:
+                self._metrics["rejected_queue_full"] += 1
+            else:
+                self._pending += 1
+        if full:
+            raise AdmissionRejected("queue full", self.retry_after())
+        try:
+            waited = await asyncio.wait_for(runs.acquire(), self.queue_timeout)
+        except BaseException as e:
+            with self._lock:
+                self._pending -= 1
+                if isinstance(e, asyncio.TimeoutError):
+                    self._metrics["rejected_timeout"] += 1
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("queue timeout", self.retry_after())
+            raise
+        with self._lock:
+            self._metrics["admitted"] += 1
+        return AdmissionTicket(self, waited)
+
+    def _finish(self, run_seconds: float):
+        with self._lock:
+            self._pending -= 1
+            self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * run_seconds
+        self._runs.release()
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        """Hold one slot of a stage's semaphore; yields the seconds spent queueing."""
+        limiter = self.stages[name]
+        waited = await limiter.acquire()
+        try:
+            yield waited
+        finally:
+            limiter.release()
+
+    def stats(self) -> Dict[str, Any]:
+        runs = self._runs.stats()
+        with self._lock:
+            return {
+                "active": runs["in_use"],
+                "max_active": runs["limit"],
+                "queued": runs["waiting"],
+                "max_queue": self.max_queue,
+                "queue_wait_avg_ms": runs["wait_avg_ms"],
+                "queue_wait_max_ms": runs["wait_max_ms"],
+                "avg_run_seconds": round(self._avg_run_seconds, 2),
+                **self._metrics,
+                "stages": {name: limiter.stats() for name, limiter in self.stages.items()},
+            }
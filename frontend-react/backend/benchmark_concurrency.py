@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the async request path.
+
+Fires N concurrent /api/query/stream (or /api/query) requests against a running
+backend while probing /api/health in the background. With a blocking pipeline
+the health probe stalls for the full duration of each multi-agent run; with the
+async pipeline it should stay in the low-millisecond range no matter how many
+conversations are in flight.
+
+--stubbed needs no server, Azure OpenAI or database: it builds the pipeline
+in-process with a fake AsyncOpenAI that answers every agent after a fixed
+latency and a fake execute_sql that sleeps in a worker thread (like pyodbc),
+then sweeps the number of concurrent requests. Each level runs twice: awaited
+as the endpoints do now, and through the blocking process_query wrappers
+called from the event loop, as the endpoints did before. It reports
+requests/s, p50/p95 latency and the worst event-loop lag (what /api/health
+would wait) for both.
+
+Usage:
+    python benchmark_concurrency.py --concurrency 20
+    python benchmark_concurrency.py --base http://localhost:8000 --endpoint query --concurrency 10
+    python benchmark_concurrency.py --stubbed
+    python benchmark_concurrency.py --stubbed --endpoint query --sweep 1,8,32,64 --scale 0.5
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+# Seconds per call in --stubbed mode (before --scale), roughly a low-reasoning model and the view
+STUB_LATENCY = {"planner": 0.8, "sql": 1.2, "insights": 1.5, "narrative": 2.0, "database": 0.3}
+STUB_SQL = "SELECT DISTINCT TOP 50 solutionName, orgName FROM dbo.vw_ISDSolution_All"
+STUB_ROWS = [(f"Solution {i}", f"Partner {i % 7}") for i in range(50)]
+
+DEFAULT_QUESTIONS = [
+    "Show me AI-powered solutions for healthcare and life sciences",
+    "What financial services solutions help with risk management?",
+    "Show me predictive maintenance solutions for manufacturing equipment",
+    "What solutions enhance customer experience in retail and consumer goods?",
+    "Show me cybersecurity solutions for defense and intelligence organizations",
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def run_query(client, base, endpoint, question, results):
+    """Run one query and record wall time (and time-to-first-event for SSE)."""
+    start = time.perf_counter()
+    first_event = None
+    ok = False
+    try:
+        if endpoint == "stream":
+            async with client.stream("POST", f"{base}/api/query/stream", json={"question": question}) as resp:
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    if first_event is None:
+                        first_event = time.perf_counter() - start
+                    event = json.loads(line[6:])
+                    if event.get("type") == "done":
+                        ok = True
+        else:
+            resp = await client.post(f"{base}/api/query", json={"question": question})
+            ok = resp.status_code == 200 and resp.json().get("success", False)
+    except Exception as e:
+        print(f"   ✗ {question[:50]}... failed: {e}")
+    results.append({
+        "ok": ok,
+        "elapsed": time.perf_counter() - start,
+        "first_event": first_event,
+    })
+
+
+async def probe_health(client, base, stop, latencies, interval):
+    """Poll /api/health until stop is set, recording each round-trip latency."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get(f"{base}/api/health")
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            latencies.append(float("inf"))
+        await asyncio.sleep(interval)
+
+
+class _StubUsage:
+    input_tokens = 1000
+    output_tokens = 200
+    total_tokens = 1200
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.id = f"resp_stub_{id(self)}"
+        self.output_text = text
+        self.output = []
+        self.usage = _StubUsage()
+
+
+class _StubEvent:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class _StubStream:
+    """The events a streamed Responses API call yields, a few tokens at a time."""
+
+    def __init__(self, text, delay):
+        self._text, self._delay = text, delay
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        words = self._text.split(" ")
+        for word in words:
+            await asyncio.sleep(self._delay / len(words))
+            yield _StubEvent(type="response.output_text.delta", delta=word + " ")
+        yield _StubEvent(type="response.completed", response=_StubResponse(self._text))
+
+    async def close(self):
+        pass
+
+
+def _stub_answer(kwargs):
+    """(agent, output_text) for a Responses API request from one of the four agents."""
+    text_format = kwargs.get("text", {}).get("format", {})
+    if text_format.get("name") == "query_plan":
+        return "planner", json.dumps({"intent": "query", "needs_new_query": True, "query_type": "specific",
+                                      "reasoning": "stub"})
+    if "Generate a SQL query" in str(kwargs.get("input", "")):
+        return "sql", json.dumps({"sql": STUB_SQL, "explanation": "stub", "confidence": "high"})
+    if text_format.get("type") == "json_object":
+        return "insights", json.dumps({"insights": {"overview": "stub", "key_findings": ["stub"], "patterns": [],
+                                                    "statistics": {}, "recommendations": []}, "confidence": "high"})
+    return "narrative", "## Solutions\n\n" + " ".join(f"Partner {i % 7} offers Solution {i}." for i in range(40))
+
+
+class _StubResponses:
+    def __init__(self, latency):
+        self._latency = latency
+
+    def create(self, **kwargs):
+        agent, text = _stub_answer(kwargs)
+        time.sleep(self._latency[agent])
+        return _StubResponse(text)
+
+
+class _AsyncStubResponses(_StubResponses):
+    async def create(self, **kwargs):
+        agent, text = _stub_answer(kwargs)
+        if kwargs.get("stream"):
+            return _StubStream(text, self._latency[agent])
+        await asyncio.sleep(self._latency[agent])
+        return _StubResponse(text)
+
+
+class StubOpenAI:
+    """OpenAI stand-in: each agent's call takes its fixed latency (time.sleep)."""
+
+    def __init__(self, latency):
+        self.responses = _StubResponses(latency)
+
+
+class StubAsyncOpenAI:
+    """AsyncOpenAI stand-in: each agent's call takes its fixed latency (asyncio.sleep)."""
+
+    def __init__(self, latency):
+        self.responses = _AsyncStubResponses(latency)
+
+
+def stub_pipeline(latency):
+    """A MultiAgentPipeline on the stub clients, with execute_sql sleeping in a worker thread like pyodbc."""
+    # Every request must reach every agent: no caches, templates or coalescing of the repeated questions
+    for name, value in (("SQL_CACHE_TTL_SECONDS", "0"), ("SEMANTIC_CACHE_ENABLED", "false"),
+                        ("TEMPLATE_ROUTER_ENABLED", "false"), ("COALESCE_REQUESTS", "false"),
+                        ("FACET_CUBE_ENABLED", "false"), ("SQL_LOCAL_REPLICA", "false")):
+        os.environ[name] = value
+    import multi_agent_pipeline
+    multi_agent_pipeline.openai_client = lambda: StubOpenAI(latency)
+    multi_agent_pipeline.async_openai_client = lambda: StubAsyncOpenAI(latency)
+    pipeline = multi_agent_pipeline.MultiAgentPipeline()
+    executor = pipeline.sql_executor
+    columns = ["solutionName", "orgName"]
+
+    def execute_sql(sql):
+        time.sleep(latency["database"])
+        return {"columns": columns, "rows": list(STUB_ROWS), "row_count": len(STUB_ROWS), "truncated": False,
+                "error": None}
+
+    async def execute_sql_stream_async(sql, batch_size=None, max_rows=None, timeout=None):
+        await asyncio.to_thread(time.sleep, latency["database"])
+        yield {"type": "columns", "columns": columns}
+        yield {"type": "rows", "rows": list(STUB_ROWS)}
+        yield {"type": "end", "row_count": len(STUB_ROWS), "truncated": False, "timed_out": False, "error": None}
+
+    executor.execute_sql = execute_sql
+    executor.execute_sql_stream_async = execute_sql_stream_async
+    return pipeline
+
+
+async def drive(handler, questions, interval):
+    """
+    Run handler(question, conversation_id) for every question at once.
+
+    Returns (wall, latencies, worst loop lag); latency counts from the moment all
+    requests arrived, so a request queued behind a blocked loop includes its wait.
+    """
+    latencies, lags = [], []
+    stop = asyncio.Event()
+
+    async def probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - start - interval)
+
+    async def timed(question, conversation_id):
+        await handler(question, conversation_id)
+        latencies.append(time.perf_counter() - start)
+
+    prober = asyncio.create_task(probe())
+    await asyncio.sleep(0)  # the probe is waiting before the first request starts
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(q, f"bench-{i}-{time.monotonic_ns()}") for i, q in enumerate(questions)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await prober
+    return wall, latencies, max(lags, default=0.0)
+
+
+async def run_stubbed(args):
+    latency = {agent: seconds * args.scale for agent, seconds in STUB_LATENCY.items()}
+    with contextlib.redirect_stdout(io.StringIO()):
+        pipeline = stub_pipeline(latency)
+    stream = args.endpoint == "stream"
+
+    async def awaited(question, conversation_id):
+        if stream:
+            async for _ in pipeline.process_query_stream_async(question, conversation_id):
+                pass
+        else:
+            await pipeline.process_query_async(question, conversation_id)
+
+    async def blocking(question, conversation_id):
+        # The old handlers: a synchronous pipeline run inside an async def holds the event loop
+        if stream:
+            for _ in pipeline.process_query_stream(question, conversation_id):
+                pass
+        else:
+            pipeline.process_query(question, conversation_id)
+
+    levels = [int(n) for n in args.sweep.split(",")]
+    run_seconds = sum(latency.values()) - latency["planner"]  # every request opens a conversation: no planner call
+    print("=" * 70)
+    print(f"STUBBED CONCURRENCY SWEEP — /api/{'query/stream' if stream else 'query'} in-process, "
+          f"one run ~{run_seconds:.2f}s of stub latency")
+    print("=" * 70)
+    print(f"\n  {'N':>4}  {'path':<9} {'req/s':>7} {'p50 s':>7} {'p95 s':>7}  {'loop lag max':>12}")
+    for n in levels:
+        questions = [DEFAULT_QUESTIONS[i % len(DEFAULT_QUESTIONS)] for i in range(n)]
+        for label, handler in (("async", awaited), ("blocking", blocking)):
+            with contextlib.redirect_stdout(io.StringIO()):  # the agents' progress lines
+                wall, latencies, lag = await drive(handler, questions, args.probe_interval)
+            print(f"  {n:>4}  {label:<9} {n / wall:7.2f} {percentile(latencies, 50):7.2f} "
+                  f"{percentile(latencies, 95):7.2f}  {lag * 1000:9.0f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=["stream", "query"], default="stream")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--probe-interval", type=float, default=0.25)
+    parser.add_argument("--stubbed", action="store_true", help="In-process run on stub LLM and database latencies")
+    parser.add_argument("--sweep", default="1,4,16,32", help="Concurrency levels for --stubbed")
+    parser.add_argument("--scale", type=float, default=0.25, help="Multiplier on the stub latencies for --stubbed")
+    args = parser.parse_args()
+
+    if args.stubbed:
+        await run_stubbed(args)
+        return
+
+    questions = [DEFAULT_QUESTIONS[i % len(DEFAULT_QUESTIONS)] for i in range(args.concurrency)]
+
+    print("=" * 70)
+    print(f"CONCURRENCY BENCHMARK — {args.concurrency} x /api/{'query/stream' if args.endpoint == 'stream' else 'query'}")
+    print("=" * 70)
+
+    results, health = [], []
+    stop = asyncio.Event()
+    timeout = httpx.Timeout(300.0, connect=10.0)
+    limits = httpx.Limits(max_connections=args.concurrency + 5)
+
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        prober = asyncio.create_task(probe_health(client, args.base, stop, health, args.probe_interval))
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(run_query(client, args.base, args.endpoint, q, results) for q in questions))
+        wall = time.perf_counter() - wall_start
+        stop.set()
+        await prober
+
+    elapsed = [r["elapsed"] for r in results]
+    first = [r["first_event"] for r in results if r["first_event"] is not None]
+    ok_count = sum(1 for r in results if r["ok"])
+    finite_health = [h for h in health if h != float("inf")]
+
+    print(f"\n  Completed:        {ok_count}/{len(results)} successful")
+    print(f"  Wall time:        {wall:.2f}s (sum of request times {sum(elapsed):.2f}s → overlap x{sum(elapsed) / wall if wall else 0:.1f})")
+    print(f"  Request latency:  p50 {percentile(elapsed, 50):.2f}s  p95 {percentile(elapsed, 95):.2f}s  max {max(elapsed, default=0):.2f}s")
+    if first:
+        print(f"  First SSE event:  p50 {percentile(first, 50) * 1000:.0f}ms  p95 {percentile(first, 95) * 1000:.0f}ms")
+    if finite_health:
+        print(f"  /api/health:      {len(finite_health)} probes  p50 {statistics.median(finite_health) * 1000:.1f}ms  "
+              f"p95 {percentile(finite_health, 95) * 1000:.1f}ms  max {max(finite_health) * 1000:.1f}ms")
+    if len(finite_health) < len(health):
+        print(f"  ⚠️  {len(health) - len(finite_health)} health probes failed")
+
+    # A blocked event loop shows up as health probes taking as long as a pipeline run
+    if finite_health and max(finite_health) > 1.0:
+        print("\n  ❌ Event loop stalled — /api/health waited on a pipeline run")
+        sys.exit(1)
+    print("\n  ✅ Event loop stayed responsive under load")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
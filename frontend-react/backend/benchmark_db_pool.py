@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Per-query connection overhead: fresh pyodbc.connect per query vs the pool.
+
+Runs the same small read-only query N times against the database in .env,
+once opening a new connection per query (the old execute_sql behaviour) and
+once through db_pool.ConnectionPool. It reports how long each query took to
+get a usable connection and the total time per query. With --threads the
+pooled run is repeated by several threads sharing one pool, which is how the
+backend uses it.
+
+Usage:
+    python benchmark_db_pool.py
+    python benchmark_db_pool.py --queries 50 --threads 8
+    python benchmark_db_pool.py --sql "SELECT TOP 10 solutionName FROM dbo.vw_ISDSolution_All"
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+from db_pool import ConnectionPool
+from nl2sql_pipeline import NL2SQLPipeline
+
+DEFAULT_SQL = "SELECT TOP 1 solutionName FROM dbo.vw_ISDSolution_All"
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def timed_query(get_connection, sql, samples):
+    """Run sql on a connection from get_connection; append (connect_s, total_s)."""
+    start = time.perf_counter()
+    conn = get_connection()
+    connected = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql)
+        cursor.fetchall()
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()  # pooled: returned to the pool
+    samples.append((connected - start, time.perf_counter() - start))
+
+
+def run(label, get_connection, sql, queries, threads=1):
+    samples = []
+
+    def worker(count):
+        for _ in range(count):
+            timed_query(get_connection, sql, samples)
+
+    start = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(queries // threads,)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    connect = [s[0] * 1000 for s in samples]
+    total = [s[1] * 1000 for s in samples]
+    print(f"  {label:<28} connect p50 {statistics.median(connect):7.1f} ms  p95 {percentile(connect, 95):7.1f} ms   "
+          f"query p50 {statistics.median(total):7.1f} ms  p95 {percentile(total, 95):7.1f} ms   "
+          f"{len(samples) / wall:6.1f} q/s")
+    return statistics.median(total)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=20, help="Queries per run")
+    parser.add_argument("--threads", type=int, default=4, help="Threads for the concurrent pooled run")
+    parser.add_argument("--sql", default=DEFAULT_SQL, help="Read-only query to run")
+    args = parser.parse_args()
+
+    executor = NL2SQLPipeline()
+    connect = executor._get_db_connection
+
+    print(f"\n{args.queries} x {args.sql!r}")
+    fresh = run("fresh connection per query", connect, args.sql, args.queries)
+
+    pool = ConnectionPool(connect, min_size=1)
+    pool.prewarm()
+    pooled = run("pooled (1 thread)", pool.acquire, args.sql, args.queries)
+    run(f"pooled ({args.threads} threads)", pool.acquire, args.sql, args.queries, threads=args.threads)
+
+    print(f"\nPer-query overhead saved: {fresh - pooled:.1f} ms (median, {fresh / pooled:.1f}x faster)")
+    print(f"Pool: {pool.stats()}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
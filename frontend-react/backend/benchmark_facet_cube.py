@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Facet cube: answer parity and latency against SQL on a SQLite stand-in.
+
+Builds the SQLite stand-in of dbo.vw_ISDSolution_All from benchmark_query_guard
+(synthetic rows, same row count as the real view by default), loads a
+facet_cube.FacetCube from it and runs the count statements the template router
+writes for its shapes, plus hand-written ones (IN lists, IS NOT NULL, filters
+on two columns, other orderings), on both:
+
+- parity: every statement must return the same rows as SQLite (with TOP, ties
+  on the count may keep different groups; only the counts are compared then)
+- latency: cube answers p50/p95 in microseconds, first (computed) and repeated
+  (memoized), against the same statement on SQLite
+- refresh: rows are added to and removed from the stand-in, the cube reloads
+  incrementally and parity is checked again
+
+--live loads the cube from the real view (needs .env) and compares its answers
+with Azure SQL. Exits with status 1 when any statement differs.
+
+Usage:
+    python benchmark_facet_cube.py
+    python benchmark_facet_cube.py --rows 50000
+    python benchmark_facet_cube.py --live
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+
+from benchmark_query_guard import VIEW, standin
+from benchmark_semantic_cache import percentile
+from benchmark_template_router import SHAPES
+from facet_cube import FacetCube, _parse
+from local_replica import translate
+from sql_tokens import limit_rows
+from template_router import TemplateRouter
+
+HANDWRITTEN = [
+    f"SELECT geoName, COUNT(DISTINCT solutionName) AS solution_count FROM {VIEW} "
+    "WHERE solutionStatus = 'Approved' AND geoName IN ('Canada', 'Germany', 'Japan') GROUP BY geoName "
+    "ORDER BY geoName",
+    f"SELECT COUNT(DISTINCT solutionName) AS n FROM {VIEW} "
+    "WHERE industryName = 'Healthcare & Life Sciences' AND geoName = 'United States'",
+    f"SELECT solutionAreaName, COUNT(DISTINCT solutionName) FROM {VIEW} "
+    "WHERE geoName = 'France' AND industryName = 'Financial Services' GROUP BY solutionAreaName "
+    "ORDER BY COUNT(DISTINCT solutionName) DESC, solutionAreaName",
+    f"SELECT TOP 5 v.orgName AS partner, COUNT(DISTINCT v.solutionName) AS solutions FROM {VIEW} v "
+    "WHERE v.industryName IS NOT NULL GROUP BY v.orgName ORDER BY solutions DESC",
+    f"SELECT subIndustryName, COUNT(DISTINCT solutionName) AS solution_count FROM {VIEW} "
+    "WHERE solutionAreaName = 'Security' GROUP BY subIndustryName ORDER BY solution_count ASC, subIndustryName",
+    f"SELECT COUNT(DISTINCT solutionName) FROM {VIEW}",
+]
+
+
+class _Borrowed:
+    """The stand-in connection without close(), so the cube can 'close' it after a load."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return self._conn.cursor()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        pass
+
+
+def corpus():
+    router = TemplateRouter(enabled=True)
+    routed = [router.route(question) for question in SHAPES]
+    return [result["sql"] for result in routed if result and result["template"] in ("count", "count_by")] + HANDWRITTEN
+
+
+def compare(cube, run_sql, statements):
+    """(identical, same counts under TOP, [different], [unanswered]) of the cube vs run_sql."""
+    identical, ties, different, unanswered = 0, 0, [], []
+    for sql in statements:
+        sql = limit_rows(sql, 10000)
+        with contextlib.redirect_stdout(io.StringIO()):  # the cube's per-answer line
+            answer = cube.execute(sql)
+        if answer is None:
+            unanswered.append(sql)
+            continue
+        expected = [tuple(row) for row in run_sql(sql)]
+        rows = [tuple(row) for row in answer["rows"]]
+        query = _parse(sql)
+        if rows == expected or (not query.order and sorted(rows, key=repr) == sorted(expected, key=repr)):
+            identical += 1
+        elif [row[-1] for row in rows] == [row[-1] for row in expected] and query.limit:
+            ties += 1
+        else:
+            different.append((sql, rows[:5], expected[:5]))
+    return identical, ties, different, unanswered
+
+
+def report(label, result):
+    identical, ties, different, unanswered = result
+    print(f"  {label}: {identical} identical, {ties} same counts under TOP (ties), {len(different)} different, "
+          f"{len(unanswered)} not answered by the cube")
+    for sql, rows, expected in different:
+        print(f"      DIFFERENT: {sql[:110]!r}\n        cube {rows}\n        SQL  {expected}")
+    for sql in unanswered:
+        print(f"      not answered: {sql[:110]!r}")
+    return not different and not unanswered
+
+
+def latency(run, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples), percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=4934, help="Rows in the stand-in view (default: the real view's)")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per statement for latency")
+    parser.add_argument("--live", action="store_true", help="Compare with the real view on Azure SQL")
+    args = parser.parse_args()
+
+    conn = standin(args.rows)
+    conn.commit()  # the cube's load ends with a rollback
+    cube = FacetCube(lambda: _Borrowed(conn), enabled=True)
+    start = time.perf_counter()
+    cube.load()
+    print(f"\nSQLite stand-in, {args.rows} rows: cube loaded in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({cube.stats()['solutions']} solutions, {cube.stats()['cells']} cells)")
+
+    def on_sqlite(sql):
+        return conn.execute(translate(sql)).fetchall()
+
+    statements = corpus()
+    ok = report("parity", compare(cube, on_sqlite, statements))
+
+    print("\n  cube first / repeated p50 (µs)   SQLite p50 (µs)   statement")
+    for sql in statements:
+        sql = limit_rows(sql, 10000)
+        query = _parse(sql)
+        if query is None:
+            continue
+        first = []
+        for _ in range(args.repeat):
+            cube._memo.clear()
+            begin = time.perf_counter()
+            cube._query(query.group, query.filters)
+            first.append((time.perf_counter() - begin) * 1e6)
+        repeated, _ = latency(lambda: cube._query(query.group, query.filters), args.repeat)
+        on_disk, _ = latency(lambda: on_sqlite(sql), max(5, args.repeat // 10))
+        print(f"  {statistics.median(first):10.1f} / {repeated:6.1f}   {on_disk:16.1f}   {sql[:70]!r}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        answered, _ = latency(lambda: cube.execute(limit_rows(statements[0], 10000)), args.repeat)
+    print(f"  execute() end to end (parse + memoized answer): p50 {answered:.1f} µs")
+
+    print("\nIncremental refresh:")
+    conn.execute(f"INSERT INTO {VIEW} SELECT solutionName || ' v2', orgName, industryName, subIndustryName, "
+                 f"solutionAreaName, solutionDescription, solutionStatus, 'Mexico' FROM {VIEW} WHERE rowid % 50 = 0")
+    conn.execute(f"DELETE FROM {VIEW} WHERE rowid % 70 = 1")
+    conn.execute(f"UPDATE {VIEW} SET solutionStatus = 'Retired' WHERE rowid % 90 = 2")
+    conn.commit()
+    start = time.perf_counter()
+    cube.load()
+    stats = cube.stats()
+    print(f"  reloaded in {(time.perf_counter() - start) * 1000:.1f} ms: +{stats['rows_added']} / "
+          f"-{stats['rows_removed']} rows, {stats['solutions']} solutions, {cube.stats()['cells']} cells")
+    ok = report("parity after refresh", compare(cube, on_sqlite, statements)) and ok
+
+    if args.live:
+        from nl2sql_pipeline import NL2SQLPipeline
+        pool = NL2SQLPipeline().db_pool
+        live = FacetCube(pool.acquire, enabled=True)
+        if not live.load():
+            sys.exit("Could not load the cube from the view")
+
+        def on_azure(sql):
+            with pool.acquire() as server:
+                cursor = server.cursor()
+                cursor.execute(sql)
+                return cursor.fetchall()
+        ok = report("parity with Azure SQL", compare(live, on_azure, statements)) and ok
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
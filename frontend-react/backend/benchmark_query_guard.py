@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Query guard: plan-cost verdicts and fetch budgets on a SQLite stand-in.
+
+Builds an in-memory SQLite copy of dbo.vw_ISDSolution_All's shape (synthetic
+rows, same row count as the real view by default) and runs query_guard over:
+
+- typical generated SQL and the template router's output -> should run
+- runaway statements (self-joins, cross joins) -> should be refused, or
+  rewritten with a smaller TOP when that brings the plan under the threshold
+
+It prints each statement's estimated cost and verdict, the estimate latency,
+the time the runaway statements actually take when run unguarded, and where
+a FetchBudget stops a wide result for a few SQL_MAX_RESULT_MB values.
+
+--live estimates the same statements on SQL Server (SHOWPLAN_XML, needs .env and
+SHOWPLAN permission), to calibrate SQL_MAX_PLAN_COST against real plans.
+
+Usage:
+    python benchmark_query_guard.py
+    python benchmark_query_guard.py --rows 50000 --max-cost 5
+    python benchmark_query_guard.py --live
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import sqlite3
+import statistics
+import time
+
+from benchmark_semantic_cache import percentile
+from benchmark_template_router import SHAPES
+from local_replica import translate
+from query_guard import FetchBudget, QueryGuard, showplan_estimate, sqlite_estimate
+from template_router import INDUSTRIES, SOLUTION_AREAS, TemplateRouter
+
+VIEW = "dbo.vw_ISDSolution_All"
+GEOS = ["United States", "Canada", "United Kingdom", "Germany", "France", "Japan", "Australia", "Brazil", "India"]
+
+TYPICAL = [
+    f"SELECT DISTINCT TOP 50 solutionName, orgName, industryName, solutionAreaName, solutionDescription FROM {VIEW} "
+    "WHERE industryName = 'Healthcare & Life Sciences' AND solutionAreaName = 'AI Business Solutions' "
+    "AND solutionStatus = 'Approved'",
+    f"SELECT industryName, COUNT(DISTINCT solutionName) as solution_count FROM {VIEW} "
+    "WHERE solutionStatus = 'Approved' GROUP BY industryName",
+    f"SELECT DISTINCT solutionName, orgName FROM {VIEW} WHERE (solutionDescription LIKE '%supply chain%' "
+    "OR solutionName LIKE '%supply chain%') AND solutionStatus = 'Approved'",
+    f"WITH ranked AS (SELECT orgName, COUNT(DISTINCT solutionName) AS n FROM {VIEW} GROUP BY orgName) "
+    "SELECT TOP 10 orgName, n FROM ranked ORDER BY n DESC",
+    f"SELECT DISTINCT TOP 50 solutionName, orgName FROM {VIEW} WHERE orgName IN "
+    f"(SELECT orgName FROM {VIEW} WHERE industryName = 'Retail & Consumer Goods')",
+]
+RUNAWAY = [
+    f"SELECT a.solutionName, b.solutionName FROM {VIEW} a JOIN {VIEW} b ON a.industryName = b.industryName",
+    f"SELECT a.orgName, COUNT(DISTINCT b.solutionName) FROM {VIEW} a CROSS JOIN {VIEW} b GROUP BY a.orgName",
+    f"SELECT a.solutionName FROM {VIEW} a, {VIEW} b WHERE a.solutionDescription LIKE b.orgName",
+    f"SELECT DISTINCT a.solutionName, b.geoName FROM {VIEW} a JOIN {VIEW} b ON a.orgName <> b.orgName",
+]
+
+
+def standin(rows, seed=7):
+    """In-memory SQLite database with a synthetic dbo.vw_ISDSolution_All (one row per solution x industry x geo)."""
+    rng = random.Random(seed)
+    industries = sorted(INDUSTRIES)
+    areas = sorted(SOLUTION_AREAS)
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute("ATTACH DATABASE ':memory:' AS dbo")
+    conn.execute("CREATE TABLE dbo.vw_ISDSolution_All (solutionName TEXT, orgName TEXT, industryName TEXT, "
+                 "subIndustryName TEXT, solutionAreaName TEXT, solutionDescription TEXT, solutionStatus TEXT, "
+                 "geoName TEXT)")
+    data = []
+    solution = 0
+    while len(data) < rows:
+        name, org = f"Solution {solution}", f"Partner {solution % max(1, rows // 25)}"
+        description = " ".join(rng.choice(("supply chain", "patient", "analytics", "copilot", "security",
+                                           "cloud migration", "fraud", "retail media", "grid")) for _ in range(30))
+        area = rng.choice(areas)
+        for industry in rng.sample(industries, rng.randint(1, 3)):
+            for geo in rng.sample(GEOS, rng.randint(1, 3)):
+                data.append((name, org, industry, f"{industry} (sub)", area, description, "Approved", geo))
+        solution += 1
+    conn.executemany("INSERT INTO dbo.vw_ISDSolution_All VALUES (?, ?, ?, ?, ?, ?, ?, ?)", data[:rows])
+    return conn
+
+
+def timed_estimate(guard, conn, sql, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        guard.estimate(conn, sql)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), percentile(samples, 95)
+
+
+def run_unguarded(conn, sql, limit_seconds=5.0):
+    """Seconds the statement takes on the stand-in (interrupted at limit_seconds)."""
+    deadline = time.perf_counter() + limit_seconds
+    conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+    start = time.perf_counter()
+    try:
+        conn.execute(translate(sql)).fetchall()
+    except sqlite3.OperationalError:
+        pass  # interrupted
+    finally:
+        conn.set_progress_handler(None, 0)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=4934, help="Rows in the stand-in view (default: the real view's)")
+    parser.add_argument("--max-cost", type=float, default=10.0, help="SQL_MAX_PLAN_COST to evaluate")
+    parser.add_argument("--live", action="store_true", help="Also estimate on SQL Server (SHOWPLAN_XML)")
+    args = parser.parse_args()
+
+    conn = standin(args.rows)
+    router = TemplateRouter(enabled=True)
+    templated = [result["sql"] for result in map(router.route, SHAPES) if result]
+    corpus = [(sql, True) for sql in TYPICAL + templated] + [(sql, False) for sql in RUNAWAY]
+
+    print(f"\nSQLite stand-in, {args.rows} rows, SQL_MAX_PLAN_COST={args.max_cost:g}")
+    for mode in ("reject", "rewrite"):
+        guard = QueryGuard(sqlite_estimate, mode=mode, max_cost=args.max_cost, rewrite_rows=500)
+        with contextlib.redirect_stdout(io.StringIO()):  # the guard's own refusal messages
+            verdicts = [(sql, should_run, guard.check(conn, sql)) for sql, should_run in corpus]
+        wrong = [(sql, should_run) for sql, should_run, verdict in verdicts
+                 if (verdict.sql is not None and not verdict.rewritten) != should_run]
+        stats = guard.stats()
+        print(f"  {mode:<8} {len(corpus) - len(wrong)}/{len(corpus)} as expected   refused {stats['rejected']}, "
+              f"rewritten {stats['rewritten']}, estimate avg {stats['avg_estimate_ms']} ms")
+        for sql, should_run in wrong:
+            print(f"      {'refused' if should_run else 'RAN'}: {sql[:100]!r}")
+
+    guard = QueryGuard(sqlite_estimate, max_cost=args.max_cost)
+    print("\n  estimated cost  estimate p50/p95   unguarded run   statement")
+    for sql, should_run in corpus[:len(TYPICAL)] + corpus[-len(RUNAWAY):]:
+        estimate = guard.estimate(conn, sql)
+        p50, p95 = timed_estimate(guard, conn, sql)
+        seconds = run_unguarded(conn, sql)
+        ran = f"{seconds:8.3f}s" + ("+" if seconds >= 5.0 else " ")
+        print(f"  {estimate.cost:14.2f}  {p50:6.2f}/{p95:5.2f} ms   {ran:>14}   {sql[:70]}")
+
+    print("\nFetch budget on a wide result (SELECT * of the whole view):")
+    for megabytes in (32, 1, 0.25):
+        cursor = conn.execute(f"SELECT * FROM {VIEW}")
+        budget = FetchBudget(10000, int(megabytes * 1024 * 1024))
+        rows = []
+        while budget.stopped is None:
+            batch = cursor.fetchmany(budget.next_size(1000))
+            if not batch:
+                break
+            rows.extend(budget.take(batch))
+        print(f"  SQL_MAX_RESULT_MB={megabytes:<5g} {len(rows):>6} rows, ~{budget.bytes / 1048576:.2f} MB, "
+              f"stopped: {budget.stopped or 'no'}")
+
+    if args.live:
+        from nl2sql_pipeline import NL2SQLPipeline
+        pool = NL2SQLPipeline().db_pool
+        live = QueryGuard(showplan_estimate, max_cost=args.max_cost)
+        print("\nSQL Server estimated subtree cost:")
+        with pool.acquire() as server:
+            for sql, _ in corpus:
+                try:
+                    estimate = live.estimate(server, sql)
+                    print(f"  {estimate.cost:10.3f}  ~{estimate.rows:>10,.0f} rows   {sql[:70]}")
+                except Exception as e:
+                    print(f"  {'error':>10}  {str(e)[:40]}   {sql[:70]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for row cleaning on large result sets.
+
+Compares the previous per-cell cleaning loop (column lookup by name, fallback
+to columns.index(), uncompiled regexes, keyword scan per cell) against the
+compiled column plan in row_cleaning.py. Rows are synthetic but shaped like
+vw_ISDSolution_All: each solution's HTML description is repeated across its
+industry/geo rows, and some fields are NULL.
+
+Usage:
+    python benchmark_row_cleaning.py
+    python benchmark_row_cleaning.py --rows 5000 --repeat 5
+"""
+
+import argparse
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+import row_cleaning
+from row_cleaning import clean_rows
+
+COLUMNS = [
+    'industryName', 'solutionName', 'orgName', 'solutionAreaName',
+    'geoName', 'marketPlaceLink', 'solutionCreatedDate', 'solutionDescription'
+]
+INDUSTRIES = [
+    "Healthcare & Life Sciences", "Financial Services", "Defense & Intelligence",
+    "Manufacturing & Mobility", "Retail & Consumer Goods", "Government", None
+]
+GEOS = ["United States", "Canada", "United Kingdom", "Germany", "Japan", None]
+
+
+def make_rows(count, seed=42):
+    """Synthetic rows; ~15 rows per solution so descriptions repeat like in the view."""
+    rng = random.Random(seed)
+    base_date = datetime(2023, 1, 1)
+    rows = []
+    solutions = max(1, count // 15)
+    for i in range(count):
+        sol = i % solutions
+        description = (
+            f"<p><strong>Solution {sol}</strong> delivers <em>AI-powered</em> insights "
+            f"for regulated industries.</p>\n<ul><li>Fast deployment</li>"
+            f"<li>Azure native</li><li>Partner {sol % 97}</li></ul>" * 3
+        )
+        rows.append((
+            rng.choice(INDUSTRIES),
+            f"Solution {sol}",
+            f"Partner {sol % 97}",
+            "AI Business Solutions",
+            rng.choice(GEOS),
+            f"https://marketplace.microsoft.com/solution-{sol}",
+            base_date + timedelta(days=sol),
+            description,
+        ))
+    return rows
+
+
+def legacy_strip_html(text):
+    if text is None or text == "(Not Set)":
+        return text
+    clean = re.compile('<.*?>')
+    text_without_tags = re.sub(clean, '', str(text))
+    text_without_tags = re.sub(r'\s+', ' ', text_without_tags)
+    return text_without_tags.strip()
+
+
+def legacy_clean_rows(columns, rows):
+    """The loop previously duplicated in main.py (execute_query and stream_query)."""
+    html_columns = [
+        'solutionDescription', 'industryDescription', 'SubIndustryDescription',
+        'solAreaDescription', 'orgDescription', 'areaSolutionDescription',
+        'industryThemeDesc', 'solutionPlayDesc', 'resourceLinkDescription',
+        'THEME', 'DESCRIPTION', 'DESC', 'SOLUTION_DESCRIPTION'
+    ]
+    cleaned = []
+    for row in rows:
+        row_dict = {}
+        for col in columns:
+            try:
+                value = row[col]
+            except (KeyError, TypeError):
+                idx = columns.index(col)
+                value = row[idx]
+            if value is None:
+                row_dict[col] = "(Not Set)"
+            elif hasattr(value, 'isoformat'):
+                row_dict[col] = value.isoformat()
+            else:
+                str_value = str(value) if value != "NULL" else "(Not Set)"
+                col_lower = col.lower()
+                if (col in html_columns or
+                    any(kw in col_lower for kw in ['desc', 'description', 'theme'])):
+                    str_value = legacy_strip_html(str_value)
+                row_dict[col] = str_value
+        cleaned.append(row_dict)
+    return cleaned
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row cleaning micro-benchmark")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+
+    print("=" * 70)
+    print(f"ROW CLEANING BENCHMARK — {args.rows} rows x {len(COLUMNS)} columns (best of {args.repeat})")
+    print("=" * 70)
+
+    legacy_time, legacy_result = best_of(lambda: legacy_clean_rows(COLUMNS, rows), args.repeat)
+
+    # First call pays for the memo misses; later calls are what a busy server sees
+    row_cleaning._strip_html_cached.cache_clear()
+    start = time.perf_counter()
+    cold_result = clean_rows(COLUMNS, rows)
+    cold_time = time.perf_counter() - start
+    warm_time, warm_result = best_of(lambda: clean_rows(COLUMNS, rows), args.repeat)
+
+    assert legacy_result == cold_result == warm_result, "compiled plan output differs from legacy cleaning"
+
+    cache = row_cleaning.cache_info()
+    print(f"\n  Legacy per-cell loop:     {legacy_time * 1000:8.1f}ms")
+    print(f"  Compiled plan (cold):     {cold_time * 1000:8.1f}ms  (x{legacy_time / cold_time:.1f})")
+    print(f"  Compiled plan (warm):     {warm_time * 1000:8.1f}ms  (x{legacy_time / warm_time:.1f})")
+    print(f"  HTML memo:                {cache['size']} entries, {cache['hits']} hits / {cache['misses']} misses")
+    print("\n  ✅ Output identical to legacy cleaning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Precision / recall / latency of the semantic question -> SQL cache.
+
+Questions come from docs/SAMPLE_QUESTIONS.md and the test names in
+test_queries.py. Each distinct question is stored with a unique fake SQL, then:
+
+- paraphrases (reordered, with or without "Show me", "... for <industry>" moved
+  to the front, etc.) should hit their own question   -> recall
+- every original question, looked up with itself left out, should miss — a hit
+  there reuses another question's SQL                 -> false hits
+- the question moved to another industry ("... for retail" instead of
+  "... for healthcare") must not reuse the original's SQL -> contrast hits
+- precision = correct hits / all hits over both sets
+
+Run offline with the local embedder (default), or against the Azure embeddings
+deployment with --embedder azure (needs .env and SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT).
+--generate N also times N real generate_sql calls, for the latency a hit saves.
+
+Usage:
+    python benchmark_semantic_cache.py
+    python benchmark_semantic_cache.py --thresholds 0.8 0.85 0.9 --show-misses
+    python benchmark_semantic_cache.py --embedder azure --generate 3
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import time
+
+from semantic_cache import LocalEmbedder, SemanticCache, normalize_question, signature
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_QUESTIONS = os.path.join(HERE, "..", "..", "docs", "SAMPLE_QUESTIONS.md")
+TEST_QUERIES = os.path.join(HERE, "test_queries.py")
+INDUSTRIES = ["healthcare", "retail", "manufacturing", "financial services", "government",
+              "education", "energy", "defense", "media", "telecommunications"]
+
+
+def load_questions():
+    """Distinct questions (by normalized form) from the sample-questions doc and test_queries.py."""
+    questions = []
+    with open(SAMPLE_QUESTIONS, encoding="utf-8") as f:
+        questions += [line[2:].strip() for line in f if line.startswith("- ")]
+    with open(TEST_QUERIES, encoding="utf-8") as f:
+        questions += re.findall(r'test_query\(\s*"([^"]+)"', f.read())
+    seen, distinct = set(), []
+    for question in questions:
+        key = normalize_question(question)
+        if key and key not in seen:
+            seen.add(key)
+            distinct.append(question)
+    return distinct
+
+
+def paraphrases(question):
+    """Deterministic rewrites that keep the meaning of question."""
+    q = question.rstrip("?").strip()
+    lower = q[0].lower() + q[1:]
+    variants = []
+    if lower.startswith("show me "):
+        variants.append(q[8:])
+    else:
+        variants.append(f"Show me {lower}")
+    match = re.match(r"^(?:show me |what )?(.+?) solutions? for (.+)$", lower)
+    if match:
+        variants.append(f"{match.group(2)} {match.group(1)} solutions")
+    else:
+        match = re.match(r"^(?:show me )?(.+?) for (.+)$", lower)
+        if match:
+            variants.append(f"{match.group(2)} {match.group(1)}")
+    match = re.match(r"^what solutions (help with|improve|support|enhance) (.+)$", lower)
+    if match:
+        variants.append(f"solutions that {match.group(1)} {match.group(2)}")
+    match = re.match(r"^(?:show me )?ai-powered (.+)$", lower)
+    if match:
+        variants.append(f"{match.group(1)} that use artificial intelligence")
+    match = re.match(r"^what solutions (improve|help with) (.+)$", lower)
+    if match:
+        variants.append(f"solutions for improving {match.group(2)}" if match.group(1) == "improve"
+                        else f"solutions that assist with {match.group(2)}")
+    variants.append(f"Can you list {lower}?")
+    return [v for v in dict.fromkeys(variants) if normalize_question(v) != normalize_question(question)][:4]
+
+
+def contrasts(question):
+    """Same question about a different industry — must not reuse question's SQL."""
+    lower = question.rstrip("?").lower()
+    implied = signature(normalize_question(lower))[2]
+    start = len(lower) % len(INDUSTRIES)
+    other = next(industry for industry in INDUSTRIES[start:] + INDUSTRIES[:start]
+                 if not signature(industry)[2] & implied)
+    for industry in INDUSTRIES:
+        if industry in lower:
+            return [lower.replace(industry, other)]
+    return [f"{lower} for {other}"]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile (values need not be sorted)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+async def seeded_cache(embedder, threshold, questions, skip=None):
+    cache = SemanticCache(embedder, threshold=threshold, max_entries=len(questions) + 1, enabled=True)
+    for index, question in enumerate(questions):
+        if index != skip:
+            probe = await cache.lookup(question)
+            probe.entry = None  # store even if a near-duplicate is already present
+            probe.similarity = 0.0
+            cache.add(probe, {"sql": f"-- q{index}"})
+    return cache
+
+
+async def evaluate(embedder, threshold, questions, show_misses=False):
+    cache = await seeded_cache(embedder, threshold, questions)
+    correct = wrong = missed = total = 0
+    latencies = []
+    for index, question in enumerate(questions):
+        for variant in paraphrases(question):
+            total += 1
+            probe = await cache.lookup(variant)
+            latencies.append(probe.seconds * 1000)
+            if not probe.hit:
+                missed += 1
+                if show_misses:
+                    print(f"      miss  {variant!r} -> {question!r} (best {probe.similarity:.2f})")
+            elif probe.entry.sql_result["sql"] == f"-- q{index}":
+                correct += 1
+            else:
+                wrong += 1
+                if show_misses:
+                    print(f"      WRONG {variant!r} -> {probe.entry.question!r} ({probe.similarity:.2f})")
+
+    contrast_hits = 0
+    for index, question in enumerate(questions):
+        for variant in contrasts(question):
+            probe = await cache.lookup(variant)
+            if probe.hit and probe.entry.sql_result["sql"] == f"-- q{index}":
+                contrast_hits += 1
+                if show_misses:
+                    print(f"      FALSE {variant!r} -> {question!r} ({probe.similarity:.2f})")
+
+    false_hits = 0
+    for index, question in enumerate(questions):
+        held_out = await seeded_cache(embedder, threshold, questions, skip=index)
+        probe = await held_out.lookup(question)
+        if probe.hit:
+            false_hits += 1
+            if show_misses:
+                print(f"      FALSE {question!r} -> {probe.entry.question!r} ({probe.similarity:.2f})")
+
+    hits = correct + wrong + false_hits + contrast_hits
+    return {
+        "precision": correct / hits if hits else 1.0,
+        "recall": correct / total if total else 0.0,
+        "false_hits": false_hits,
+        "contrast_hits": contrast_hits,
+        "paraphrases": total,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+async def time_generation(count, questions):
+    from nl2sql_pipeline import NL2SQLPipeline
+    from llm_transport import async_openai_client
+
+    executor = NL2SQLPipeline(async_llm_client=async_openai_client())
+    samples = []
+    for question in questions[:count]:
+        start = time.perf_counter()
+        await executor.generate_sql_async(question)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", choices=("local", "azure"), default="local")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.75, 0.8, 0.85, 0.9, 0.92, 0.95])
+    parser.add_argument("--show-misses", action="store_true", help="Print misses and wrong hits")
+    parser.add_argument("--generate", type=int, default=0, help="Also time N real generate_sql calls")
+    args = parser.parse_args()
+
+    if args.embedder == "azure":
+        from dotenv import load_dotenv
+        load_dotenv()
+        from semantic_cache import AzureEmbedder, EMBEDDING_DEPLOYMENT
+        from llm_transport import async_openai_client
+        embedder = AzureEmbedder(async_openai_client(), os.getenv("SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT", EMBEDDING_DEPLOYMENT))
+    else:
+        embedder = LocalEmbedder()
+
+    questions = load_questions()
+    print(f"\n{len(questions)} distinct questions, embedder {embedder.name}")
+    print(f"  {'threshold':>9}  {'precision':>9}  {'recall':>7}  {'false hits':>10}  {'contrast hits':>13}  "
+          f"{'lookup p50':>10}  {'p95':>8}")
+    for threshold in args.thresholds:
+        result = await evaluate(embedder, threshold, questions, args.show_misses)
+        print(f"  {threshold:>9.2f}  {result['precision']:>9.1%}  {result['recall']:>7.1%}  "
+              f"{result['false_hits']:>4}/{len(questions):<5}  {result['contrast_hits']:>7}/{len(questions):<5}  "
+              f"{result['p50_ms']:>8.2f}ms  {result['p95_ms']:>6.2f}ms")
+
+    if args.generate:
+        samples = await time_generation(args.generate, questions)
+        print(f"\ngenerate_sql (what a hit skips): p50 {statistics.median(samples):.0f} ms, "
+              f"max {max(samples):.0f} ms over {len(samples)} calls")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Bytes-on-wire and CPU per request for the response serialization path.
+
+For a /api/query response and the SSE metadata event (both row-dict and
+columnar formats) this measures:
+    - serialize CPU: stdlib json.dumps(default=str) vs orjson (if installed)
+    - bytes on wire and compress CPU for identity / gzip / br (if installed)
+
+Rows are the same synthetic vw_ISDSolution_All-shaped rows used by
+benchmark_row_cleaning.py.
+
+Usage:
+    python benchmark_serialization.py
+    python benchmark_serialization.py --rows 50 500 5000 --repeat 20
+"""
+
+import argparse
+import json
+import time
+import zlib
+
+import serialization
+from benchmark_row_cleaning import COLUMNS, make_rows
+from row_cleaning import clean_columnar, clean_rows
+
+
+def cpu_ms(fn, repeat):
+    """Best-of CPU time (process_time) of fn in milliseconds, plus its result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.process_time()
+        result = fn()
+        best = min(best, time.process_time() - start)
+    return best * 1000, result
+
+
+def payloads(row_count):
+    raw = make_rows(row_count)
+    insights = {
+        "overview": "Healthcare leads with AI-powered clinical solutions. " * 4,
+        "key_findings": [f"Finding {i}: partners concentrate on data platforms." for i in range(5)],
+        "recommendations": [f"Recommendation {i}" for i in range(3)],
+    }
+    query_response = {
+        "success": True, "question": "Show me AI solutions for healthcare",
+        "narrative": "## Overview\n" + "Insightful narrative text. " * 80,
+        "insights": insights, "sql": "SELECT DISTINCT TOP 50 ...", "confidence": "high",
+        "columns": COLUMNS, "rows": clean_rows(COLUMNS, raw), "row_count": row_count,
+        "usage_stats": {"prompt_tokens": 9000, "completion_tokens": 1500, "total_tokens": 10500},
+        "elapsed_time": 12.3, "timestamp": "2026-02-16T10:00:00",
+    }
+    metadata = {
+        "type": "metadata", "success": True, "insights": insights,
+        "data": {"columns": COLUMNS, "rows": clean_rows(COLUMNS, raw)},
+        "timestamp": "2026-02-16T10:00:00",
+    }
+    metadata_columnar = dict(metadata, data=clean_columnar(COLUMNS, raw), format="columnar")
+    return [("/api/query", query_response), ("SSE metadata", metadata), ("SSE metadata columnar", metadata_columnar)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serializer + compression benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    encodings = ["identity"] + serialization.available_encodings()
+
+    print("=" * 86)
+    print(f"SERIALIZATION BENCHMARK — serializer: {serialization.SERIALIZER}, encodings: {', '.join(encodings)}")
+    print("=" * 86)
+    if serialization.orjson is None:
+        print("  (orjson not installed — fast path shown equals stdlib)")
+    if serialization.brotli is None:
+        print("  (brotli not installed — br skipped)")
+
+    for count in args.rows:
+        print(f"\n  {count} rows")
+        print(f"  {'payload':<24} {'stdlib ms':>9} {'fast ms':>8}  " +
+              "  ".join(f"{enc + ' KB/ms':>16}" for enc in encodings))
+        for name, payload in payloads(count):
+            stdlib_ms, stdlib_body = cpu_ms(lambda: json.dumps(payload, default=str).encode("utf-8"), args.repeat)
+            fast_ms, body = cpu_ms(lambda: serialization.dumps(payload), args.repeat)
+            assert json.loads(body) == json.loads(stdlib_body), "serializers disagree"
+
+            cells = []
+            for enc in encodings:
+                if enc == "identity":
+                    size, enc_ms = len(body), 0.0
+                else:
+                    enc_ms, compressed = cpu_ms(lambda: serialization.compress(body, enc), args.repeat)
+                    size = len(compressed)
+                    if enc == "gzip":
+                        assert zlib.decompress(compressed, 31) == body
+                cells.append(f"{size / 1024:>8.1f} / {enc_ms:<5.1f}")
+            print(f"  {name:<24} {stdlib_ms:>9.2f} {fast_ms:>8.2f}  " + "  ".join(f"{c:>16}" for c in cells))
+
+    print("\n  KB = bytes on wire, ms = CPU per request (best of repeats)")
+
+
+if __name__ == "__main__":
+    main()
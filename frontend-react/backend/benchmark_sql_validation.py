@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+SQL validation: the old per-keyword regex layers vs the single-pass tokenizer.
+
+Runs both validators over a corpus of statements with a known verdict: typical
+generated queries, the template router's output, and hostile or awkward cases
+(keywords inside strings / identifiers / comments, SELECT ... INTO, batches,
+unterminated literals). It reports time per call, every statement a validator
+gets wrong, and what limit_rows() does to the row cap.
+
+Usage:
+    python benchmark_sql_validation.py
+    python benchmark_sql_validation.py --iterations 20000
+"""
+
+import argparse
+import re
+import time
+
+from benchmark_template_router import SHAPES
+from sql_tokens import limit_rows, validate
+from template_router import TemplateRouter
+
+SAFE = [
+    "SELECT DISTINCT TOP 50 solutionName, orgName, industryName, solutionAreaName, solutionDescription\n"
+    "FROM dbo.vw_ISDSolution_All\nWHERE industryName = 'Healthcare & Life Sciences'\n"
+    "  AND solutionAreaName = 'AI Business Solutions'\n  AND solutionStatus = 'Approved'",
+    "SELECT industryName, COUNT(DISTINCT solutionName) as solution_count FROM dbo.vw_ISDSolution_All "
+    "WHERE solutionStatus = 'Approved' GROUP BY industryName",
+    "SELECT DISTINCT solutionName, orgName FROM dbo.vw_ISDSolution_All "
+    "WHERE (solutionDescription LIKE '%supply chain%' OR solutionName LIKE '%supply chain%') AND solutionStatus = 'Approved'",
+    "WITH ranked AS (SELECT orgName, COUNT(DISTINCT solutionName) AS n FROM dbo.vw_ISDSolution_All GROUP BY orgName) "
+    "SELECT TOP 10 orgName, n FROM ranked ORDER BY n DESC",
+    # Blocked words only inside literals, identifiers or comments
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All WHERE solutionDescription LIKE '%update%'",
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All WHERE solutionName LIKE '%Delete%Protection%'",
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All WHERE solutionDescription LIKE '%create value%'",
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All WHERE solutionDescription LIKE '%execute%strategy%'",
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All WHERE solutionDescription LIKE '%commitment%'",
+    "SELECT DISTINCT TOP 50 solutionName, [Drop Date] FROM dbo.vw_ISDSolution_All",
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All -- excludes drafts; never INSERT here",
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All WHERE orgName = 'Merge Healthcare'",
+    "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All WHERE solutionName LIKE '%Rollback%'",
+]
+BLOCKED = [
+    "DROP TABLE dbo.partnerSolution",
+    "SELECT * INTO dbo.copy FROM dbo.vw_ISDSolution_All",
+    "SELECT 1; DELETE FROM dbo.partnerSolution",
+    "select * from dbo.vw_ISDSolution_All;update dbo.partnerSolution set IsPublished = 0",
+    "EXEC sp_configure 'show advanced options', 1",
+    "sp_who",
+    "SELECT * FROM OPENROWSET('SQLNCLI', 'Server=x;Trusted_Connection=yes;', 'SELECT 1')",
+    "SELECT @@VERSION",
+    "DECLARE @x INT; SELECT @x",
+    "SELECT * FROM dbo.vw_ISDSolution_All WAITFOR DELAY '00:00:10'",
+    "SELECT * FROM #scratch",
+    "WITH c AS (SELECT solutionName FROM dbo.vw_ISDSolution_All) DELETE FROM c",
+    "SELECT solutionName FROM dbo.vw_ISDSolution_All WHERE orgName = 'x",
+    "SELECT 1 /* GRANT",
+    "GRANT SELECT ON dbo.partnerSolution TO public",
+    "",
+]
+
+
+def legacy_validate(sql):
+    """The previous validate_sql: one regex per blocked keyword plus substring checks (without printing)."""
+    sql_upper = sql.upper()
+    for keyword in ['INSERT', 'UPDATE', 'DELETE', 'MERGE']:
+        if re.search(r'\b' + keyword + r'\b', sql_upper):
+            return False
+    for keyword in ['DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'RENAME']:
+        if re.search(r'\b' + keyword + r'\b', sql_upper):
+            return False
+    for keyword in ['EXEC', 'EXECUTE', 'SP_', 'XP_']:
+        if re.search(r'\b' + keyword + r'\b', sql_upper):
+            return False
+    for keyword in ['BEGIN TRAN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT']:
+        if keyword in sql_upper:
+            return False
+    if not sql_upper.strip().startswith('SELECT') and not sql_upper.strip().startswith('WITH'):
+        return False
+    return True
+
+
+def time_per_call(check, statements, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for sql in statements:
+            check(sql)
+    return (time.perf_counter() - start) / (iterations * len(statements)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    router = TemplateRouter(enabled=True)
+    templated = [result["sql"] for result in map(router.route, SHAPES) if result]
+    corpus = [(sql, True) for sql in SAFE + templated] + [(sql, False) for sql in BLOCKED]
+    statements = [sql for sql, _ in corpus]
+
+    print(f"\n{len(corpus)} statements ({len(SAFE) + len(templated)} safe, {len(BLOCKED)} to block)")
+    for label, check in (("regex layers", legacy_validate), ("tokenizer", lambda sql: validate(sql).ok)):
+        wrong = [(sql, expected) for sql, expected in corpus if check(sql) != expected]
+        false_blocks = sum(1 for _, expected in wrong if expected)
+        print(f"  {label:<13} {time_per_call(check, statements, args.iterations):6.1f} us/statement   "
+              f"{false_blocks} safe queries blocked, {len(wrong) - false_blocks} unsafe allowed")
+        for sql, expected in wrong:
+            print(f"      {'blocked' if expected else 'ALLOWED'}: {sql[:100]!r}")
+
+    print("\nRow cap (limit_rows, SQL_MAX_ROWS=10000 -> TOP 10001):")
+    for sql in ("SELECT DISTINCT solutionName FROM dbo.vw_ISDSolution_All",
+                "SELECT DISTINCT TOP 50 solutionName FROM dbo.vw_ISDSolution_All",
+                "SELECT TOP 100000 solutionName FROM dbo.vw_ISDSolution_All",
+                SAFE[3]):
+        print(f"  {sql[:70]!r:74} -> {limit_rows(sql, 10001)[:70]!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Cold-start profile of the backend: what a new container replica pays before it
+can bind the port and before it can serve a query.
+
+Each measurement runs in a fresh interpreter (no warm module cache):
+    - time to import main (what uvicorn waits for before binding)
+    - time to import multi_agent_pipeline (now deferred to the warm-up task)
+    - time to construct MultiAgentPipeline()
+    - the slowest modules by cumulative import time (python -X importtime)
+
+Usage:
+    python benchmark_startup.py
+    python benchmark_startup.py --top 25 --repeat 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+TIMED_SNIPPET = """
+import time
+start = time.perf_counter()
+{statement}
+print(f"{{time.perf_counter() - start:.6f}}")
+"""
+
+
+def run_timed(statement: str) -> float:
+    """Seconds taken by statement in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-c", TIMED_SNIPPET.format(statement=statement)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(module: str):
+    """
+    Direct imports of module as (cumulative_us, self_us, name), plus module's own entry.
+
+    -X importtime prints each module when it finishes importing, indented two
+    spaces per nesting level, so module's children are the depth-1 lines of the
+    block just above its own depth-0 line. Returns None if the import failed.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(cumulative_us), int(self_us), name.strip(), depth))
+    for index in range(len(entries) - 1, -1, -1):
+        if entries[index][3] == 0 and entries[index][2] == module:
+            break
+    else:
+        return None
+    children = []
+    for entry in reversed(entries[:index]):
+        if entry[3] == 0:
+            break
+        if entry[3] == 1:
+            children.append(entry[:3])
+    return entries[index][:3], sorted(children, reverse=True)
+
+
+def report(label: str, statement: str, repeat: int):
+    try:
+        samples = [run_timed(statement) for _ in range(repeat)]
+    except RuntimeError as e:
+        print(f"  {label:<34} skipped ({e})")
+        return
+    print(f"  {label:<34} median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"min {min(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="Slowest top-level imports to list")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    print("\nCold start (fresh interpreter each run)")
+    report("import main (before bind)", "import main", args.repeat)
+    report("import multi_agent_pipeline", "import multi_agent_pipeline", args.repeat)
+    report("MultiAgentPipeline()", "import multi_agent_pipeline as m; m.MultiAgentPipeline()", args.repeat)
+
+    for module in ("main", "multi_agent_pipeline"):
+        profile = import_profile(module)
+        if profile is None:
+            print(f"\n-X importtime {module}: import failed")
+            continue
+        (total_us, own_us, _), children = profile
+        print(f"\n`import {module}`: {total_us / 1000:.1f} ms cumulative ({own_us / 1000:.1f} ms in the module itself)")
+        print("Slowest direct imports (cumulative):")
+        for cumulative_us, self_us, name in children[:args.top]:
+            print(f"  {name:<40} {cumulative_us / 1000:8.1f} ms   (self {self_us / 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Template router hit rate and routing latency.
+
+Routes three question sets through template_router.TemplateRouter and reports,
+per set, how many were answered by a template (and which), what fell back to
+the model, and how long routing took:
+
+- shapes:  typical template-shaped questions (counts per industry, a partner's
+           solutions, industry / area / geo listings)
+- samples: docs/SAMPLE_QUESTIONS.md and test_queries.py, mostly topical
+           questions that should fall back to the model
+- --questions FILE: one question per line, e.g. exported from real traffic
+
+Without --load only the built-in industry and solution-area names are known;
+--load reads partners and geos from the view (needs .env and the database).
+
+Usage:
+    python benchmark_template_router.py
+    python benchmark_template_router.py --load --show
+    python benchmark_template_router.py --questions questions.txt --mode customer
+"""
+
+import argparse
+import statistics
+import time
+from collections import Counter
+
+from benchmark_semantic_cache import load_questions, percentile
+from template_router import TemplateRouter
+
+SHAPES = [
+    "How many solutions per industry?",
+    "How many solutions are there in each solution area?",
+    "Number of solutions by region",
+    "Top 10 partners",
+    "Which partners have the most solutions?",
+    "How many healthcare solutions are there?",
+    "How many security solutions for financial services?",
+    "Healthcare security solutions",
+    "Show me AI solutions for healthcare",
+    "Retail AI solutions",
+    "Show me all cybersecurity solutions",
+    "Solutions for government",
+    "Telecommunications cloud platform solutions",
+    "Manufacturing and mobility solutions",
+    "What education solutions are available?",
+    "List energy solutions",
+    "Healthcare solutions in the United States",
+    "Security solutions available in Canada",
+]
+
+
+def run(router, label, questions, show=False):
+    latencies, templates, unmatched = [], Counter(), Counter()
+    for question in questions:
+        start = time.perf_counter()
+        result, word = router._match(question)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        if result:
+            templates[result["template"]] += 1
+            if show:
+                print(f"      {result['template']:<9} {question}\n{_indent(result['sql'])}")
+        else:
+            unmatched[word or "(shape)"] += 1
+            if show:
+                print(f"      model     {question}   [{word or 'no shape'}]")
+    routed = sum(templates.values())
+    print(f"  {label:<8} {routed:>3}/{len(questions):<4} routed ({routed / len(questions):6.1%})   "
+          f"route p50 {statistics.median(latencies):6.1f} us  p95 {percentile(latencies, 95):6.1f} us   "
+          f"{dict(templates)}")
+    if unmatched:
+        print(f"           first unmatched words: {dict(unmatched.most_common(8))}")
+
+
+def _indent(sql):
+    return "\n".join("                " + line for line in sql.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--load", action="store_true", help="Load partner / geo names from the database")
+    parser.add_argument("--mode", choices=("seller", "customer"), default="seller")
+    parser.add_argument("--questions", help="File with one question per line")
+    parser.add_argument("--show", action="store_true", help="Print each question's route (and SQL)")
+    args = parser.parse_args()
+
+    router = TemplateRouter(app_mode=args.mode, enabled=True)
+    if args.load:
+        from nl2sql_pipeline import NL2SQLPipeline
+        router = NL2SQLPipeline().template_router
+        router.app_mode, router.enabled = args.mode, True
+        router.load()
+
+    vocabulary = router.stats()["vocabulary"]
+    print(f"\nmode {args.mode}, vocabulary {vocabulary['phrases']} phrases "
+          f"({vocabulary['partners']} partners, {vocabulary['geos']} geos)")
+    run(router, "shapes", SHAPES, args.show)
+    run(router, "samples", load_questions(), args.show)
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            run(router, "file", [line.strip() for line in f if line.strip()], args.show)
+
+
+if __name__ == "__main__":
+    main()
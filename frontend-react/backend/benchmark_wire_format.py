@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Payload size / serialize-time comparison of the two result wire formats.
+
+    rows      - list of dicts, every row repeats every column name (default)
+    columnar  - columns once, rows as arrays, low-cardinality strings
+                dictionary-encoded (request with "format": "columnar")
+
+Uses the same synthetic vw_ISDSolution_All-shaped rows as
+benchmark_row_cleaning.py and checks that decoding the columnar payload gives
+back exactly the row-dict payload.
+
+Usage:
+    python benchmark_wire_format.py
+    python benchmark_wire_format.py --rows 500 1000 5000 --repeat 5
+"""
+
+import argparse
+import json
+import time
+
+from benchmark_row_cleaning import COLUMNS, make_rows
+from row_cleaning import clean_columnar, clean_rows
+
+
+def decode_columnar(table):
+    """Reference decoder (mirrors decodeColumnar in src/api.ts)."""
+    columns = table["columns"]
+    dictionaries = table["dictionaries"]
+    lookups = [dictionaries.get(col) for col in columns]
+    return [
+        {col: (lookup[value] if lookup is not None else value)
+         for col, lookup, value in zip(columns, lookups, row)}
+        for row in table["rows"]
+    ]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def measure(row_count, repeat):
+    raw = make_rows(row_count)
+
+    rows_build, rows_payload = best_of(lambda: {"columns": COLUMNS, "rows": clean_rows(COLUMNS, raw)}, repeat)
+    col_build, col_payload = best_of(lambda: clean_columnar(COLUMNS, raw), repeat)
+
+    rows_encode, rows_json = best_of(lambda: json.dumps(rows_payload, default=str), repeat)
+    col_encode, col_json = best_of(lambda: json.dumps(col_payload, default=str), repeat)
+
+    assert decode_columnar(col_payload) == rows_payload["rows"], "columnar payload does not round-trip"
+
+    return {
+        "rows": row_count,
+        "rows_bytes": len(rows_json.encode("utf-8")),
+        "col_bytes": len(col_json.encode("utf-8")),
+        "rows_ms": (rows_build + rows_encode) * 1000,
+        "col_ms": (col_build + col_encode) * 1000,
+        "rows_encode_ms": rows_encode * 1000,
+        "col_encode_ms": col_encode * 1000,
+        "encoded_columns": sorted(col_payload["dictionaries"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row-dict vs columnar wire format benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print(f"WIRE FORMAT BENCHMARK — rows vs columnar (best of {args.repeat})")
+    print("=" * 78)
+    print(f"\n  {'rows':>6}  {'dict KB':>9}  {'columnar KB':>11}  {'size':>6}  "
+          f"{'dict ms':>8}  {'col ms':>7}  {'json.dumps dict/col ms':>22}")
+
+    encoded = []
+    for count in args.rows:
+        r = measure(count, args.repeat)
+        encoded = r["encoded_columns"]
+        print(f"  {r['rows']:>6}  {r['rows_bytes'] / 1024:>9.1f}  {r['col_bytes'] / 1024:>11.1f}  "
+              f"{r['col_bytes'] / r['rows_bytes']:>5.0%}  {r['rows_ms']:>8.1f}  {r['col_ms']:>7.1f}  "
+              f"{r['rows_encode_ms']:>10.1f} / {r['col_encode_ms']:<9.1f}")
+
+    print(f"\n  Dictionary-encoded columns: {', '.join(encoded) or '(none)'}")
+    print("  (ms columns = clean + json.dumps; size = columnar bytes as % of row-dict bytes)")
+    print("\n  ✅ Columnar payloads decode to the row-dict payloads")
+
+
+if __name__ == "__main__":
+    main()
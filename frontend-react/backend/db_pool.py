@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Bounded, health-checked pool of read-only SQL Server connections.
+
+Every query used to open a fresh pyodbc connection (driver load, TCP, TLS and
+login to Azure SQL) and close it afterwards — usually more time than the
+SELECT itself. ConnectionPool keeps up to DB_POOL_MAX_SIZE connections open
+and hands them out as PooledConnection proxies. Callers keep their existing
+code: conn.close() returns the connection to the pool instead of closing it.
+
+- connections come from the caller's connect function, so ApplicationIntent=ReadOnly
+  and the server-side query timeout are set exactly as before
+- every return rolls back; a connection whose rollback fails is discarded
+- a connection idle longer than DB_POOL_VALIDATE_AFTER_SECONDS is pinged with
+  SELECT 1 before reuse and replaced if the ping fails
+- idle connections beyond DB_POOL_MIN_SIZE are closed after DB_POOL_MAX_IDLE_SECONDS,
+  and every connection is recycled after DB_POOL_MAX_LIFETIME_SECONDS
+- when all DB_POOL_MAX_SIZE connections are checked out, acquire() waits up to
+  DB_POOL_ACQUIRE_TIMEOUT_SECONDS, then raises TimeoutError
+
+pyodbc is blocking, so the pool is thread-based; async callers acquire in a
+worker thread (asyncio.to_thread), as they already did for pyodbc.connect.
+
+Environment:
+    DB_POOL_MIN_SIZE                 - connections kept open when idle (default 2)
+    DB_POOL_MAX_SIZE                 - max open connections (default 10)
+    DB_POOL_MAX_IDLE_SECONDS         - idle time before a surplus connection is closed (default 300)
+    DB_POOL_MAX_LIFETIME_SECONDS     - age at which a connection is recycled (default 1800)
+    DB_POOL_VALIDATE_AFTER_SECONDS   - idle time after which reuse is preceded by SELECT 1 (default 30)
+    DB_POOL_ACQUIRE_TIMEOUT_SECONDS  - max wait for a free connection (default 10)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300"))
+MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", "1800"))
+VALIDATE_AFTER = float(os.getenv("DB_POOL_VALIDATE_AFTER_SECONDS", "30"))
+ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT_SECONDS", "10"))
+
+
+class _Entry:
+    """A raw connection plus its bookkeeping."""
+
+    __slots__ = ("conn", "created", "returned")
+
+    def __init__(self, conn: Any):
+        self.conn = conn
+        self.created = time.monotonic()
+        self.returned = self.created
+
+
+class PooledConnection:
+    """
+    Checked-out connection. Behaves like the pyodbc connection it wraps;
+    close() hands it back to the pool (rolled back) instead of closing it.
+    """
+
+    def __init__(self, pool: "ConnectionPool", entry: _Entry):
+        self._pool = pool
+        self._entry: Optional[_Entry] = entry
+        self._discard = False
+
+    def __getattr__(self, name: str):
+        if self._entry is None:
+            raise AttributeError(f"connection already returned to the pool ({name})")
+        return getattr(self._entry.conn, name)
+
+    def invalidate(self):
+        """Close the underlying connection on return instead of reusing it (e.g. after an interrupted statement)."""
+        self._discard = True
+
+    def close(self):
+        """Return to the pool; idempotent."""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool._release(entry, self._discard)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of connections made by connect()."""
+
+    def __init__(self, connect: Callable[[], Any], min_size: int = MIN_SIZE, max_size: int = MAX_SIZE,
+                 max_idle: float = MAX_IDLE, max_lifetime: float = MAX_LIFETIME,
+                 validate_after: float = VALIDATE_AFTER, acquire_timeout: float = ACQUIRE_TIMEOUT):
+        self._connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max(max_size, 1)
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self.acquire_timeout = acquire_timeout
+        self._idle: Deque[_Entry] = deque()  # most recently returned on the right
+        self._open = 0  # idle + checked out + being connected
+        self._cond = threading.Condition()
+        self._metrics = {
+            "connects": 0,             # new physical connections
+            "connect_seconds": 0.0,
+            "checkouts": 0,
+            "reused": 0,               # checkouts served from an idle connection
+            "wait_seconds": 0.0,       # time spent waiting for a free connection
+            "timeouts": 0,
+            "validations": 0,
+            "validation_failures": 0,
+            "discarded": 0,            # failed rollback or invalidate()
+            "recycled": 0,             # closed for idleness or age
+        }
+
+    # ------------------------------------------------------------------
+    # Checkout / return
+    # ------------------------------------------------------------------
+
+    def acquire(self) -> PooledConnection:
+        """A validated connection; blocks up to acquire_timeout when the pool is exhausted."""
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        while True:
+            entry = None
+            with self._cond:
+                self._expire_idle()
+                while not self._idle and self._open >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics["timeouts"] += 1
+                        raise TimeoutError(
+                            f"No database connection free within {self.acquire_timeout}s "
+                            f"({self.max_size} in use)"
+                        )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._open += 1  # reserve the slot; connect outside the lock
+                waited = time.monotonic() - start
+
+            if entry is None:
+                entry, reused = self._new_entry(), False
+            elif self._usable(entry):
+                reused = True
+            else:
+                # Stale connection: drop it and go round again (a new one if nothing else is idle)
+                self._close_entry(entry)
+                continue
+            with self._cond:
+                self._metrics["checkouts"] += 1
+                self._metrics["reused"] += reused
+                self._metrics["wait_seconds"] += waited
+            return PooledConnection(self, entry)
+
+    def _new_entry(self) -> _Entry:
+        start = time.perf_counter()
+        try:
+            conn = self._connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._metrics["connects"] += 1
+            self._metrics["connect_seconds"] += time.perf_counter() - start
+        return _Entry(conn)
+
+    def _usable(self, entry: _Entry) -> bool:
+        """Validate a connection that sat idle longer than validate_after (SELECT 1)."""
+        if time.monotonic() - entry.returned <= self.validate_after:
+            return True
+        with self._cond:
+            self._metrics["validations"] += 1
+        try:
+            cursor = entry.conn.cursor()
+            try:
+                cursor.execute("SELECT 1").fetchone()
+            finally:
+                cursor.close()
+            entry.conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._metrics["validation_failures"] += 1
+            return False
+
+    def _release(self, entry: _Entry, discard: bool):
+        # SAFETY: nothing outlives a checkout — roll back any transaction state
+        if not discard:
+            try:
+                entry.conn.rollback()
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        if discard or now - entry.created > self.max_lifetime:
+            with self._cond:
+                self._metrics["discarded" if discard else "recycled"] += 1
+            self._close_entry(entry)
+            return
+        entry.returned = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def _close_entry(self, entry: _Entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def _expire_idle(self):
+        """Close surplus idle connections past max_idle (caller holds the lock; oldest are on the left)."""
+        now = time.monotonic()
+        while (self._idle and self._open > self.min_size
+               and now - self._idle[0].returned > self.max_idle):
+            entry = self._idle.popleft()
+            self._open -= 1
+            self._metrics["recycled"] += 1
+            try:
+                entry.conn.close()
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def prewarm(self, size: Optional[int] = None) -> int:
+        """Open connections until size (default min_size) exist; returns how many were opened."""
+        target = min(self.min_size if size is None else size, self.max_size)
+        opened = 0
+        while True:
+            with self._cond:
+                if self._open >= target:
+                    return opened
+                self._open += 1
+            entry = self._new_entry()
+            opened += 1
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def close(self):
+        """Close every idle connection (checked-out connections are unaffected)."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for entry in idle:
+            self._close_entry(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            metrics = dict(self._metrics)
+            idle, open_ = len(self._idle), self._open
+        connects, checkouts = metrics.pop("connects"), metrics["checkouts"]
+        connect_seconds, wait_seconds = metrics.pop("connect_seconds"), metrics.pop("wait_seconds")
+        return {
+            "open": open_,
+            "idle": idle,
+            "in_use": open_ - idle,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "connects": connects,
+            **metrics,
+            "reuse_ratio": round(metrics["reused"] / checkouts, 3) if checkouts else None,
+            "avg_connect_ms": round(connect_seconds / connects * 1000, 1) if connects else None,
+            "avg_wait_ms": round(wait_seconds / checkouts * 1000, 2) if checkouts else None,
+        }
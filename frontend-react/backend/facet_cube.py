@@ -0,0 +1,663 @@
+#!/usr/bin/env python3
+"""
+In-memory facet cube over dbo.vw_ISDSolution_All for instant aggregate answers.
+
+"How many solutions per industry / solution area / geo / partner" makes up
+much of the traffic, and each one ran a COUNT(DISTINCT solutionName) ...
+GROUP BY over the denormalized view. FacetCube answers those from memory:
+
+1. load    - one bulk SELECT DISTINCT of the solution name and the six facet
+   columns below. Each distinct combination of facet values is a cell, and
+   each cell holds a bitset (a Python int) of the solution ids that have a row
+   with exactly those values. Every facet value also has a bitset of the cells
+   that carry it. Taken during startup prewarm and again whenever the stats
+   refresher sees the view's fingerprint change. A refresh applies only the
+   rows that appeared or disappeared since the last read, so solution and
+   cell ids stay stable and unchanged cells are left alone
+2. query   - filters AND the cell bitsets of their columns (OR within one
+   column), the matching cells' solution bitsets are ORed, and a popcount is
+   the distinct-solution count. Filtering cells rather than solutions keeps
+   the view's row semantics: a solution counts only if one of its rows
+   satisfies every filter. Results are memoized until the next refresh, and
+   the per-column breakdowns of approved solutions are computed at load
+3. execute - NL2SQLPipeline offers every statement to execute() first. It
+   answers the shape the template router and most generated count questions
+   use, and returns None for anything else:
+
+       SELECT [TOP n] [col,] COUNT(DISTINCT solutionName) [AS alias]
+       FROM dbo.vw_ISDSolution_All
+       [WHERE col = '...' | col IN ('...', ...) | col IS NOT NULL [AND ...]]
+       [GROUP BY col] [ORDER BY alias | col | COUNT(DISTINCT solutionName) [ASC | DESC], ...]
+
+series() returns the same breakdowns as {columns, rows} for ChartViewer; main
+serves it as GET /api/facets.
+
+Values compare like the database's case-insensitive collation (case and
+trailing spaces ignored). A group that only has rows without a solutionName
+is kept with a count of 0, as in SQL. Ties under ORDER BY are broken by value;
+without ORDER BY groups come largest first.
+
+Environment:
+    FACET_CUBE_ENABLED  - true/false (default true)
+"""
+
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from row_cleaning import keyed_rows
+from sql_tokens import tokenize
+
+ENABLED = os.getenv("FACET_CUBE_ENABLED", "true").lower() == "true"
+
+VIEW = "dbo.vw_ISDSolution_All"
+SOLUTION = "solutionName"
+# Facet columns, in cell-key order
+COLUMNS = ("industryName", "subIndustryName", "solutionAreaName", "geoName", "orgName", "solutionStatus")
+# Facet names (GET /api/facets parameters) -> column
+FACETS = {"industry": "industryName", "sub_industry": "subIndustryName", "solution_area": "solutionAreaName",
+          "geo": "geoName", "partner": "orgName", "status": "solutionStatus"}
+LOAD_SQL = f"SELECT DISTINCT {SOLUTION}, {', '.join(COLUMNS)} FROM {VIEW}"
+COUNT_COLUMN = "solution_count"
+MEMO_SIZE = 4096
+
+_BY_UPPER = {column.upper(): index for index, column in enumerate(COLUMNS)}
+_STATUS = COLUMNS.index("solutionStatus")
+_NOT_NULL = "not null"
+# Set bit positions of every byte value, for walking a bitset a byte at a time
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256))
+
+Filters = Dict[str, Union[str, Iterable[str]]]
+
+
+def _key(value: Any) -> Any:
+    """Comparison key of a value: case-insensitive, trailing spaces ignored."""
+    return value.rstrip().casefold() if isinstance(value, str) else value
+
+
+def _sort_key(value: Any) -> tuple:
+    """NULL first, then case-insensitive, like ORDER BY on the view."""
+    return (value is not None, _key(value) if value is not None else "")
+
+
+def _members(mask: int):
+    """Positions of the set bits of mask, ascending."""
+    for index, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, "little")):
+        if byte:
+            base = index * 8
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+class _Query:
+    """A statement execute() can answer: filters, optional group column, order and TOP."""
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.group: Optional[int] = None  # COLUMNS index
+        self.select: List[Tuple[str, str]] = []  # ("group" | "count", output name)
+        self.filters: List[Tuple[int, Any]] = []  # (COLUMNS index, key set or _NOT_NULL)
+        self.order: List[Tuple[str, bool]] = []  # ("group" | "count", descending)
+
+
+@lru_cache(maxsize=1024)
+def _parse(sql: str) -> Optional[_Query]:
+    """The statement as a _Query, or None when it is not a count over the view's facets."""
+    tokens = [token for token in tokenize(sql) if token.kind not in ("space", "comment")]
+    if tokens and tokens[-1].text == ";":
+        tokens.pop()
+    query = _Query()
+    position = 0
+
+    def peek(offset=0) -> str:
+        at = position + offset
+        return tokens[at].text.upper() if at < len(tokens) and tokens[at].kind == "word" else (
+            tokens[at].text if at < len(tokens) else "")
+
+    def expect(*texts) -> bool:
+        nonlocal position
+        for offset, text in enumerate(texts):
+            if peek(offset) != text:
+                return False
+        position += len(texts)
+        return True
+
+    def name() -> Optional[str]:
+        """An identifier (word or [bracketed] / "quoted"), with an optional alias. prefix."""
+        nonlocal position
+        if position + 2 < len(tokens) and tokens[position + 1].text == "." and tokens[position].kind == "word" \
+                and tokens[position].text.upper() != "DBO":
+            position += 2  # table alias: v.industryName
+        if position >= len(tokens) or tokens[position].kind not in ("word", "ident"):
+            return None
+        text = tokens[position].text
+        position += 1
+        return text[1:-1] if tokens[position - 1].kind == "ident" else text
+
+    def column() -> Optional[int]:
+        start = position
+        text = name()
+        index = _BY_UPPER.get(text.upper()) if text else None
+        if index is None:
+            restore(start)
+        return index
+
+    def restore(at):
+        nonlocal position
+        position = at
+
+    def count_expression() -> bool:
+        start = position
+        if expect("COUNT", "(", "DISTINCT"):
+            text = name()
+            if text and text.upper() == SOLUTION.upper() and expect(")"):
+                return True
+        restore(start)
+        return False
+
+    def alias(default: str) -> str:
+        if expect("AS"):
+            return name() or ""
+        if position < len(tokens) and (tokens[position].kind == "ident" or peek() not in ("", ",", "FROM")):
+            return name() or default
+        return default
+
+    def string() -> Optional[str]:
+        nonlocal position
+        if position < len(tokens) and tokens[position].kind == "string":
+            text = tokens[position].text
+            position += 1
+            return text[text.index("'") + 1:-1].replace("''", "'")
+        return None
+
+    if not expect("SELECT"):
+        return None
+    if expect("TOP"):
+        parenthesized = expect("(")
+        if position >= len(tokens) or not tokens[position].text.isdigit():
+            return None
+        query.limit = int(tokens[position].text)
+        position += 1
+        if parenthesized and not expect(")"):
+            return None
+        if peek() in ("PERCENT", "WITH"):
+            return None
+
+    while True:
+        if count_expression():
+            query.select.append(("count", alias("")))
+        else:
+            index = column()
+            if index is None or query.group not in (None, index):
+                return None
+            query.group = index
+            written = tokens[position - 1].text
+            query.select.append(("group", alias(written[1:-1] if tokens[position - 1].kind == "ident" else written)))
+        if not expect(","):
+            break
+    kinds = [kind for kind, _ in query.select]
+    if kinds.count("count") != 1 or len(kinds) > 2:
+        return None
+
+    if not expect("FROM"):
+        return None
+    expect("DBO", ".")
+    table = name()
+    if not table or table.upper() != VIEW.split(".")[1].upper():
+        return None
+    if peek() == "AS":
+        position += 1
+    if peek() not in ("", "WHERE", "GROUP", "ORDER"):
+        position += 1  # table alias
+
+    if expect("WHERE"):
+        while True:
+            index = column()
+            if index is None:
+                return None
+            if expect("="):
+                value = string()
+                if value is None:
+                    return None
+                query.filters.append((index, frozenset((_key(value),))))
+            elif expect("IN", "("):
+                keys = set()
+                while True:
+                    value = string()
+                    if value is None:
+                        return None
+                    keys.add(_key(value))
+                    if not expect(","):
+                        break
+                if not expect(")"):
+                    return None
+                query.filters.append((index, frozenset(keys)))
+            elif expect("IS", "NOT", "NULL"):
+                query.filters.append((index, _NOT_NULL))
+            else:
+                return None
+            if not expect("AND"):
+                break
+
+    if expect("GROUP", "BY"):
+        if column() != query.group or query.group is None:
+            return None
+    elif query.group is not None:
+        return None
+
+    if expect("ORDER", "BY"):
+        names = {output.upper(): kind for kind, output in query.select if output}
+        while True:
+            if count_expression():
+                kind = "count"
+            else:
+                start = position
+                text = name()
+                kind = names.get(text.upper()) if text else None
+                if kind is None and text and query.group is not None and _BY_UPPER.get(text.upper()) == query.group:
+                    kind = "group"
+                if kind is None:
+                    restore(start)
+                    return None
+            descending = expect("DESC")
+            if not descending:
+                expect("ASC")
+            query.order.append((kind, descending))
+            if not expect(","):
+                break
+    return query if position == len(tokens) else None
+
+
+class FacetCube:
+    """Distinct-solution counts per facet combination, answered from bitsets."""
+
+    def __init__(self, connect: Optional[Callable[[], Any]] = None, enabled: bool = ENABLED):
+        """
+        Args:
+            connect: Returns a read-only DB connection for load() (closed afterwards),
+                     e.g. NL2SQLPipeline.db_pool.acquire
+        """
+        self._connect = connect
+        self.enabled = enabled
+        self.built_at: Optional[str] = None
+        self._version: Any = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one bulk read at a time
+
+        self._rows: set = set()  # (solution key, cell key) pairs currently in the view
+        self._solutions: Dict[Any, int] = {}  # solution key -> id
+        self._solution_rows: List[int] = []  # id -> rows referencing it (0: id is free)
+        self._free_solutions: List[int] = []
+        self._cells: Dict[tuple, int] = {}  # cell key -> id
+        self._cell_keys: List[Optional[tuple]] = []  # id -> cell key
+        self._cell_bits: List[int] = []  # id -> solution bitset
+        self._cell_rows: List[int] = []  # id -> rows in the cell (0: id is free)
+        self._free_cells: List[int] = []
+        self._live = 0  # bitset of cells with rows
+        self._index: List[Dict[Any, int]] = [{} for _ in COLUMNS]  # value key -> cell bitset
+        self._names: List[Dict[Any, Any]] = [{} for _ in COLUMNS]  # value key -> value as stored
+        # value key -> status key -> solution bitset, per column (rebuilt after each change)
+        self._rollup: List[Dict[Any, Dict[Any, int]]] = [{} for _ in COLUMNS]
+        self._memo: Dict[tuple, Any] = {}
+        self._generation = 0
+
+        self._metrics = {
+            "loads": 0,
+            "load_errors": 0,
+            "rows": 0,
+            "rows_added": 0,
+            "rows_removed": 0,
+            "load_ms": None,
+            "answered": 0,
+            "unmatched": 0,
+            "series": 0,
+            "memo_hits": 0,
+            "answer_us_total": 0.0,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self._generation > 0
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def load(self) -> bool:
+        """Read the view's facet rows and apply the difference; False when disabled or the read failed."""
+        if not self.enabled or self._connect is None:
+            return False
+        with self._load_lock:
+            start = time.perf_counter()
+            try:
+                conn = self._connect()
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(LOAD_SQL)
+                    names = [column[0].upper() for column in cursor.description]
+                    if names != [SOLUTION.upper()] + [column.upper() for column in COLUMNS]:
+                        raise ValueError(f"unexpected columns {names}")
+                    rows = []
+                    while True:
+                        batch = cursor.fetchmany(1000)
+                        if not batch:
+                            break
+                        rows.extend(tuple(row) for row in batch)
+                    conn.rollback()
+                finally:
+                    cursor.close()
+                    conn.close()
+            except Exception as e:
+                with self._lock:
+                    self._metrics["load_errors"] += 1
+                print(f"⚠️  Facet cube load failed: {e}")
+                return False
+            added, removed = self._apply(rows)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.built_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+                self._metrics.update(rows=len(self._rows), rows_added=added, rows_removed=removed,
+                                     load_ms=round(elapsed_ms, 1))
+                self._metrics["loads"] += 1
+        for column in COLUMNS:
+            self.group_by(column, {"solutionStatus": "Approved"})
+        print(f"🧊 Facet cube: {len(self._rows)} rows, {len(self._solutions)} solutions, {len(self._cells)} cells "
+              f"(+{added} / -{removed} rows) in {elapsed_ms:.0f} ms")
+        return True
+
+    def _apply(self, rows: List[tuple]) -> Tuple[int, int]:
+        """Make the cube hold exactly rows; returns (rows added, rows removed)."""
+        current = {}
+        for row in rows:
+            pair = (_key(row[0]), tuple(_key(value) for value in row[1:]))
+            current.setdefault(pair, row)
+        with self._lock:
+            removed = self._rows - current.keys()
+            added = current.keys() - self._rows
+            for solution, cell in removed:
+                self._remove(solution, cell)
+            for pair in added:
+                self._add(pair, current[pair])
+            self._rows = set(current)
+            if added or removed or self._generation == 0:
+                self._rollup = self._rollups()
+                self._memo.clear()
+                self._generation += 1
+        return len(added), len(removed)
+
+    def _add(self, pair: tuple, row: tuple):
+        solution, cell = pair
+        cell_id = self._cells.get(cell)
+        if cell_id is None:
+            cell_id = self._free_cells.pop() if self._free_cells else len(self._cell_bits)
+            if cell_id == len(self._cell_bits):
+                self._cell_bits.append(0)
+                self._cell_rows.append(0)
+                self._cell_keys.append(None)
+            self._cells[cell] = cell_id
+            self._cell_keys[cell_id] = cell
+            self._live |= 1 << cell_id
+            for index, (key, value) in enumerate(zip(cell, row[1:])):
+                self._index[index][key] = self._index[index].get(key, 0) | 1 << cell_id
+                self._names[index].setdefault(key, value)
+        self._cell_rows[cell_id] += 1
+        if solution is None:
+            return  # COUNT(DISTINCT) ignores NULL; the cell still makes its group exist
+        solution_id = self._solutions.get(solution)
+        if solution_id is None:
+            solution_id = self._free_solutions.pop() if self._free_solutions else len(self._solution_rows)
+            if solution_id == len(self._solution_rows):
+                self._solution_rows.append(0)
+            self._solutions[solution] = solution_id
+        self._solution_rows[solution_id] += 1
+        self._cell_bits[cell_id] |= 1 << solution_id
+
+    def _remove(self, solution: Any, cell: tuple):
+        cell_id = self._cells[cell]
+        if solution is not None:
+            solution_id = self._solutions[solution]
+            self._cell_bits[cell_id] &= ~(1 << solution_id)
+            self._solution_rows[solution_id] -= 1
+            if not self._solution_rows[solution_id]:
+                del self._solutions[solution]
+                self._free_solutions.append(solution_id)
+        self._cell_rows[cell_id] -= 1
+        if self._cell_rows[cell_id]:
+            return
+        del self._cells[cell]
+        self._cell_keys[cell_id] = None
+        self._free_cells.append(cell_id)
+        self._live &= ~(1 << cell_id)
+        for index, key in enumerate(cell):
+            remaining = self._index[index][key] & ~(1 << cell_id)
+            if remaining:
+                self._index[index][key] = remaining
+            else:
+                del self._index[index][key]
+                del self._names[index][key]
+
+    def _rollups(self) -> List[Dict[Any, Dict[Any, int]]]:
+        """Solutions per value and status of every column: the usual breakdowns without walking cells."""
+        rollup: List[Dict[Any, Dict[Any, int]]] = [{} for _ in COLUMNS]
+        cell_bits = self._cell_bits
+        for cell, cell_id in self._cells.items():
+            bits, status = cell_bits[cell_id], cell[_STATUS]
+            for index, key in enumerate(cell):
+                by_status = rollup[index].setdefault(key, {})
+                by_status[status] = by_status.get(status, 0) | bits
+        return rollup
+
+    def set_data_version(self, version: Any):
+        """Reload when the view's fingerprint changes (called by the stats refresher)."""
+        with self._lock:
+            changed = version != self._version
+            # First fingerprint: only load if the startup prewarm could not
+            refresh = changed and (self._version is not None or self._generation == 0)
+            self._version = version
+        if refresh:
+            self.load()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _filters(filters: Optional[Filters]) -> List[Tuple[int, Any]]:
+        parsed = []
+        for column, values in (filters or {}).items():
+            index = _BY_UPPER.get(column.upper())
+            if index is None:
+                raise ValueError(f"unknown facet column '{column}' (one of {', '.join(COLUMNS)})")
+            values = [values] if isinstance(values, str) else list(values)
+            parsed.append((index, frozenset(_key(value) for value in values)))
+        return parsed
+
+    def _cells_matching(self, filters: List[Tuple[int, Any]]) -> int:
+        mask = self._live
+        for index, keys in filters:
+            column = self._index[index]
+            if keys is _NOT_NULL:
+                mask &= ~column.get(None, 0)
+            else:
+                selected = 0
+                for key in keys:
+                    selected |= column.get(key, 0)
+                mask &= selected
+        return mask
+
+    @staticmethod
+    def _selected(values: Dict[Any, Any], keys: Any) -> Iterable[Any]:
+        """Keys of values a filter keeps (None: no filter on that column)."""
+        if keys is None:
+            return values.keys()
+        if keys is _NOT_NULL:
+            return [key for key in values if key is not None]
+        return [key for key in keys if key in values]
+
+    def _from_rollup(self, group: Optional[int], filters: List[Tuple[int, Any]]):
+        """
+        _query's answer from the rollups, or None when it needs the cells: they
+        cover a status filter plus filters on one other column, grouped by that
+        column (or by any column when there is no other filter).
+        """
+        by_column = dict(filters)
+        if len(by_column) != len(filters):
+            return None
+        status = by_column.pop(_STATUS, None)
+        if len(by_column) > 1 or (by_column and group is not None and group not in by_column):
+            return None
+        column = group if group is not None else next(iter(by_column), _STATUS)
+        rollup = self._rollup[column]
+        statuses = set(self._selected(self._rollup[_STATUS], status))
+        groups = []
+        for key in self._selected(rollup, by_column.get(column)):
+            bits, present = 0, False
+            for status_key, status_bits in rollup[key].items():
+                if status_key in statuses:
+                    bits |= status_bits
+                    present = True
+            if present:
+                groups.append((key, bits))
+        if group is None:
+            bits = 0
+            for _, group_bits in groups:
+                bits |= group_bits
+            return bits.bit_count()
+        return [(key, bits.bit_count()) for key, bits in groups]
+
+    def _from_cells(self, group: Optional[int], filters: List[Tuple[int, Any]]):
+        """_query's answer from one pass over the cells matching every filter."""
+        cells = self._cells_matching(filters)
+        cell_bits = self._cell_bits
+        if group is None:
+            bits = 0
+            for cell_id in _members(cells):
+                bits |= cell_bits[cell_id]
+            return bits.bit_count()
+        groups: Dict[Any, int] = {}
+        cell_keys = self._cell_keys
+        for cell_id in _members(cells):
+            key = cell_keys[cell_id][group]
+            groups[key] = groups.get(key, 0) | cell_bits[cell_id]
+        return [(key, bits.bit_count()) for key, bits in groups.items()]
+
+    def _query(self, group: Optional[int], filters: List[Tuple[int, Any]]):
+        """Distinct-solution count, or [(value, count)] per value of COLUMNS[group]; memoized."""
+        memo_key = (group, tuple(sorted(filters, key=repr)))
+        with self._lock:
+            result = self._memo.get(memo_key)
+            if result is not None:
+                self._metrics["memo_hits"] += 1
+                return result
+            result = self._from_rollup(group, filters)
+            if result is None:
+                result = self._from_cells(group, filters)
+            if group is not None:
+                names = self._names[group]
+                result = tuple(sorted(((names[key], count) for key, count in result),
+                                      key=lambda item: (-item[1], _sort_key(item[0]))))
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            self._memo[memo_key] = result
+        return result
+
+    def count(self, filters: Optional[Filters] = None) -> int:
+        """Distinct solutions with a row matching every filter ({column: value or [values]})."""
+        return self._query(None, self._filters(filters))
+
+    def group_by(self, column: str, filters: Optional[Filters] = None,
+                 top: Optional[int] = None) -> List[Tuple[Any, int]]:
+        """[(value, distinct solutions)] per value of column under filters, largest first."""
+        index = _BY_UPPER.get(column.upper())
+        if index is None:
+            raise ValueError(f"unknown facet column '{column}' (one of {', '.join(COLUMNS)})")
+        groups = self._query(index, self._filters(filters))
+        return list(groups[:top] if top else groups)
+
+    def series(self, column: Optional[str] = None, filters: Optional[Filters] = None,
+               top: Optional[int] = None) -> Dict[str, Any]:
+        """
+        A breakdown in the shape ChartViewer plots.
+
+        Returns:
+            {"columns": [column, "solution_count"], "rows": [{column: value, "solution_count": n}, ...],
+             "row_count": n, "total": distinct solutions under filters}
+            (without column: the total as a single "solution_count" row)
+        """
+        total = self.count(filters)
+        with self._lock:
+            self._metrics["series"] += 1
+        if column is None:
+            return {"columns": [COUNT_COLUMN], "rows": [{COUNT_COLUMN: total}], "row_count": 1, "total": total}
+        column = COLUMNS[_BY_UPPER[column.upper()]] if column.upper() in _BY_UPPER else column
+        rows = [{column: value, COUNT_COLUMN: count} for value, count in self.group_by(column, filters, top)]
+        return {"columns": [column, COUNT_COLUMN], "rows": rows, "row_count": len(rows), "total": total}
+
+    def execute(self, sql: str, max_rows: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Answer sql (validated, row-capped T-SQL) from the cube; more than
+        max_rows groups are cut to max_rows and marked truncated, as when fetching.
+
+        Returns:
+            execute_sql-shaped dict ('columns', 'rows', 'row_count', 'truncated',
+            'error'), or None when the statement is not a facet count
+        """
+        if not self.ready:
+            return None
+        start = time.perf_counter()
+        query = _parse(sql)
+        if query is None:
+            with self._lock:
+                self._metrics["unmatched"] += 1
+            return None
+        result = self._query(query.group, query.filters)
+        if query.group is None:
+            groups = [(None, result)]
+        else:
+            groups = list(result)
+            for kind, descending in reversed(query.order):
+                if kind == "count":
+                    groups.sort(key=lambda item: item[1], reverse=descending)
+                else:
+                    groups.sort(key=lambda item: _sort_key(item[0]), reverse=descending)
+        if query.limit is not None:
+            groups = groups[:query.limit]
+        truncated = max_rows is not None and len(groups) > max_rows
+        if truncated:
+            groups = groups[:max_rows]
+        columns = [output for _, output in query.select]
+        rows = keyed_rows(columns, [tuple(count if kind == "count" else value for kind, _ in query.select)
+                                    for value, count in groups])
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        with self._lock:
+            self._metrics["answered"] += 1
+            self._metrics["answer_us_total"] += elapsed_us
+        print(f"⚡ Facet cube: {len(rows)} rows in {elapsed_us:.0f} µs\n")
+        return {
+            "columns": columns,
+            "rows": rows,
+            "row_count": len(rows),
+            "truncated": truncated,
+            "error": None
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            solutions, cells, memo = len(self._solutions), len(self._cells), len(self._memo)
+            generation = self._generation
+        answer_us = metrics.pop("answer_us_total")
+        offered = metrics["answered"] + metrics["unmatched"]
+        return {
+            "enabled": self.enabled,
+            "ready": self.enabled and generation > 0,
+            "built_at": self.built_at,
+            "solutions": solutions,
+            "cells": cells,
+            "memo_entries": memo,
+            **metrics,
+            "hit_ratio": round(metrics["answered"] / offered, 3) if offered else None,
+            "avg_answer_us": round(answer_us / metrics["answered"], 1) if metrics["answered"] else None,
+        }
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Shared, tuned HTTP transport for every Azure OpenAI client in the process.
+
+A question makes 4-5 sequential Responses API round trips. With a default
+client per agent or script, any of them can pay a fresh TCP + TLS handshake to
+the Azure endpoint. Here every client shares one keep-alive pool per sync/async
+flavour. The pool speaks HTTP/2 when the optional h2 package is installed,
+multiplexing concurrent calls over one connection. Both flavours share one
+SSLContext, so the CA bundle is parsed once.
+
+Environment:
+    LLM_HTTP2                     - use HTTP/2 when h2 is installed (default true)
+    LLM_POOL_MAX_CONNECTIONS      - max open connections per pool (default 20)
+    LLM_POOL_MAX_KEEPALIVE        - idle connections kept open (default 10)
+    LLM_KEEPALIVE_EXPIRY_SECONDS  - idle time before a connection is closed (default 90)
+    LLM_CONNECT_TIMEOUT_SECONDS   - TCP + TLS connect timeout (default 5)
+    LLM_READ_TIMEOUT_SECONDS      - max gap between bytes, incl. stream chunks (default 180)
+
+transport_stats() reports new vs reused connections and TCP/TLS handshake
+times, collected through httpcore's trace extension.
+"""
+
+import os
+import ssl
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+except ImportError:  # optional dependency
+    h2 = None
+
+try:
+    import certifi
+except ImportError:
+    certifi = None
+
+HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true" and h2 is not None
+MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "90"))
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "180"))
+
+if os.getenv("LLM_HTTP2", "true").lower() == "true" and h2 is None:
+    print("⚠️  LLM_HTTP2=true but h2 is not installed — Azure OpenAI calls use HTTP/1.1")
+
+
+class _TransportStats:
+    """Connection reuse and handshake timings across both pools."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.phase_totals: Dict[str, float] = {"connect_tcp": 0.0, "start_tls": 0.0}
+        self.phase_max: Dict[str, float] = {"connect_tcp": 0.0, "start_tls": 0.0}
+        self.http_versions: Dict[str, int] = {}
+
+    def record(self, phases: Dict[str, float], http_version: str):
+        with self._lock:
+            self.requests += 1
+            if "connect_tcp" in phases:
+                self.new_connections += 1
+            else:
+                self.reused_connections += 1
+            for phase, seconds in phases.items():
+                if phase in self.phase_totals:
+                    self.phase_totals[phase] += seconds
+                    self.phase_max[phase] = max(self.phase_max[phase], seconds)
+            self.http_versions[http_version] = self.http_versions.get(http_version, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            handshakes = self.new_connections
+            return {
+                "http2": HTTP2,
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": self.reused_connections,
+                "reuse_ratio": round(self.reused_connections / self.requests, 3) if self.requests else None,
+                "tcp_connect_avg_ms": round(self.phase_totals["connect_tcp"] / handshakes * 1000, 1) if handshakes else None,
+                "tcp_connect_max_ms": round(self.phase_max["connect_tcp"] * 1000, 1),
+                "tls_handshake_avg_ms": round(self.phase_totals["start_tls"] / handshakes * 1000, 1) if handshakes else None,
+                "tls_handshake_max_ms": round(self.phase_max["start_tls"] * 1000, 1),
+                "http_versions": dict(self.http_versions),
+                "pool": {
+                    "max_connections": MAX_CONNECTIONS,
+                    "max_keepalive": MAX_KEEPALIVE,
+                    "keepalive_expiry_seconds": KEEPALIVE_EXPIRY,
+                },
+            }
+
+
+_stats = _TransportStats()
+
+
+class _Trace:
+    """httpcore trace callback for one request: times connect/TLS phases if a new connection was opened."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self._started: Dict[str, float] = {}
+
+    def __call__(self, name: str, info: Dict[str, Any]):
+        # e.g. "connection.connect_tcp.started" / "connection.start_tls.complete"
+        scope, _, event = name.rpartition(".")
+        phase = scope.rpartition(".")[2]
+        if event == "started":
+            self._started[phase] = time.perf_counter()
+        elif event == "complete" and phase in self._started:
+            self.phases[phase] = time.perf_counter() - self._started.pop(phase)
+
+
+class _AsyncTrace(_Trace):
+    """httpcore requires a coroutine trace callback on async connections."""
+
+    async def __call__(self, name: str, info: Dict[str, Any]):
+        super().__call__(name, info)
+
+
+def _on_request(request: httpx.Request):
+    request.extensions["trace"] = _Trace()
+
+
+def _on_response(response: httpx.Response):
+    trace = response.request.extensions.get("trace")
+    if isinstance(trace, _Trace):
+        _stats.record(trace.phases, response.http_version)
+
+
+async def _on_request_async(request: httpx.Request):
+    request.extensions["trace"] = _AsyncTrace()
+
+
+async def _on_response_async(response: httpx.Response):
+    _on_response(response)
+
+
+def _ssl_context() -> ssl.SSLContext:
+    # httpcore sets ALPN (h2 / http/1.1) on this context per connection
+    return ssl.create_default_context(cafile=certifi.where() if certifi else None)
+
+
+_lock = threading.Lock()
+_ssl: Optional[ssl.SSLContext] = None
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _client_options() -> Dict[str, Any]:
+    global _ssl
+    if _ssl is None:
+        _ssl = _ssl_context()
+    return {
+        "http2": HTTP2,
+        "verify": _ssl,
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+    }
+
+
+def http_client() -> httpx.Client:
+    """The process-wide sync pool (for OpenAI / AzureOpenAI http_client=)."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(**_client_options(), event_hooks={
+                "request": [_on_request], "response": [_on_response]
+            })
+        return _client
+
+
+def async_http_client() -> httpx.AsyncClient:
+    """The process-wide async pool (for AsyncOpenAI http_client=)."""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(**_client_options(), event_hooks={
+                "request": [_on_request_async], "response": [_on_response_async]
+            })
+        return _async_client
+
+
+def azure_base_url() -> str:
+    """Azure OpenAI v1 endpoint used with the Responses API."""
+    return os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/") + "/openai/v1/"
+
+
+def openai_client() -> OpenAI:
+    """OpenAI client for the Azure v1 endpoint on the shared sync pool."""
+    return OpenAI(api_key=os.getenv("AZURE_OPENAI_API_KEY"), base_url=azure_base_url(), http_client=http_client())
+
+
+def async_openai_client() -> AsyncOpenAI:
+    """AsyncOpenAI client for the Azure v1 endpoint on the shared async pool."""
+    return AsyncOpenAI(api_key=os.getenv("AZURE_OPENAI_API_KEY"), base_url=azure_base_url(), http_client=async_http_client())
+
+
+def transport_stats() -> Dict[str, Any]:
+    """Connection reuse and handshake timings (for /api/stats/runtime)."""
+    return _stats.snapshot()
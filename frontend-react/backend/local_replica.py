@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Embedded local replica of dbo.vw_ISDSolution_All.
+
+The view is small (~5k rows), yet every query paid a network round trip to
+Azure SQL. With SQL_LOCAL_REPLICA=true, LocalReplica keeps a copy of the whole
+view in a SQLite file and NL2SQLPipeline runs statements there first:
+
+1. snapshot  - one SELECT * of the view, written to a new file (text columns
+   COLLATE NOCASE, like the database's case-insensitive collation) that then
+   replaces SQL_REPLICA_PATH. Taken during startup prewarm and again whenever
+   the stats refresher sees the view's fingerprint change
+2. translate - translate() rewrites the generated T-SQL subset for SQLite:
+   TOP n / TOP (n) -> LIMIT n (subqueries included), N'...' -> '...',
+   STRING_AGG -> group_concat, ISNULL -> ifnull, LEN -> length,
+   COUNT_BIG -> count, dbo.vw_ISDSolution_All -> the local table.
+   DISTINCT, LIKE, CASE, GROUP BY, CTEs, joins and window functions are
+   shared. Anything else returns None: other tables, functions outside the
+   list below, + between non-literals (string concatenation), TOP ... PERCENT
+   / WITH TIES, OFFSET / FETCH, APPLY, PIVOT, FOR XML / JSON, COLLATE,
+   STRING_AGG ... WITHIN GROUP, LIKE patterns with [character classes]
+3. execute   - the translated statement runs on a read-only connection under
+   the same fetch budget as Azure SQL (rows, bytes, time);
+   SQL_REPLICA_MAX_MS interrupts a runaway statement
+
+execute() returns None whenever the statement should go to Azure SQL instead:
+replica off or not built yet, untranslatable, a SQLite error or interrupted.
+The caller then runs it on Azure SQL as before, plan-cost check included.
+Values keep their Python types except decimals (float) and dates (ISO text);
+the view's columns are all text today.
+
+test_replica_parity.py runs the sample questions' SQL on both engines and
+reports every difference.
+
+Environment:
+    SQL_LOCAL_REPLICA     - true/false (default false)
+    SQL_REPLICA_PATH      - SQLite file (default <tempdir>/isd_vw_ISDSolution_All.sqlite3)
+    SQL_REPLICA_MAX_MS    - local execution time before falling back to Azure SQL (default 500)
+"""
+
+import datetime
+import decimal
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from query_guard import FetchBudget
+from row_cleaning import keyed_rows
+from sql_tokens import tokenize
+
+ENABLED = os.getenv("SQL_LOCAL_REPLICA", "false").lower() == "true"
+PATH = os.getenv("SQL_REPLICA_PATH", os.path.join(tempfile.gettempdir(), "isd_vw_ISDSolution_All.sqlite3"))
+MAX_MS = float(os.getenv("SQL_REPLICA_MAX_MS", "500"))
+
+VIEW = "dbo.vw_ISDSolution_All"
+TABLE = "vw_ISDSolution_All"
+SNAPSHOT_SQL = f"SELECT * FROM {VIEW}"
+INDEXED = ("industryName", "solutionAreaName", "orgName", "geoName", "solutionName")
+
+# T-SQL function -> SQLite function
+RENAMED = {"STRING_AGG": "group_concat", "ISNULL": "ifnull", "LEN": "length", "COUNT_BIG": "count"}
+# Functions with the same name and meaning in both
+FUNCTIONS = frozenset("""
+    COUNT SUM AVG MIN MAX LOWER UPPER LTRIM RTRIM TRIM COALESCE NULLIF ABS ROUND CAST
+    REPLACE SUBSTRING IIF ROW_NUMBER RANK DENSE_RANK
+""".split())
+# Keywords that may be followed by "(" without being a function call
+NOT_FUNCTIONS = frozenset("""
+    AND AS ALL BETWEEN BY CASE DISTINCT ELSE EXCEPT EXISTS FROM IN INTERSECT IS JOIN LIKE
+    NOT ON OR OVER SELECT THEN UNION WHEN WHERE WITH
+""".split())
+UNSUPPORTED = frozenset("""
+    APPLY COLLATE CONTAINS FETCH FOR FREETEXT OFFSET OPTION PERCENT PIVOT TABLESAMPLE TIES
+    UNPIVOT WITHIN
+""".split())
+
+
+def _word(token) -> str:
+    return token.text.upper() if token.kind == "word" else ""
+
+
+def _name(token) -> str:
+    """Identifier text without [brackets] / "quotes", upper-cased."""
+    text = token.text
+    if token.kind == "ident":
+        text = text[1:-1]
+    return text.upper() if token.kind in ("word", "ident") else ""
+
+
+def translate(sql: str) -> Optional[str]:
+    """sql (one validated T-SQL SELECT) in SQLite's dialect, or None when it is outside the subset."""
+    tokens = [token for token in tokenize(sql) if token.kind != "comment"]
+    significant = [i for i, token in enumerate(tokens) if token.kind != "space"]
+    depth, depths = 0, {}
+    for i in significant:
+        if tokens[i].text == ")":
+            depth -= 1
+        depths[i] = depth
+        if tokens[i].text == "(":
+            depth += 1
+
+    out = [token.text for token in tokens]
+    limits: Dict[int, str] = {}  # token index (len(tokens) = end) -> LIMIT inserted before it
+
+    def at(n):
+        return tokens[significant[n]] if 0 <= n < len(significant) else None
+
+    for n, i in enumerate(significant):
+        token = tokens[i]
+        word = _word(token)
+        following = at(n + 1)
+        if token.kind == "string":
+            if token.text[0] in "Nn":
+                out[i] = token.text[1:]
+        elif token.kind == "param":
+            return None
+        elif token.kind == "op":
+            if token.text == ";" and n == len(significant) - 1:
+                out[i] = ""
+            elif token.text in ("+", ";", "!<", "!>", "::"):
+                previous = at(n - 1)
+                if token.text != "+" or not (previous and previous.kind == "number"
+                                             and following and following.kind == "number"):
+                    return None
+        elif word in UNSUPPORTED:
+            return None
+        elif word == "LIKE" and following is not None and following.kind == "string" and "[" in following.text:
+            return None
+        elif word == "TOP":
+            end = _move_top(tokens, significant, depths, n, out)
+            if end is None:
+                return None
+            limits[end[0]] = end[1]
+        elif _name(token) in ("DBO", "SYS", "INFORMATION_SCHEMA") and following is not None and following.text == ".":
+            table = at(n + 2)
+            if _name(token) != "DBO" or table is None or _name(table) != TABLE.upper():
+                return None
+            out[i] = out[significant[n + 1]] = ""
+        elif word and following is not None and following.text == "(":
+            if word in RENAMED:
+                out[i] = RENAMED[word]
+            elif word not in FUNCTIONS and word not in NOT_FUNCTIONS:
+                return None
+
+    pieces = []
+    for i, text in enumerate(out):
+        if i in limits:
+            pieces.append(limits[i])
+        pieces.append(text)
+    statement = "".join(pieces).rstrip()
+    if len(tokens) in limits:
+        statement += limits[len(tokens)]
+    return statement
+
+
+def _move_top(tokens, significant, depths, n, out):
+    """Drop TOP n at significant[n] from out; returns (index, " LIMIT n") for the end of its SELECT, or None."""
+    previous = [_word(tokens[i]) for i in significant[max(0, n - 2):n]]
+    if not previous or not (previous[-1] == "SELECT" or (previous[-1] in ("DISTINCT", "ALL") and previous[:1] == ["SELECT"])):
+        return None
+    parts = [tokens[i] for i in significant[n + 1:n + 4]]
+    if parts and parts[0].kind == "number":
+        count, dropped = parts[0].text, 1
+    elif len(parts) == 3 and parts[0].text == "(" and parts[1].kind == "number" and parts[2].text == ")":
+        count, dropped = parts[1].text, 3
+    else:
+        return None
+    if not count.isdigit():
+        return None
+    top = significant[n]
+    for i in range(top, significant[n + dropped] + 1):
+        out[i] = ""
+
+    # The SELECT ends at the ")" closing its parenthesis, or with the statement
+    level = depths[top]
+    for i in significant[n + dropped + 1:]:
+        if tokens[i].text == ")" and depths[i] < level:
+            return i, f" LIMIT {count}"
+        if depths[i] == level and _word(tokens[i]) in ("UNION", "EXCEPT", "INTERSECT"):
+            return None  # LIMIT would bound the whole compound, TOP bounds one branch
+    return len(tokens), f" LIMIT {count}"
+
+
+def _local_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime.datetime) else value.isoformat()
+    return value
+
+
+def _column_type(values: List[Any]) -> str:
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, int) for value in present):
+        return "INTEGER"
+    if present and all(isinstance(value, (int, float)) for value in present):
+        return "REAL"
+    return "TEXT COLLATE NOCASE"
+
+
+class LocalReplica:
+    """SQLite copy of the view, refreshed on data change, serving translatable statements (see module docstring)."""
+
+    def __init__(self, connect: Optional[Callable[[], Any]] = None, enabled: bool = ENABLED,
+                 path: str = PATH, max_ms: float = MAX_MS):
+        """
+        Args:
+            connect: Returns a read-only DB connection, closed after the snapshot (e.g. NL2SQLPipeline.db_pool.acquire)
+            enabled: Serve statements locally (default SQL_LOCAL_REPLICA)
+            path: SQLite file (default SQL_REPLICA_PATH)
+            max_ms: Local execution time before falling back (default SQL_REPLICA_MAX_MS)
+        """
+        self._connect = connect
+        self.enabled = enabled
+        self.path = path
+        self.max_ms = max_ms
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()  # one snapshot at a time
+        self._readers = threading.local()  # per-thread read-only connection
+        self._generation = 0  # bumped by every snapshot; readers reopen the file
+        self._version = None
+        self.built_at = None
+        self._metrics = {
+            "rows": 0,
+            "snapshots": 0,
+            "snapshot_errors": 0,
+            "snapshot_ms": None,
+            "served": 0,
+            "untranslatable": 0,
+            "errors": 0,
+            "interrupted": 0,
+            "local_ms_total": 0.0,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self._generation > 0
+
+    # ------------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> bool:
+        """Copy the view into a new SQLite file and switch to it (blocking — run in a thread)."""
+        if not self.enabled or self._connect is None:
+            return False
+        with self._snapshot_lock:
+            start = time.perf_counter()
+            building = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                conn = self._connect()
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(SNAPSHOT_SQL)
+                    columns = [column[0] for column in cursor.description]
+                    rows = []
+                    while True:
+                        batch = cursor.fetchmany(1000)
+                        if not batch:
+                            break
+                        rows.extend(tuple(_local_value(value) for value in row) for row in batch)
+                    conn.rollback()
+                finally:
+                    cursor.close()
+                    conn.close()
+                self._write(building, columns, rows)
+                os.replace(building, self.path)
+            except Exception as e:
+                with self._lock:
+                    self._metrics["snapshot_errors"] += 1
+                print(f"⚠️  Local replica snapshot failed: {e}")
+                Path(building).unlink(missing_ok=True)
+                return False
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._generation += 1
+                self.built_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+                self._metrics.update(rows=len(rows), snapshot_ms=round(elapsed_ms, 1))
+                self._metrics["snapshots"] += 1
+        print(f"🗄️  Local replica: {len(rows)} rows of {VIEW} in {elapsed_ms:.0f} ms -> {self.path}")
+        return True
+
+    @staticmethod
+    def _write(path: str, columns: List[str], rows: List[tuple]):
+        Path(path).unlink(missing_ok=True)
+        db = sqlite3.connect(path)
+        try:
+            types = [_column_type([row[index] for row in rows]) for index in range(len(columns))]
+            definition = ", ".join(f'"{name}" {kind}' for name, kind in zip(columns, types))
+            db.execute(f"CREATE TABLE {TABLE} ({definition})")
+            db.executemany(f"INSERT INTO {TABLE} VALUES ({', '.join('?' * len(columns))})", rows)
+            for name in INDEXED:
+                if name in columns:
+                    db.execute(f'CREATE INDEX "ix_{name}" ON {TABLE} ("{name}")')
+            db.execute("ANALYZE")
+            db.commit()
+        finally:
+            db.close()
+
+    def set_data_version(self, version: Any):
+        """Re-snapshot when the view's fingerprint changes (called by the stats refresher)."""
+        with self._lock:
+            changed = version != self._version
+            # First fingerprint: only snapshot if the startup prewarm could not
+            refresh = changed and (self._version is not None or self._generation == 0)
+            self._version = version
+        if refresh:
+            self.snapshot()
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def _reader(self) -> sqlite3.Connection:
+        """This thread's read-only connection to the current snapshot."""
+        readers = self._readers
+        if getattr(readers, "generation", None) != self._generation:
+            if getattr(readers, "conn", None) is not None:
+                readers.conn.close()
+            readers.conn = sqlite3.connect(f"{Path(self.path).resolve().as_uri()}?mode=ro", uri=True)
+            readers.generation = self._generation
+        return readers.conn
+
+    def execute(self, sql: str, budget: FetchBudget) -> Optional[Dict[str, Any]]:
+        """
+        Run sql (validated, row-capped T-SQL) on the replica within budget.
+
+        Returns:
+            execute_sql-shaped dict ('columns', 'rows', 'row_count', 'truncated',
+            'timed_out', 'error'), or None when the statement must go to Azure SQL
+        """
+        if not self.ready:
+            return None
+        start = time.perf_counter()
+        local_sql = translate(sql)
+        if local_sql is None:
+            self._count("untranslatable")
+            return None
+        conn = self._reader()
+        deadline = start + self.max_ms / 1000
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        try:
+            cursor = conn.execute(local_sql)
+            columns = [column[0] for column in cursor.description]
+            rows = []
+            while budget.stopped is None:
+                batch = cursor.fetchmany(budget.next_size(1000))
+                if not batch:
+                    break
+                rows.extend(budget.take(batch))
+            cursor.close()
+        except sqlite3.Error as e:
+            interrupted = isinstance(e, sqlite3.OperationalError) and "interrupt" in str(e)
+            self._count("interrupted" if interrupted else "errors")
+            reason = f"over {self.max_ms:g} ms" if interrupted else f"error ({e})"
+            print(f"⚠️  Local replica {reason} — running on Azure SQL")
+            return None
+        finally:
+            conn.set_progress_handler(None, 0)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._metrics["served"] += 1
+            self._metrics["local_ms_total"] += elapsed_ms
+        capped = f", stopped at the {budget.stopped} limit" if budget.stopped else ""
+        print(f"⚡ Local replica: {len(rows)} rows in {elapsed_ms:.2f} ms{capped}\n")
+        return {
+            "columns": columns,
+            "rows": keyed_rows(columns, rows),
+            "row_count": len(rows),
+            "truncated": budget.stopped is not None,
+            "timed_out": budget.stopped == "time",
+            "error": None
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            generation = self._generation
+        local_ms = metrics.pop("local_ms_total")
+        attempts = metrics["served"] + metrics["untranslatable"] + metrics["errors"] + metrics["interrupted"]
+        return {
+            "enabled": self.enabled,
+            "ready": self.enabled and generation > 0,
+            "path": self.path,
+            "built_at": self.built_at,
+            **metrics,
+            "hit_ratio": round(metrics["served"] / attempts, 3) if attempts else None,
+            "avg_local_ms": round(local_ms / metrics["served"], 3) if metrics["served"] else None,
+        }
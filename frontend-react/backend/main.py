@@ -4,38 +4,32 @@ FastAPI Backend for NL2SQL Chat Interface
 Provides REST API endpoints for the React frontend
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import sys
 import os
+import asyncio
 from datetime import datetime
-import json
-import re
 
 # Add parent directory to path to import pipelines
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../data-ingestion/sql-direct'))
-from multi_agent_pipeline import MultiAgentPipeline
-
-# Helper function to strip HTML tags
-def strip_html(text):
-    """Remove HTML tags from text"""
-    if text is None or text == "(Not Set)":
-        return text
-    # Remove HTML tags
-    clean = re.compile('<.*?>')
-    text_without_tags = re.sub(clean, '', str(text))
-    # Replace multiple spaces/newlines with single space
-    text_without_tags = re.sub(r'\s+', ' ', text_without_tags)
-    return text_without_tags.strip()
+from admission import AdmissionRejected
+from facet_cube import FACETS
+from readiness import LazyPipeline
+from row_cleaning import clean_rows, clean_columnar
+from serialization import FastJSONResponse, CompressionMiddleware, CachedJSON, sse_event, compression_stats
+from stats_cache import StatsRefresher
+from metrics import server_timing
 
 # Initialize FastAPI app
 app = FastAPI(
     title="ISD NL2SQL API",
     description="Natural Language to SQL API for Industry Solutions Directory",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 # Configure CORS for React frontend
@@ -46,15 +40,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Initialize Multi-Agent pipeline
-pipeline = MultiAgentPipeline()
+# Negotiated br/gzip for JSON responses and the SSE stream
+app.add_middleware(CompressionMiddleware)
+
+# Multi-Agent pipeline — built and prewarmed after startup so uvicorn binds
+# immediately; requests that arrive earlier wait for it
+lazy_pipeline = LazyPipeline()
+
+# Live /api/stats snapshot, recomputed from the view in the background
+stats_refresher = StatsRefresher(
+    lambda: lazy_pipeline.pipeline.sql_executor.db_pool.acquire(),
+    on_fingerprint=lambda fingerprint: lazy_pipeline.pipeline.sql_executor.set_data_version(fingerprint),
+    static={
+        "safety": {
+            "mode": "READ-ONLY"
+        },
+        "model": {
+            "provider": "Azure OpenAI",
+            "model": "gpt-5.1 / gpt-5.4 (per-agent)"
+        }
+    }
+)
+STATS_MAX_AGE = int(os.getenv("STATS_CACHE_MAX_AGE", "60"))
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    # Not awaited: warm-up runs after the port is bound; /api/ready reports progress
+    app.state.warmup = asyncio.create_task(warm_up())
+
+
+async def warm_up():
+    await lazy_pipeline.start()
+    if lazy_pipeline.pipeline is not None:
+        stats_refresher.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await stats_refresher.stop()
+
+
+def conditional_response(request: Request, payload: CachedJSON, max_age: int) -> Response:
+    """Serve a pre-serialized payload, or 304 if the client already has this version."""
+    headers = {"ETag": payload.etag, "Cache-Control": f"public, max-age={max_age}"}
+    if payload.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
 
 # Pydantic models for request/response
 class QueryRequest(BaseModel):
     question: str
     conversation_id: Optional[str] = None
+    format: str = "rows"  # "rows" (list of dicts) or "columnar" (arrays + dictionaries)
 
 class QueryResponse(BaseModel):
     success: bool
@@ -66,12 +107,15 @@ class QueryResponse(BaseModel):
     explanation: Optional[str] = None
     confidence: Optional[str] = None
     columns: Optional[List[str]] = None
-    rows: Optional[List[Dict[str, Any]]] = None
+    rows: Optional[List[Any]] = None  # dicts, or arrays when format == "columnar"
     row_count: int = 0
+    format: str = "rows"
+    dictionaries: Optional[Dict[str, List[str]]] = None  # columnar only: col -> distinct values
     web_sources: Optional[List[Dict[str, str]]] = None  # Web search sources
     error: Optional[str] = None
     usage_stats: Optional[Dict[str, int]] = None  # Token usage statistics
     elapsed_time: Optional[float] = None  # Time elapsed in seconds
+    timings: Optional[Dict[str, float]] = None  # Seconds per pipeline stage (also sent as Server-Timing)
     timestamp: str
 
 class ConversationExportRequest(BaseModel):
@@ -81,9 +125,6 @@ class ConversationExportRequest(BaseModel):
 class ExampleQuestionsResponse(BaseModel):
     categories: Dict[str, List[str]]
 
-# In-memory storage for conversation history (in production, use Redis or DB)
-conversations: Dict[str, List[Dict[str, Any]]] = {}
-
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -95,25 +136,139 @@ async def root():
 
 @app.get("/api/health")
 async def health_check():
-    """Detailed health check"""
+    """Detailed health check (liveness — last known dependency state, never probes)"""
     app_mode = os.getenv('APP_MODE', 'seller').lower()
+    status = lazy_pipeline.status()
+    database = status["dependencies"].get("database")
     return {
         "status": "healthy",
-        "database": "connected",
-        "pipeline": "ready",
+        "database": "unknown" if database is None else ("connected" if database["ok"] else "unreachable"),
+        "pipeline": "ready" if status["ready"] else status["state"],
         "mode": app_mode,  # customer or seller
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once the pipeline is built and its dependencies answer
+    (cached probes), 503 while warming up or when a dependency is down
+    """
+    status = await lazy_pipeline.check()
+    return FastJSONResponse(
+        status_code=200 if status["ready"] else 503,
+        content={**status, "timestamp": datetime.now().isoformat()},
+        headers={"Cache-Control": "no-store"}
+    )
+
+async def admit(request: "QueryRequest", stream: bool):
+    """
+    Take a pipeline run slot for a query, or None if it will join a run already in flight.
+    Raises AdmissionRejected when the server is saturated. A request admitted with None
+    must pass admitted=False to the pipeline: should the flight end before the request
+    joins it, the run it starts instead takes its own slot.
+    """
+    pipeline = await lazy_pipeline.get()
+    if pipeline.joins_running_flight(request.question, request.conversation_id, stream=stream):
+        return None
+    return await pipeline.admission.admit()
+
+
+def busy_response(rejection: AdmissionRejected):
+    """429 with a Retry-After hint for a rejected query."""
+    return FastJSONResponse(
+        status_code=429,
+        content={
+            "success": False,
+            "error": "Server busy — please retry shortly",
+            "retry_after": rejection.retry_after
+        },
+        headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that holds an admission ticket until the response is over.
+    Released however it ends — finished, client gone, or body never started —
+    so a stream that never runs can't keep its run slot.
+    """
+
+    def __init__(self, content, ticket=None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self.ticket:
+                self.ticket.release()
+
+
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+
+
+async def until_disconnected(http_request: Request):
+    """Return once the client has gone away."""
+    while not await http_request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def cancel_on_disconnect(http_request: Request, events):
+    """
+    Relay an async generator until it ends or the client disconnects.
+
+    Disconnects are noticed while the pipeline is busy (e.g. waiting on an agent),
+    not only on the next write. The step in progress is then cancelled, which
+    aborts the Responses API stream or SQL statement it is waiting on; the run
+    never reaches its history write.
+    """
+    disconnected = asyncio.ensure_future(until_disconnected(http_request))
+    try:
+        while True:
+            step = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait({step, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                print("🔌 Client disconnected — cancelling pipeline run")
+                step.cancel()
+                try:
+                    await step
+                except BaseException:
+                    pass
+                return
+            try:
+                event = step.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        disconnected.cancel()
+        await events.aclose()
+
+
 @app.post("/api/query", response_model=QueryResponse)
-async def execute_query(request: QueryRequest):
+async def execute_query(request: QueryRequest, response: Response):
     """
     Execute a natural language query using multi-agent pipeline
-    Returns insights narrative + structured data
+    Returns insights narrative + structured data (429 + Retry-After when saturated);
+    per-stage timings in the body and the Server-Timing header
     """
     try:
-        # Process query through multi-agent pipeline
-        result = pipeline.process_query(request.question, request.conversation_id)
+        ticket = await admit(request, stream=False)
+    except AdmissionRejected as e:
+        return busy_response(e)
+    
+    try:
+        # Process query through multi-agent pipeline (async — never blocks the event loop)
+        pipeline = await lazy_pipeline.get()
+        result = await pipeline.process_query_async(request.question, request.conversation_id,
+                                                     admitted=ticket is not None)
+        timings = dict(result.get('timings') or {})
+        if ticket and ticket.waited >= 0.001:
+            timings['admission_wait'] = ticket.waited
+        if timings:
+            response.headers["Server-Timing"] = server_timing(timings, result.get('elapsed_time'))
         
         if not result['success']:
             return QueryResponse(
@@ -124,46 +279,12 @@ async def execute_query(request: QueryRequest):
             )
         
         # Convert rows to clean data (HTML stripping)
-        rows_data = []
-        if result['data']['rows']:
-            html_columns = [
-                'solutionDescription', 'industryDescription', 'SubIndustryDescription',
-                'solAreaDescription', 'orgDescription', 'areaSolutionDescription',
-                'industryThemeDesc', 'solutionPlayDesc', 'resourceLinkDescription',
-                'THEME', 'DESCRIPTION', 'DESC', 'SOLUTION_DESCRIPTION'
-            ]
-            
-            for row in result['data']['rows']:
-                row_dict = {}
-                for col in result['data']['columns']:
-                    try:
-                        value = row[col]
-                    except (KeyError, TypeError):
-                        idx = result['data']['columns'].index(col)
-                        value = row[idx]
-                    
-                    if value is None:
-                        row_dict[col] = "(Not Set)"
-                    elif hasattr(value, 'isoformat'):
-                        row_dict[col] = value.isoformat()
-                    else:
-                        str_value = str(value) if value != "NULL" else "(Not Set)"
-                        col_lower = col.lower()
-                        if (col in html_columns or 
-                            any(keyword in col_lower for keyword in ['desc', 'description', 'theme'])):
-                            str_value = strip_html(str_value)
-                        row_dict[col] = str_value
-                rows_data.append(row_dict)
-        
-        # Store in conversation history
-        if request.conversation_id:
-            if request.conversation_id not in conversations:
-                conversations[request.conversation_id] = []
-            conversations[request.conversation_id].append({
-                "question": request.question,
-                "narrative": result.get('narrative'),
-                "timestamp": result['timestamp']
-            })
+        dictionaries = None
+        if request.format == "columnar":
+            table = clean_columnar(result['data']['columns'], result['data']['rows'])
+            rows_data, dictionaries = table['rows'], table['dictionaries']
+        else:
+            rows_data = clean_rows(result['data']['columns'], result['data']['rows'])
         
         # Return comprehensive response with insights
         return QueryResponse(
@@ -178,35 +299,18 @@ async def execute_query(request: QueryRequest):
             columns=result['data']['columns'],
             rows=rows_data,
             row_count=len(rows_data),
+            format="columnar" if dictionaries is not None else "rows",
+            dictionaries=dictionaries,
             web_sources=result.get('web_sources'),
             usage_stats=result.get('usage_stats'),
             elapsed_time=result.get('elapsed_time'),
+            timings=result.get('timings'),
             timestamp=result['timestamp']
         )
         
-        # Store in conversation history
-        if request.conversation_id:
-            if request.conversation_id not in conversations:
-                conversations[request.conversation_id] = []
-            conversations[request.conversation_id].append({
-                'timestamp': datetime.now().isoformat(),
-                'question': request.question,
-                'sql': sql_result['sql'],
-                'row_count': result['row_count']
-            })
-        
-        return QueryResponse(
-            success=True,
-            question=request.question,
-            sql=sql_result['sql'],
-            explanation=sql_result['explanation'],
-            confidence=sql_result['confidence'],
-            columns=result['columns'],
-            rows=rows_data,
-            row_count=result['row_count'],
-            timestamp=datetime.now().isoformat()
-        )
-        
+    except AdmissionRejected as e:
+        # Expected to join a running flight, but it ended first and the server is saturated
+        return busy_response(e)
     except Exception as e:
         return QueryResponse(
             success=False,
@@ -214,178 +318,185 @@ async def execute_query(request: QueryRequest):
             error=str(e),
             timestamp=datetime.now().isoformat()
         )
+    finally:
+        if ticket:
+            ticket.release()
 
 
 @app.post("/api/query/stream")
-async def stream_query(request: QueryRequest):
+async def stream_query(request: QueryRequest, http_request: Request):
     """
     Execute a natural language query with streaming response.
-    Returns SSE events: metadata (agents 1-3), deltas (agent 4 tokens), done (final stats).
+    Returns SSE events: results (columns, right after SQL execution), rows (batches while
+    fetching), insights (agent 3), deltas (agent 4 tokens), done (final stats);
+    metadata only for clarifications/errors. 429 + Retry-After when saturated.
+    Closing the connection cancels the run (LLM stream, SQL statement, history write).
     """
-    # HTML-column list for stripping tags from SSE metadata rows
-    html_columns = [
-        'solutionDescription', 'industryDescription', 'SubIndustryDescription',
-        'solAreaDescription', 'orgDescription', 'areaSolutionDescription',
-        'industryThemeDesc', 'solutionPlayDesc', 'resourceLinkDescription',
-        'THEME', 'DESCRIPTION', 'DESC', 'SOLUTION_DESCRIPTION'
-    ]
-
-    def _clean_rows(columns, rows):
-        """Convert pyodbc rows to JSON-safe dicts with HTML stripping."""
-        cleaned = []
-        for row in rows:
-            row_dict = {}
-            for col in columns:
-                try:
-                    value = row[col]
-                except (KeyError, TypeError):
-                    idx = columns.index(col)
-                    value = row[idx]
-                if value is None:
-                    row_dict[col] = "(Not Set)"
-                elif hasattr(value, 'isoformat'):
-                    row_dict[col] = value.isoformat()
-                else:
-                    str_value = str(value) if value != "NULL" else "(Not Set)"
-                    col_lower = col.lower()
-                    if (col in html_columns or
-                        any(kw in col_lower for kw in ['desc', 'description', 'theme'])):
-                        str_value = strip_html(str_value)
-                    row_dict[col] = str_value
-            cleaned.append(row_dict)
-        return cleaned
-
-    def event_generator():
-        for event in pipeline.process_query_stream(request.question, request.conversation_id):
-            if event["type"] == "metadata" and "data" in event:
+    try:
+        ticket = await admit(request, stream=True)
+    except AdmissionRejected as e:
+        return busy_response(e)
+    
+    async def clean_events():
+        columns = []
+        pipeline = await lazy_pipeline.get()
+        async for event in pipeline.process_query_stream_async(request.question, request.conversation_id,
+                                                               admitted=ticket is not None):
+            # Events may be shared with coalesced requests — build cleaned copies, never mutate
+            if event["type"] in ("results", "metadata") and "data" in event:
                 # Clean rows for JSON serialization before sending
                 data = event.get("data", {})
-                if data.get("rows"):
-                    event["data"]["rows"] = _clean_rows(data["columns"], data["rows"])
-                    event["row_count"] = len(event["data"]["rows"])
-            yield f"data: {json.dumps(event, default=str)}\n\n"
+                columns = data.get("columns", [])
+                if request.format == "columnar":
+                    table = clean_columnar(columns, data.get("rows"))
+                    event = {**event, "data": table, "format": "columnar", "row_count": len(table["rows"])}
+                elif data.get("rows"):
+                    rows = clean_rows(columns, data["rows"])
+                    event = {**event, "data": {**data, "rows": rows}, "row_count": len(rows)}
+            elif event["type"] == "rows" and event["rows"]:
+                # Incremental batch for the table announced by the last results event
+                if request.format == "columnar":
+                    table = clean_columnar(columns, event["rows"])
+                    event = {**event, "rows": table["rows"], "dictionaries": table["dictionaries"], "format": "columnar"}
+                else:
+                    event = {**event, "rows": clean_rows(columns, event["rows"])}
+            yield sse_event(event)
+
+    # Stage timings only exist once the run ends — they arrive in the done event;
+    # the header can only carry what is known before the first byte
+    headers = {}
+    if ticket and ticket.waited >= 0.001:
+        headers["Server-Timing"] = server_timing({"admission_wait": ticket.waited})
+    # The ticket is released by the response itself, also when the body never starts
+    return AdmittedStreamingResponse(cancel_on_disconnect(http_request, clean_events()), ticket=ticket,
+                                     media_type="text/event-stream", headers=headers)
+
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+# Example questions never change at runtime — serialize once, serve with an ETag
+EXAMPLE_QUESTIONS = {
+    "Defense & Intelligence": [
+        "What AI and analytics solutions exist for defense intelligence and threat analysis?",
+        "Show me cybersecurity solutions for defense and intelligence organizations",
+        "What solutions support secure data sharing and classified information management?",
+        "Show me solutions for surveillance, reconnaissance, and situational awareness",
+        "What AI-powered solutions help with defense intelligence operations?",
+        "Show me solutions for command and control systems and mission management"
+    ],
+    "Defense Industrial Base": [
+        "What solutions support defense modernization and military readiness?",
+        "Show me cybersecurity solutions for defense contractors and the defense industrial base",
+        "What solutions help with secure supply chain management for defense organizations?",
+        "Show me solutions for defense logistics and mission-critical operations",
+        "What AI-powered solutions exist for defense intelligence and threat analysis?",
+        "Show me solutions for secure communications and classified data management"
+    ],
+    "Education": [
+        "What solutions help improve student engagement and learning outcomes?",
+        "Show me campus management and administrative solutions for education",
+        "What fundraising and donor management solutions are available for higher education?",
+        "Show me student lifecycle management platforms",
+        "What learning analytics and educational data platforms are available?",
+        "Show me alumni relationship management and engagement solutions"
+    ],
+    "Energy & Resources": [
+        "What sustainability and carbon management solutions are available for energy companies?",
+        "Show me asset management solutions for oil and gas operations",
+        "What smart grid and energy distribution solutions are available?",
+        "Show me predictive maintenance solutions for energy infrastructure",
+        "What emissions tracking and management solutions help with environmental compliance?",
+        "Show me renewable energy optimization and management solutions"
+    ],
+    "Financial Services": [
+        "What financial services solutions help with risk management?",
+        "Show me solutions for anti-money laundering and financial crime prevention",
+        "What solutions help with regulatory compliance in financial services?",
+        "What are the best banking solutions for improving customer engagement and retention?",
+        "Show me fraud detection and prevention solutions for financial institutions",
+        "What solutions support core banking modernization and digital transformation?"
+    ],
+    "Government": [
+        "What solutions improve citizen engagement and digital government services?",
+        "Show me case management solutions for government agencies",
+        "What public safety and emergency response solutions are available?",
+        "Show me smart city and urban management solutions",
+        "What grant management and funding distribution systems are available?",
+        "Show me solutions for government transparency and open data initiatives"
+    ],
+    "Healthcare & Life Sciences": [
+        "Show me AI-powered solutions for healthcare and life sciences",
+        "What solutions help improve patient engagement and care coordination?",
+        "Show me electronic health record and clinical data management solutions",
+        "What solutions enable remote patient monitoring and telehealth?",
+        "Show me solutions for clinical workflow optimization and automation",
+        "What population health management and analytics solutions are available?"
+    ],
+    "Manufacturing & Mobility": [
+        "What manufacturing solutions leverage IoT and AI for smart factories?",
+        "Show me predictive maintenance solutions for manufacturing equipment",
+        "What solutions optimize supply chain management for manufacturers?",
+        "Show me smart factory and Industry 4.0 solutions",
+        "What solutions help with quality control and automated defect detection?",
+        "Show me asset performance management and mobility solutions"
+    ],
+    "Media & Entertainment": [
+        "What solutions support content creation and digital media management?",
+        "Show me streaming and media delivery platform solutions",
+        "What solutions help with audience analytics and engagement for media companies?",
+        "Show me solutions for digital rights management and content monetization",
+        "What AI-powered solutions exist for media personalization and recommendation?",
+        "Show me solutions for live event management and broadcasting"
+    ],
+    "Retail & Consumer Goods": [
+        "What solutions enhance customer experience in retail and consumer goods?",
+        "Show me inventory management and stock optimization solutions for retail",
+        "What modern point of sale and retail transaction solutions are available?",
+        "Show me solutions for creating personalized shopping experiences",
+        "What omnichannel retail and unified commerce solutions are available?",
+        "Show me supply chain visibility and logistics solutions for retail"
+    ],
+    "Telecommunications": [
+        "What solutions help telecom companies with network optimization and management?",
+        "Show me customer experience and churn reduction solutions for telecom",
+        "What 5G and next-generation network solutions are available?",
+        "Show me solutions for telecom billing, revenue management, and monetization",
+        "What AI-powered solutions exist for telecom network operations?",
+        "Show me solutions for telecom fraud detection and prevention"
+    ],
+    "Cross-Industry": [
+        "Show me comprehensive cybersecurity and threat protection solutions",
+        "What AI and machine learning solutions are available across industries?",
+        "Show me cloud migration and modernization solutions",
+        "What data analytics and business intelligence platforms are available?",
+        "Show me customer relationship management and CRM solutions",
+        "What sustainability and ESG reporting solutions are available?"
+    ]
+}
+_examples_payload = CachedJSON({"categories": EXAMPLE_QUESTIONS})
+EXAMPLES_MAX_AGE = int(os.getenv("EXAMPLES_CACHE_MAX_AGE", "3600"))
 
 
 @app.get("/api/examples", response_model=ExampleQuestionsResponse)
-async def get_example_questions():
+async def get_example_questions(request: Request):
     """
     Get categorized example questions
     """
-    examples = {
-        "Defense & Intelligence": [
-            "What AI and analytics solutions exist for defense intelligence and threat analysis?",
-            "Show me cybersecurity solutions for defense and intelligence organizations",
-            "What solutions support secure data sharing and classified information management?",
-            "Show me solutions for surveillance, reconnaissance, and situational awareness",
-            "What AI-powered solutions help with defense intelligence operations?",
-            "Show me solutions for command and control systems and mission management"
-        ],
-        "Defense Industrial Base": [
-            "What solutions support defense modernization and military readiness?",
-            "Show me cybersecurity solutions for defense contractors and the defense industrial base",
-            "What solutions help with secure supply chain management for defense organizations?",
-            "Show me solutions for defense logistics and mission-critical operations",
-            "What AI-powered solutions exist for defense intelligence and threat analysis?",
-            "Show me solutions for secure communications and classified data management"
-        ],
-        "Education": [
-            "What solutions help improve student engagement and learning outcomes?",
-            "Show me campus management and administrative solutions for education",
-            "What fundraising and donor management solutions are available for higher education?",
-            "Show me student lifecycle management platforms",
-            "What learning analytics and educational data platforms are available?",
-            "Show me alumni relationship management and engagement solutions"
-        ],
-        "Energy & Resources": [
-            "What sustainability and carbon management solutions are available for energy companies?",
-            "Show me asset management solutions for oil and gas operations",
-            "What smart grid and energy distribution solutions are available?",
-            "Show me predictive maintenance solutions for energy infrastructure",
-            "What emissions tracking and management solutions help with environmental compliance?",
-            "Show me renewable energy optimization and management solutions"
-        ],
-        "Financial Services": [
-            "What financial services solutions help with risk management?",
-            "Show me solutions for anti-money laundering and financial crime prevention",
-            "What solutions help with regulatory compliance in financial services?",
-            "What are the best banking solutions for improving customer engagement and retention?",
-            "Show me fraud detection and prevention solutions for financial institutions",
-            "What solutions support core banking modernization and digital transformation?"
-        ],
-        "Government": [
-            "What solutions improve citizen engagement and digital government services?",
-            "Show me case management solutions for government agencies",
-            "What public safety and emergency response solutions are available?",
-            "Show me smart city and urban management solutions",
-            "What grant management and funding distribution systems are available?",
-            "Show me solutions for government transparency and open data initiatives"
-        ],
-        "Healthcare & Life Sciences": [
-            "Show me AI-powered solutions for healthcare and life sciences",
-            "What solutions help improve patient engagement and care coordination?",
-            "Show me electronic health record and clinical data management solutions",
-            "What solutions enable remote patient monitoring and telehealth?",
-            "Show me solutions for clinical workflow optimization and automation",
-            "What population health management and analytics solutions are available?"
-        ],
-        "Manufacturing & Mobility": [
-            "What manufacturing solutions leverage IoT and AI for smart factories?",
-            "Show me predictive maintenance solutions for manufacturing equipment",
-            "What solutions optimize supply chain management for manufacturers?",
-            "Show me smart factory and Industry 4.0 solutions",
-            "What solutions help with quality control and automated defect detection?",
-            "Show me asset performance management and mobility solutions"
-        ],
-        "Media & Entertainment": [
-            "What solutions support content creation and digital media management?",
-            "Show me streaming and media delivery platform solutions",
-            "What solutions help with audience analytics and engagement for media companies?",
-            "Show me solutions for digital rights management and content monetization",
-            "What AI-powered solutions exist for media personalization and recommendation?",
-            "Show me solutions for live event management and broadcasting"
-        ],
-        "Retail & Consumer Goods": [
-            "What solutions enhance customer experience in retail and consumer goods?",
-            "Show me inventory management and stock optimization solutions for retail",
-            "What modern point of sale and retail transaction solutions are available?",
-            "Show me solutions for creating personalized shopping experiences",
-            "What omnichannel retail and unified commerce solutions are available?",
-            "Show me supply chain visibility and logistics solutions for retail"
-        ],
-        "Telecommunications": [
-            "What solutions help telecom companies with network optimization and management?",
-            "Show me customer experience and churn reduction solutions for telecom",
-            "What 5G and next-generation network solutions are available?",
-            "Show me solutions for telecom billing, revenue management, and monetization",
-            "What AI-powered solutions exist for telecom network operations?",
-            "Show me solutions for telecom fraud detection and prevention"
-        ],
-        "Cross-Industry": [
-            "Show me comprehensive cybersecurity and threat protection solutions",
-            "What AI and machine learning solutions are available across industries?",
-            "Show me cloud migration and modernization solutions",
-            "What data analytics and business intelligence platforms are available?",
-            "Show me customer relationship management and CRM solutions",
-            "What sustainability and ESG reporting solutions are available?"
-        ]
-    }
-    
-    return ExampleQuestionsResponse(categories=examples)
+    return conditional_response(request, _examples_payload, EXAMPLES_MAX_AGE)
 
 @app.get("/api/conversation/{conversation_id}")
 async def get_conversation(conversation_id: str):
     """
     Retrieve conversation history
     """
-    if conversation_id not in conversations:
+    pipeline = await lazy_pipeline.get()
+    session = pipeline.sessions.peek(conversation_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
+    messages = session.transcript()
     return {
         "conversation_id": conversation_id,
-        "messages": conversations[conversation_id],
-        "message_count": len(conversations[conversation_id])
+        "messages": messages,
+        "message_count": len(messages)
     }
 
 @app.post("/api/conversation/export")
@@ -403,25 +514,91 @@ async def export_conversation(request: ConversationExportRequest):
     return export_data
 
 @app.get("/api/stats")
-async def get_statistics():
+async def get_statistics(request: Request):
     """
-    Get database and usage statistics
+    Get database statistics (live, refreshed in the background; ETag/Cache-Control)
     """
-    return {
-        "database": {
-            "view": "dbo.vw_ISDSolution_All",
-            "total_rows": 5118,
-            "total_columns": 33
-        },
-        "safety": {
-            "mode": "READ-ONLY",
-            "validation_layers": 4
-        },
-        "model": {
-            "provider": "Azure OpenAI",
-            "model": "gpt-5.1 / gpt-5.4 (per-agent)"
-        }
-    }
+    return conditional_response(request, stats_refresher.snapshot, STATS_MAX_AGE)
+
+@app.get("/api/facets")
+async def get_facets(by: Optional[str] = None, industry: Optional[List[str]] = Query(None),
+                     sub_industry: Optional[List[str]] = Query(None), solution_area: Optional[List[str]] = Query(None),
+                     geo: Optional[List[str]] = Query(None), partner: Optional[List[str]] = Query(None),
+                     status: str = "Approved", top: Optional[int] = Query(None, ge=1)):
+    """
+    Distinct-solution counts from the facet cube, as {columns, rows} for ChartViewer
+    (?by=industry&geo=Canada&top=10; repeat a filter for several values, status= for every status)
+    """
+    pipeline = await lazy_pipeline.get()
+    cube = pipeline.sql_executor.facet_cube
+    if not cube.ready:
+        raise HTTPException(status_code=503, detail="Facet cube is not loaded")
+    if by is not None and by not in FACETS:
+        raise HTTPException(status_code=400, detail=f"Unknown facet '{by}' (one of {', '.join(FACETS)})")
+    if pipeline.sql_executor.app_mode != 'seller' and (by == "partner" or partner):
+        raise HTTPException(status_code=400, detail="Partner facets are only available in seller mode")
+    selected = {"industry": industry, "sub_industry": sub_industry, "solution_area": solution_area,
+                "geo": geo, "partner": partner, "status": [status] if status else None}
+    filters = {FACETS[name]: values for name, values in selected.items() if values}
+    return cube.series(FACETS[by] if by else None, filters, top)
+
+@app.get("/api/stats/runtime")
+async def get_runtime_statistics():
+    """
+    Get in-process counters (sessions, compression, coalescing, admission, LLM transport, DB pool, query guard, local replica, facet cube, SQL and semantic caches, templates, speculation, answer stage graph, stats refresher) — never cached
+    """
+    pipeline = await lazy_pipeline.get()
+    from llm_transport import transport_stats  # loaded by the pipeline; kept off main's import path
+    return FastJSONResponse({
+        "sessions": pipeline.sessions.stats(),
+        "compression": compression_stats(),
+        "coalescing": pipeline.flights.stats(),
+        "admission": pipeline.admission.stats(),
+        "llm_transport": transport_stats(),
+        "db_pool": pipeline.sql_executor.db_pool.stats(),
+        "query_guard": pipeline.sql_executor.query_guard.stats(),
+        "replica": pipeline.sql_executor.replica.stats(),
+        "facet_cube": pipeline.sql_executor.facet_cube.stats(),
+        "sql_cache": pipeline.sql_executor.result_cache.stats(),
+        "semantic_cache": pipeline.semantic_cache.stats(),
+        "templates": pipeline.sql_executor.template_router.stats(),
+        "speculation": pipeline.metrics.speculation_stats(),
+        "answer_graph": pipeline.answer_graph.stats(),
+        "stats_refresher": stats_refresher.stats(),
+        "startup": lazy_pipeline.status(),
+        "timestamp": datetime.now().isoformat()
+    }, headers={"Cache-Control": "no-store"})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Prometheus metrics: per-stage latency, queue wait, formatter TTFT, tokens and rows histograms
+    """
+    pipeline = await lazy_pipeline.get()
+    admission = pipeline.admission.stats()
+    db_pool = pipeline.sql_executor.db_pool.stats()
+    sql_cache = pipeline.sql_executor.result_cache.stats()
+    semantic_cache = pipeline.semantic_cache.stats()
+    templates = pipeline.sql_executor.template_router.stats()
+    query_guard = pipeline.sql_executor.query_guard.stats()
+    replica = pipeline.sql_executor.replica.stats()
+    facet_cube = pipeline.sql_executor.facet_cube.stats()
+    return PlainTextResponse(pipeline.metrics.render(gauges={
+        "isd_admission_active": ("Pipeline runs holding an admission slot.", admission["active"]),
+        "isd_admission_queued": ("Requests waiting for an admission slot.", admission["queued"]),
+        "isd_coalesced_in_flight": ("Coalesced runs currently in flight.", pipeline.flights.stats()["in_flight"]),
+        "isd_active_sessions": ("Conversation sessions held in memory.", pipeline.sessions.stats()["active_sessions"]),
+        "isd_db_pool_in_use": ("Database connections checked out of the pool.", db_pool["in_use"]),
+        "isd_db_pool_open": ("Database connections open (idle + in use).", db_pool["open"]),
+        "isd_query_guard_refused": ("Statements refused because their estimated plan cost was over the limit.", query_guard["rejected"]),
+        "isd_replica_hit_ratio": ("Statements served by the local replica instead of Azure SQL.", replica["hit_ratio"] or 0),
+        "isd_facet_cube_hit_ratio": ("Statements answered by the facet cube without running SQL.", facet_cube["hit_ratio"] or 0),
+        "isd_sql_cache_entries": ("Results held in the SQL result cache.", sql_cache["entries"]),
+        "isd_sql_cache_hit_ratio": ("SQL result cache hits (fresh + stale) per lookup.", sql_cache["hit_ratio"] or 0),
+        "isd_semantic_cache_entries": ("Question/SQL pairs held in the semantic cache.", semantic_cache["entries"]),
+        "isd_semantic_cache_hit_ratio": ("Semantic cache lookups that reused stored SQL.", semantic_cache["hit_ratio"] or 0),
+        "isd_template_hit_ratio": ("Questions answered by a SQL template instead of the model.", templates["hit_ratio"] or 0),
+    }), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
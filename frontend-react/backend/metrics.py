@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Per-stage latency, token and row metrics for the multi-agent pipeline.
+
+Every pipeline run records its stage spans on its RequestContext (planner,
+nl2sql, sql_execution, insights, formatter, queue waits, and the formatter's
+time-to-first-token). Those spans are exposed in three ways:
+
+- Server-Timing response headers (server_timing), visible in browser devtools
+- a "timings" block in the /api/query response and the SSE done event
+- Prometheus histograms at /metrics (PipelineMetrics.render), aggregated over
+  all runs of this process
+
+The exposition format is written directly, so no prometheus_client dependency
+is needed. Coalesced requests share one run and are observed once.
+
+Runs cancelled because the client disconnected are counted by the stage they
+were in, with the tokens they had spent and an estimate of the tokens saved:
+the average usage of the stages they never reached, measured on successful
+runs, minus what the formatter had already streamed.
+
+Follow-up turns may start SQL generation while the planner is still running
+(see MultiAgentPipeline._plan_with_speculation). Each speculation is counted
+as used, discarded (finished, but the planner wanted no new query) or
+cancelled (still running when the planner said so), with the tokens the
+discarded ones spent and the planner time the used ones overlapped.
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from request_context import RequestContext
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+
+# Pipeline stages in execution order (planner is skipped on first messages)
+STAGE_ORDER = ("planner", "nl2sql", "sql_execution", "insights", "formatter")
+CHARS_PER_TOKEN = 4  # rough English average, for narrative already streamed
+
+
+class Counter:
+    """Monotonic counter with one series per label value."""
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self._series: Dict[str, float] = {}
+
+    def inc(self, amount: float = 1, label_value: str = ""):
+        self._series[label_value] = self._series.get(label_value, 0) + amount
+
+    def value(self, label_value: str = "") -> float:
+        return self._series.get(label_value, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_value in sorted(self._series):
+            labels = f'{{{self.label}="{label_value}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {_format(self._series[label_value])}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value."""
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float], label: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series: Dict[str, Tuple[List[int], List[float]]] = {}  # label -> (bucket counts, [sum, count])
+
+    def observe(self, value: float, label_value: str = ""):
+        counts, totals = self._series.setdefault(label_value, ([0] * len(self.buckets), [0.0, 0]))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    def _labels(self, label_value: str, le: Optional[str] = None) -> str:
+        pairs = []
+        if self.label:
+            pairs.append(f'{self.label}="{label_value}"')
+        if le is not None:
+            pairs.append(f'le="{le}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value in sorted(self._series):
+            counts, (total, count) = self._series[label_value]
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{self._labels(label_value, _format(bound))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{self._labels(label_value, '+Inf')} {count}")
+            lines.append(f"{self.name}_sum{self._labels(label_value)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(label_value)} {count}")
+        return lines
+
+
+def _format(value: float) -> str:
+    if isinstance(value, float) and math.isfinite(value) and not value.is_integer():
+        return repr(round(value, 6))
+    return str(int(value))
+
+
+class PipelineMetrics:
+    """Process-wide histograms fed by finished pipeline runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_seconds = Histogram(
+            "isd_request_duration_seconds", "End-to-end pipeline run time by outcome.", LATENCY_BUCKETS, "outcome")
+        self.stage_seconds = Histogram(
+            "isd_stage_duration_seconds", "Time spent inside each pipeline stage.", LATENCY_BUCKETS, "stage")
+        self.stage_wait_seconds = Histogram(
+            "isd_stage_queue_seconds", "Time spent waiting for a stage concurrency slot.", LATENCY_BUCKETS, "stage")
+        self.ttft_seconds = Histogram(
+            "isd_formatter_ttft_seconds", "Time from the formatter request to its first streamed token.", LATENCY_BUCKETS)
+        self.stage_tokens = Histogram(
+            "isd_stage_tokens", "Azure OpenAI tokens (input + output) per stage and run.", TOKEN_BUCKETS, "stage")
+        self.rows = Histogram(
+            "isd_sql_rows", "Rows returned by SQL execution.", ROW_BUCKETS)
+        self.cancelled = Counter(
+            "isd_cancelled_runs_total", "Runs cancelled by client disconnect, by the stage they were in.", "stage")
+        self.cancelled_spent_tokens = Counter(
+            "isd_cancelled_spent_tokens_total", "Tokens already used by runs that were then cancelled.")
+        self.cancelled_saved_tokens = Counter(
+            "isd_cancelled_saved_tokens_total", "Estimated tokens not spent thanks to cancellation.")
+        self.speculation = Counter(
+            "isd_speculation_total", "Speculative SQL runs started next to the planner, by outcome.", "outcome")
+        self.speculation_wasted_tokens = Counter(
+            "isd_speculation_wasted_tokens_total", "Tokens spent on speculative SQL generation that was discarded.")
+        self.speculation_saved_seconds = Counter(
+            "isd_speculation_saved_seconds_total", "Planner time overlapped by speculative SQL work that was used.")
+        self._stage_token_totals: Dict[str, List[float]] = {}  # stage -> [tokens, runs] over successful runs
+
+    def observe(self, ctx: RequestContext, outcome: str) -> Optional[int]:
+        """
+        Record one finished run (outcome: success, clarification, error or cancelled).
+
+        Returns:
+            Estimated tokens saved, for cancelled runs
+        """
+        with self._lock:
+            self.request_seconds.observe(ctx.elapsed(), outcome)
+            for stage, seconds in ctx.timings.items():
+                if stage == "formatter_ttft":
+                    self.ttft_seconds.observe(seconds)
+                elif stage.endswith("_wait"):
+                    self.stage_wait_seconds.observe(seconds, stage[:-len("_wait")])
+                else:
+                    self.stage_seconds.observe(seconds, stage)
+            for stage, tokens in ctx.stage_tokens.items():
+                self.stage_tokens.observe(tokens, stage)
+            if ctx.row_count is not None:
+                self.rows.observe(ctx.row_count)
+            if outcome == "success":
+                for stage, tokens in ctx.stage_tokens.items():
+                    totals = self._stage_token_totals.setdefault(stage, [0.0, 0])
+                    totals[0] += tokens
+                    totals[1] += 1
+            elif outcome == "cancelled":
+                saved = self._estimate_saved_tokens(ctx)
+                self.cancelled.inc(1, ctx.stage or "between_stages")
+                self.cancelled_spent_tokens.inc(ctx.total_tokens)
+                self.cancelled_saved_tokens.inc(saved)
+                return saved
+
+    def _estimate_saved_tokens(self, ctx: RequestContext) -> int:
+        """Average tokens of the stages a cancelled run never finished, minus narrative already streamed."""
+        if ctx.stage in STAGE_ORDER:
+            first = STAGE_ORDER.index(ctx.stage)
+        else:
+            finished = [STAGE_ORDER.index(stage) for stage in ctx.timings if stage in STAGE_ORDER]
+            first = max(finished) + 1 if finished else STAGE_ORDER.index("nl2sql")
+        saved = 0.0
+        for stage in STAGE_ORDER[first:]:
+            tokens, runs = self._stage_token_totals.get(stage, (0.0, 0))
+            if runs:
+                saved += tokens / runs
+        if ctx.stage == "formatter":
+            saved -= ctx.streamed_chars / CHARS_PER_TOKEN
+        return max(int(saved), 0)
+
+    def observe_speculation(self, outcome: str, wasted_tokens: int = 0, saved_seconds: float = 0.0):
+        """Record one speculation (outcome: used, discarded or cancelled)."""
+        with self._lock:
+            self.speculation.inc(1, outcome)
+            self.speculation_wasted_tokens.inc(wasted_tokens)
+            self.speculation_saved_seconds.inc(saved_seconds)
+
+    def speculation_stats(self) -> Dict[str, float]:
+        with self._lock:
+            used, discarded, cancelled = (self.speculation.value(outcome) for outcome in ("used", "discarded", "cancelled"))
+            wasted = self.speculation_wasted_tokens.value()
+            saved = self.speculation_saved_seconds.value()
+        started = used + discarded + cancelled
+        return {
+            "started": int(started),
+            "used": int(used),
+            "discarded": int(discarded),
+            "cancelled": int(cancelled),
+            "hit_ratio": round(used / started, 3) if started else None,
+            "wasted_tokens": int(wasted),
+            "saved_seconds": round(saved, 2),
+            "avg_saved_ms": round(saved / used * 1000, 1) if used else 0.0,
+        }
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """
+        Prometheus text exposition of all histograms and counters.
+
+        Args:
+            gauges: Extra point-in-time values, name -> (help, value)
+        """
+        with self._lock:
+            lines = []
+            for metric in (self.request_seconds, self.stage_seconds, self.stage_wait_seconds,
+                           self.ttft_seconds, self.stage_tokens, self.rows, self.cancelled,
+                           self.cancelled_spent_tokens, self.cancelled_saved_tokens, self.speculation,
+                           self.speculation_wasted_tokens, self.speculation_saved_seconds):
+                lines.extend(metric.render())
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_format(value)}"])
+        return "\n".join(lines) + "\n"
+
+
+def server_timing(timings: Optional[Dict[str, float]], total: Optional[float] = None) -> str:
+    """Server-Timing header value (milliseconds) for a timings dict in seconds."""
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in (timings or {}).items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
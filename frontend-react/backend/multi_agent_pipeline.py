@@ -6,16 +6,26 @@ Four-agent architecture: Query Planner → SQL Executor → Insight Analyzer →
 
 import os
 import json
+import asyncio
+import threading
 import time
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+from contextlib import aclosing, asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Any, Tuple
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import sys
 
 # Add path for nl2sql_pipeline
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../data-ingestion/sql-direct'))
 from nl2sql_pipeline import NL2SQLPipeline
+from session_manager import SessionManager, ConversationSession
+from single_flight import SingleFlight
+from admission import AdmissionController, AdmissionRejected
+from request_context import RequestContext, usage_tokens
+from metrics import PipelineMetrics
+from llm_transport import openai_client, async_openai_client
+from semantic_cache import SemanticCache, default_embedder
+from stage_graph import Stage, StageGraph
 
 load_dotenv()
 
@@ -23,15 +33,16 @@ load_dotenv()
 class QueryPlanner:
     """Agent 1: Analyzes user intent and routes to appropriate processing path"""
     
-    def __init__(self, llm_client: OpenAI):
+    def __init__(self, llm_client: OpenAI, async_llm_client: Optional[AsyncOpenAI] = None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
         self.deployment = os.getenv("MODEL_QUERY_PLANNER", os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "gpt-5.1"))
         self.reasoning_effort = os.getenv("MODEL_QUERY_PLANNER_REASONING", "low")
-    
+
     def analyze_intent(self, question: str, conversation_history: List[Dict], previous_response_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Analyze user intent and determine processing strategy.
-        
+
         Returns:
             {
                 "intent": "query" | "analyze" | "summarize" | "compare",
@@ -40,6 +51,24 @@ class QueryPlanner:
                 "reasoning": "explanation of intent"
             }
         """
+        try:
+            kwargs = self._build_request(question, conversation_history, previous_response_id)
+            response = self.llm_client.responses.create(**kwargs)
+            return self._parse_response(response)
+        except Exception as e:
+            return self._fallback(e)
+
+    async def analyze_intent_async(self, question: str, conversation_history: List[Dict], previous_response_id: Optional[str] = None) -> Dict[str, Any]:
+        """Non-blocking variant of analyze_intent (uses the shared AsyncOpenAI client)."""
+        try:
+            kwargs = self._build_request(question, conversation_history, previous_response_id)
+            response = await self.async_llm_client.responses.create(**kwargs)
+            return self._parse_response(response)
+        except Exception as e:
+            return self._fallback(e)
+
+    def _build_request(self, question: str, conversation_history: List[Dict], previous_response_id: Optional[str]) -> Dict[str, Any]:
+        """Build Responses API kwargs for intent analysis."""
         system_prompt = """You are a query intent analyzer for an Industry Solutions Directory chatbot.
 
 **Task**: Determine if user wants NEW data or to analyze EXISTING results from conversation.
@@ -107,66 +136,68 @@ class QueryPlanner:
                 ])
             user_prompt = f'Question: "{question}"\n\n{history_context}\n\nAnalyze the intent and routing strategy.'
 
-        try:
-            kwargs = {
-                "model": self.deployment,
-                "instructions": system_prompt,
-                "input": user_prompt,
-                "text": {"format": {
-                    "type": "json_schema",
-                    "name": "query_plan",
-                    "strict": True,
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "intent": {
-                                "type": "string",
-                                "enum": ["query", "analyze", "summarize", "compare"]
-                            },
-                            "needs_new_query": {"type": "boolean"},
-                            "query_type": {
-                                "type": "string",
-                                "enum": ["specific", "aggregate", "exploratory"]
-                            },
-                            "reasoning": {"type": "string"}
+        kwargs = {
+            "model": self.deployment,
+            "instructions": system_prompt,
+            "input": user_prompt,
+            "text": {"format": {
+                "type": "json_schema",
+                "name": "query_plan",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "intent": {
+                            "type": "string",
+                            "enum": ["query", "analyze", "summarize", "compare"]
                         },
-                        "required": ["intent", "needs_new_query", "query_type", "reasoning"],
-                        "additionalProperties": False
-                    }
-                }}
-            }
-            if previous_response_id:
-                kwargs["previous_response_id"] = previous_response_id
-            if self.reasoning_effort and self.reasoning_effort != "none":
-                kwargs["reasoning"] = {"effort": self.reasoning_effort}
-            
-            response = self.llm_client.responses.create(**kwargs)
-            
-            result = json.loads(response.output_text)
-            result['_response_id'] = response.id
-            
-            # Safety net: intent "query" ALWAYS requires a new query
-            if result.get('intent') == 'query' and not result.get('needs_new_query'):
-                print(f"⚠️  QueryPlanner returned intent=query but needs_new_query=false — overriding to true")
-                result['needs_new_query'] = True
-            
-            return result
-        
-        except Exception as e:
-            # Fallback: default to query intent
-            return {
-                "intent": "query",
-                "needs_new_query": True,
-                "query_type": "specific",
-                "reasoning": f"Error in intent analysis: {str(e)}"
-            }
+                        "needs_new_query": {"type": "boolean"},
+                        "query_type": {
+                            "type": "string",
+                            "enum": ["specific", "aggregate", "exploratory"]
+                        },
+                        "reasoning": {"type": "string"}
+                    },
+                    "required": ["intent", "needs_new_query", "query_type", "reasoning"],
+                    "additionalProperties": False
+                }
+            }}
+        }
+        if previous_response_id:
+            kwargs["previous_response_id"] = previous_response_id
+        if self.reasoning_effort and self.reasoning_effort != "none":
+            kwargs["reasoning"] = {"effort": self.reasoning_effort}
+        return kwargs
+
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """Parse the structured intent JSON and apply safety overrides."""
+        result = json.loads(response.output_text)
+        result['_response_id'] = response.id
+        result['_tokens'] = usage_tokens(response)
+
+        # Safety net: intent "query" ALWAYS requires a new query
+        if result.get('intent') == 'query' and not result.get('needs_new_query'):
+            print(f"⚠️  QueryPlanner returned intent=query but needs_new_query=false — overriding to true")
+            result['needs_new_query'] = True
+
+        return result
+
+    def _fallback(self, error: Exception) -> Dict[str, Any]:
+        """Fallback: default to query intent"""
+        return {
+            "intent": "query",
+            "needs_new_query": True,
+            "query_type": "specific",
+            "reasoning": f"Error in intent analysis: {str(error)}"
+        }
 
 
 class InsightAnalyzer:
     """Agent 3: Analyzes query results to extract patterns, trends, and insights"""
     
-    def __init__(self, llm_client: OpenAI):
+    def __init__(self, llm_client: OpenAI, async_llm_client: Optional[AsyncOpenAI] = None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
         self.deployment = os.getenv("MODEL_INSIGHT_ANALYZER", os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "gpt-5.1"))
         self.reasoning_effort = os.getenv("MODEL_INSIGHT_ANALYZER_REASONING", "low")
     
@@ -247,7 +278,7 @@ class InsightAnalyzer:
         return stats
 
     def _row_to_dict(self, row: Any, columns: List[str]) -> Dict[str, Any]:
-        """Convert pyodbc.Row or dict-like row into a standard dict using provided columns"""
+        """Convert pyodbc.Row, tuple (read by position) or dict-like row into a standard dict using provided columns"""
         row_dict: Dict[str, Any] = {}
 
         if isinstance(row, dict):
@@ -256,14 +287,16 @@ class InsightAnalyzer:
                     row_dict[col] = row[col]
             return row_dict
 
-        for col in columns:
+        for idx, col in enumerate(columns):
             try:
                 row_dict[col] = row[col]
             except (KeyError, IndexError, TypeError):
                 try:
                     row_dict[col] = getattr(row, col)
                 except AttributeError:
-                    continue
+                    # Plain tuple: read by position, like safe_get
+                    if isinstance(row, (tuple, list)) and idx < len(row):
+                        row_dict[col] = row[idx]
 
         return row_dict
     
@@ -284,17 +317,47 @@ class InsightAnalyzer:
             }
         """
         if results.get('error') or not results.get('rows'):
-            return {
-                "insights": {
-                    "overview": "No results found or error occurred",
-                    "key_findings": [],
-                    "patterns": [],
-                    "statistics": {},
-                    "recommendations": ["Try refining your search criteria"]
-                },
-                "confidence": "low"
-            }
-        
+            return self._empty_result()
+
+        ia_kwargs, context = self._build_request(question, results, intent_info)
+        try:
+            response = self.llm_client.responses.create(**ia_kwargs)
+            return self._parse_response(response, context)
+        except Exception as e:
+            return self._fallback(e, context)
+
+    async def analyze_results_async(self, question: str, results: Dict[str, Any], intent_info: Dict,
+                                    computed_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Non-blocking variant of analyze_results (uses the shared AsyncOpenAI client).
+        computed_stats: _compute_statistics output when the caller already computed it off the event loop.
+        """
+        if results.get('error') or not results.get('rows'):
+            return self._empty_result()
+
+        ia_kwargs, context = self._build_request(question, results, intent_info, computed_stats)
+        try:
+            response = await self.async_llm_client.responses.create(**ia_kwargs)
+            return self._parse_response(response, context)
+        except Exception as e:
+            return self._fallback(e, context)
+
+    def _empty_result(self) -> Dict[str, Any]:
+        """Insights returned when the query errored or produced no rows."""
+        return {
+            "insights": {
+                "overview": "No results found or error occurred",
+                "key_findings": [],
+                "patterns": [],
+                "statistics": {},
+                "recommendations": ["Try refining your search criteria"]
+            },
+            "confidence": "low"
+        }
+
+    def _build_request(self, question: str, results: Dict[str, Any], intent_info: Dict,
+                       computed_stats: Optional[Dict[str, Any]] = None) -> tuple:
+        """Build Responses API kwargs plus the pre-computed context used for post-processing."""
         # Check APP_MODE to determine insight style
         app_mode = os.getenv('APP_MODE', 'seller').lower()
         is_customer_mode = app_mode == 'customer'
@@ -306,8 +369,11 @@ class InsightAnalyzer:
         columns = results['columns']
         all_rows = results['rows']  # Use all rows for statistical analysis
         
-        # Pre-compute statistics to give LLM better context
-        computed_stats = self._compute_statistics(all_rows, columns)
+        # Pre-compute statistics to give LLM better context (copied: customer mode pops keys below)
+        if computed_stats is None:
+            computed_stats = self._compute_statistics(all_rows, columns)
+        else:
+            computed_stats = dict(computed_stats)
         
         # FOR CUSTOMER MODE: Remove partner-specific data from statistics
         if is_customer_mode:
@@ -333,16 +399,12 @@ class InsightAnalyzer:
                 all_rows[-5:]
             )
         
+        # Sample rows as {column: value}, whether they came from pyodbc, a cache or a dict
+        sample_rows = [row_dict for row_dict in (self._row_to_dict(row, columns) for row in sample_rows) if row_dict]
+        
         # FOR CUSTOMER MODE: Filter orgName from sample rows
         if is_customer_mode:
-            filtered_sample_rows = []
-            for row in sample_rows:
-                row_dict = self._row_to_dict(row, columns)
-                if not row_dict:
-                    continue
-                filtered_row = {k: v for k, v in row_dict.items() if k != 'orgName'}
-                filtered_sample_rows.append(filtered_row)
-            sample_rows = filtered_sample_rows
+            sample_rows = [{k: v for k, v in row_dict.items() if k != 'orgName'} for row_dict in sample_rows]
             print(f"   🛡️ Removed orgName column from {len(sample_rows)} sample rows")
         
         # Different system prompts based on mode
@@ -538,128 +600,152 @@ Respond with a JSON object using this exact structure:
 
     Analyze these results and provide insights."""
 
-        try:
-            ia_kwargs = {
-                "model": self.deployment,
-                "instructions": system_prompt,
-                "input": user_prompt + "\n\nRespond in JSON format.",
-                "text": {"format": {"type": "json_object"}}
-            }
-            if self.reasoning_effort and self.reasoning_effort != "none":
-                ia_kwargs["reasoning"] = {"effort": self.reasoning_effort}
-            response = self.llm_client.responses.create(**ia_kwargs)
-            
-            result = json.loads(response.output_text)
-            
-            # Validate quality - reject generic responses
-            if result.get('insights', {}).get('key_findings'):
-                generic_phrases = ['query returned', 'matching solutions', 'results found']
-                first_finding = result['insights']['key_findings'][0].lower() if result['insights']['key_findings'] else ''
-                
-                if any(phrase in first_finding for phrase in generic_phrases):
-                    print(f"⚠️  Warning: Generic insight detected, using pre-computed stats as fallback")
-                    # Force use of computed_stats
-                    result['insights']['key_findings'] = [
-                        f"Analysis of {row_count} solutions across {computed_stats.get('unique_partners', 'multiple')} partners",
-                        f"Top providers: {', '.join(list(computed_stats.get('top_partners', {}).keys())[:3])}",
-                        f"Primary solution areas: {', '.join(list(computed_stats.get('solution_areas', {}).keys())[:2])}"
-                    ]
-            
-            # Ensure follow_up_questions exists and are data-driven
-            if 'follow_up_questions' not in result.get('insights', {}):
-                # Generate context-specific follow-ups based on actual data
-                top_partners = list(computed_stats.get('top_partners', {}).keys())
-                areas = list(computed_stats.get('solution_areas', {}).keys())
-                industries = list(computed_stats.get('industries', {}).keys())
-                
-                result['insights']['follow_up_questions'] = []
-                
-                # Add partner-specific questions
-                if len(top_partners) >= 2:
-                    result['insights']['follow_up_questions'].append(f"Show me all solutions from {top_partners[0]}")
-                    result['insights']['follow_up_questions'].append(f"Compare solutions from {top_partners[0]} and {top_partners[1]}")
-                elif len(top_partners) == 1:
-                    result['insights']['follow_up_questions'].append(f"Show me all solutions from {top_partners[0]}")
-                    result['insights']['follow_up_questions'].append(f"What other partners offer similar solutions?")
-                
-                # Add solution area comparison if multiple areas exist
-                if len(areas) >= 2:
-                    result['insights']['follow_up_questions'].append(f"Compare {areas[0]} vs {areas[1]} solutions")
-                
-                # Add industry-specific question if industry data exists
-                if len(industries) >= 1:
-                    result['insights']['follow_up_questions'].append(f"What are the top solutions specifically for {industries[0]}?")
-                
-                # If we still have fewer than 3 questions, add more context-based ones
-                if len(result['insights']['follow_up_questions']) < 3 and len(top_partners) >= 1 and len(areas) >= 1:
-                    result['insights']['follow_up_questions'].append(f"Show me {areas[0]} solutions from {top_partners[0]}")
+        ia_kwargs = {
+            "model": self.deployment,
+            "instructions": system_prompt,
+            "input": user_prompt + "\n\nRespond in JSON format.",
+            "text": {"format": {"type": "json_object"}}
+        }
+        if self.reasoning_effort and self.reasoning_effort != "none":
+            ia_kwargs["reasoning"] = {"effort": self.reasoning_effort}
+        return ia_kwargs, {"computed_stats": computed_stats, "row_count": row_count}
+
+    def _parse_response(self, response, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Parse insight JSON and backfill generic findings / follow-ups from computed stats."""
+        computed_stats = context['computed_stats']
+        row_count = context['row_count']
+        result = json.loads(response.output_text)
+        result['_tokens'] = usage_tokens(response)
+        
+        # Validate quality - reject generic responses
+        if result.get('insights', {}).get('key_findings'):
+            generic_phrases = ['query returned', 'matching solutions', 'results found']
+            first_finding = result['insights']['key_findings'][0].lower() if result['insights']['key_findings'] else ''
             
-            return result
+            if any(phrase in first_finding for phrase in generic_phrases):
+                print(f"⚠️  Warning: Generic insight detected, using pre-computed stats as fallback")
+                # Force use of computed_stats
+                result['insights']['key_findings'] = [
+                    f"Analysis of {row_count} solutions across {computed_stats.get('unique_partners', 'multiple')} partners",
+                    f"Top providers: {', '.join(list(computed_stats.get('top_partners', {}).keys())[:3])}",
+                    f"Primary solution areas: {', '.join(list(computed_stats.get('solution_areas', {}).keys())[:2])}"
+                ]
         
-        except Exception as e:
-            print(f"❌ Error in insight analysis: {str(e)}")
-            # Use computed stats for fallback
+        # Ensure follow_up_questions exists and are data-driven
+        if 'follow_up_questions' not in result.get('insights', {}):
+            # Generate context-specific follow-ups based on actual data
             top_partners = list(computed_stats.get('top_partners', {}).keys())
             areas = list(computed_stats.get('solution_areas', {}).keys())
             industries = list(computed_stats.get('industries', {}).keys())
             
-            # Generate context-specific follow-ups
-            follow_ups = []
+            result['insights']['follow_up_questions'] = []
+            
+            # Add partner-specific questions
             if len(top_partners) >= 2:
-                follow_ups.append(f"Show me all solutions from {top_partners[0]}")
-                follow_ups.append(f"Compare solutions from {top_partners[0]} and {top_partners[1]}")
+                result['insights']['follow_up_questions'].append(f"Show me all solutions from {top_partners[0]}")
+                result['insights']['follow_up_questions'].append(f"Compare solutions from {top_partners[0]} and {top_partners[1]}")
             elif len(top_partners) == 1:
-                follow_ups.append(f"Show me all solutions from {top_partners[0]}")
+                result['insights']['follow_up_questions'].append(f"Show me all solutions from {top_partners[0]}")
+                result['insights']['follow_up_questions'].append(f"What other partners offer similar solutions?")
             
+            # Add solution area comparison if multiple areas exist
             if len(areas) >= 2:
-                follow_ups.append(f"Compare {areas[0]} vs {areas[1]} solutions")
+                result['insights']['follow_up_questions'].append(f"Compare {areas[0]} vs {areas[1]} solutions")
             
-            if len(industries) >= 1 and len(follow_ups) < 3:
-                follow_ups.append(f"What are the top solutions for {industries[0]}?")
+            # Add industry-specific question if industry data exists
+            if len(industries) >= 1:
+                result['insights']['follow_up_questions'].append(f"What are the top solutions specifically for {industries[0]}?")
             
-            # Add one more context-specific question if we have data
-            if len(follow_ups) < 3 and len(top_partners) >= 1 and len(areas) >= 1:
-                follow_ups.append(f"Show me {areas[0]} solutions from leading providers")
-            
-            return {
-                "insights": {
-                    "overview": f"Found {row_count} risk management solutions from {computed_stats.get('unique_partners', 'multiple')} partners",
-                    "key_findings": [
-                        f"Total solutions analyzed: {row_count}",
-                        f"Top partners: {', '.join(top_partners[:3])}",
-                        f"Solution areas: {', '.join(areas[:3])}"
-                    ],
-                    "patterns": ["Multiple solution approaches identified"],
-                    "statistics": computed_stats,
-                    "recommendations": ["Explore solutions by specific partner", "Filter by solution area"],
-                    "follow_up_questions": follow_ups
-                },
-                "confidence": "medium",
-                "error": str(e)
-            }
+            # If we still have fewer than 3 questions, add more context-based ones
+            if len(result['insights']['follow_up_questions']) < 3 and len(top_partners) >= 1 and len(areas) >= 1:
+                result['insights']['follow_up_questions'].append(f"Show me {areas[0]} solutions from {top_partners[0]}")
+        
+        return result
+
+    def _fallback(self, e: Exception, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Fallback insights built from computed stats when the LLM call fails."""
+        computed_stats = context['computed_stats']
+        row_count = context['row_count']
+        print(f"❌ Error in insight analysis: {str(e)}")
+        # Use computed stats for fallback
+        top_partners = list(computed_stats.get('top_partners', {}).keys())
+        areas = list(computed_stats.get('solution_areas', {}).keys())
+        industries = list(computed_stats.get('industries', {}).keys())
+        
+        # Generate context-specific follow-ups
+        follow_ups = []
+        if len(top_partners) >= 2:
+            follow_ups.append(f"Show me all solutions from {top_partners[0]}")
+            follow_ups.append(f"Compare solutions from {top_partners[0]} and {top_partners[1]}")
+        elif len(top_partners) == 1:
+            follow_ups.append(f"Show me all solutions from {top_partners[0]}")
+        
+        if len(areas) >= 2:
+            follow_ups.append(f"Compare {areas[0]} vs {areas[1]} solutions")
+        
+        if len(industries) >= 1 and len(follow_ups) < 3:
+            follow_ups.append(f"What are the top solutions for {industries[0]}?")
+        
+        # Add one more context-specific question if we have data
+        if len(follow_ups) < 3 and len(top_partners) >= 1 and len(areas) >= 1:
+            follow_ups.append(f"Show me {areas[0]} solutions from leading providers")
+        
+        return {
+            "insights": {
+                "overview": f"Found {row_count} risk management solutions from {computed_stats.get('unique_partners', 'multiple')} partners",
+                "key_findings": [
+                    f"Total solutions analyzed: {row_count}",
+                    f"Top partners: {', '.join(top_partners[:3])}",
+                    f"Solution areas: {', '.join(areas[:3])}"
+                ],
+                "patterns": ["Multiple solution approaches identified"],
+                "statistics": computed_stats,
+                "recommendations": ["Explore solutions by specific partner", "Filter by solution area"],
+                "follow_up_questions": follow_ups
+            },
+            "confidence": "medium",
+            "error": str(e)
+        }
 
 
 class ResponseFormatter:
     """Agent 4: Formats insights and data into compelling user-facing response"""
     
-    def __init__(self, llm_client: OpenAI):
+    def __init__(self, llm_client: OpenAI, async_llm_client: Optional[AsyncOpenAI] = None):
         self.llm_client = llm_client
+        self.async_llm_client = async_llm_client
         self.deployment = os.getenv("MODEL_RESPONSE_FORMATTER", os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "gpt-5.1"))
         self.reasoning_effort = os.getenv("MODEL_RESPONSE_FORMATTER_REASONING", "low")
         self.app_mode = os.getenv('APP_MODE', 'seller').lower()
         self.web_search_enabled = self.app_mode == 'seller'
-        # Streaming metadata (populated after format_response_stream exhausts)
-        self._stream_response_id = None
-        self._stream_tokens = None
-        self._web_sources = None  # Web search sources from last call
     
-    def format_response(self, question: str, insights: Dict, results: Dict, intent_info: Dict, previous_response_id: Optional[str] = None) -> tuple:
+    def format_response(self, question: str, insights: Dict, results: Dict, intent_info: Dict, previous_response_id: Optional[str] = None, ctx: Optional[RequestContext] = None) -> tuple:
         """
         Create a compelling narrative response combining insights and data.
         
+        Web sources, response id and token usage are recorded on ctx (if given).
+        
         Returns:
-            Formatted markdown string with insights and data presentation
+            (narrative markdown, token usage dict or None, response id or None)
         """
+        try:
+            kwargs = self._build_request(question, insights, results, intent_info, previous_response_id)
+            response = self.llm_client.responses.create(**kwargs)
+            return self._parse_response(response, ctx)
+        except Exception as e:
+            return self._fallback_text(question, insights), None, None
+
+    async def format_response_async(self, question: str, insights: Dict, results: Dict, intent_info: Dict, previous_response_id: Optional[str] = None, ctx: Optional[RequestContext] = None) -> tuple:
+        """Non-blocking variant of format_response (uses the shared AsyncOpenAI client)."""
+        try:
+            kwargs = self._build_request(question, insights, results, intent_info, previous_response_id)
+            response = await self.async_llm_client.responses.create(**kwargs)
+            return self._parse_response(response, ctx)
+        except Exception as e:
+            return self._fallback_text(question, insights), None, None
+
+    def _build_request(self, question: str, insights: Dict, results: Dict, intent_info: Dict, previous_response_id: Optional[str], stream: bool = False) -> Dict[str, Any]:
+        """Build Responses API kwargs shared by the blocking and streaming formatter calls."""
         system_prompt = """You are a helpful assistant presenting Industry Solutions Directory insights.
 
 Create a compelling, NARRATIVE response that tells a story with the data. Think like a business analyst presenting findings to executives.
@@ -703,9 +789,17 @@ Do NOT just list raw data - tell the story behind the numbers!
         
         # Determine partner names from results for targeted web search
         partner_names = set()
+        columns = results.get('columns') or []
         if results.get('rows'):
             for row in results['rows'][:10]:
-                org = getattr(row, 'orgName', None) if hasattr(row, 'orgName') else (row.get('orgName') if isinstance(row, dict) else None)
+                if isinstance(row, dict):
+                    org = row.get('orgName')
+                elif hasattr(row, 'orgName'):
+                    org = getattr(row, 'orgName')
+                elif 'orgName' in columns and columns.index('orgName') < len(row):
+                    org = row[columns.index('orgName')]
+                else:
+                    org = None
                 if org:
                     partner_names.add(str(org))
         
@@ -730,57 +824,56 @@ Insights to present:
 Create an engaging response. The detailed data table will be shown separately in another tab.{web_search_hint}
 """
 
-        try:
-            kwargs = {
-                "model": self.deployment,
-                "instructions": system_prompt,
-                "input": user_prompt
-            }
-            if previous_response_id:
-                kwargs["previous_response_id"] = previous_response_id
-            if self.reasoning_effort and self.reasoning_effort != "none":
-                kwargs["reasoning"] = {"effort": self.reasoning_effort}
-            
-            # Enable web search for seller mode
-            if self.web_search_enabled:
-                kwargs["tools"] = [{"type": "web_search_preview"}]
-                print("   🌐 Web search enabled for narrative enrichment")
-            
-            response = self.llm_client.responses.create(**kwargs)
-            
-            content = response.output_text
-            
-            # Extract web search source URLs from annotations
-            self._web_sources = self._extract_web_sources(response)
-            
-            # Track token usage
-            tokens = None
-            if hasattr(response, 'usage') and response.usage:
-                tokens = {
-                    'prompt_tokens': response.usage.input_tokens,
-                    'completion_tokens': response.usage.output_tokens,
-                    'total_tokens': response.usage.total_tokens
-                }
-            
-            return content, tokens, response.id
+        kwargs = {
+            "model": self.deployment,
+            "instructions": system_prompt,
+            "input": user_prompt
+        }
+        if stream:
+            kwargs["stream"] = True
+        if previous_response_id:
+            kwargs["previous_response_id"] = previous_response_id
+        if self.reasoning_effort and self.reasoning_effort != "none":
+            kwargs["reasoning"] = {"effort": self.reasoning_effort}
         
-        except Exception as e:
-            # Fallback formatting
-            fallback = f"## Results for: {question}\n\n"
-            fallback += f"{overview}\n\n"
-            
-            if key_findings:
-                fallback += "### Key Findings\n"
-                for finding in key_findings:
-                    fallback += f"- {finding}\n"
-                fallback += "\n"
-            
-            if statistics:
-                fallback += "### Statistics\n"
-                for key, value in statistics.items():
-                    fallback += f"- **{key}**: {value}\n"
-            
-            return fallback, None, None
+        # Enable web search for seller mode
+        if self.web_search_enabled:
+            kwargs["tools"] = [{"type": "web_search_preview"}]
+            print(f"   🌐 Web search enabled for {'streaming narrative' if stream else 'narrative enrichment'}")
+        return kwargs
+
+    def _parse_response(self, response, ctx: Optional[RequestContext]) -> tuple:
+        """Extract narrative text, web sources and token usage from a completed response."""
+        content = response.output_text
+        tokens = usage_tokens(response)
+        
+        # Extract web search source URLs from annotations
+        if ctx is not None:
+            ctx.web_sources = self._extract_web_sources(response)
+            ctx.formatter_response_id = response.id
+        
+        return content, tokens, response.id
+
+    def _fallback_text(self, question: str, insights: Dict) -> str:
+        """Fallback formatting"""
+        insights_content = insights.get('insights', {})
+        key_findings = insights_content.get('key_findings', [])
+        statistics = insights_content.get('statistics', {})
+        fallback = f"## Results for: {question}\n\n"
+        fallback += f"{insights_content.get('overview', '')}\n\n"
+        
+        if key_findings:
+            fallback += "### Key Findings\n"
+            for finding in key_findings:
+                fallback += f"- {finding}\n"
+            fallback += "\n"
+        
+        if statistics:
+            fallback += "### Statistics\n"
+            for key, value in statistics.items():
+                fallback += f"- **{key}**: {value}\n"
+        
+        return fallback
     
     def _extract_web_sources(self, response) -> List[Dict[str, str]]:
         """Extract web search source URLs from response output annotations."""
@@ -804,128 +897,69 @@ Create an engaging response. The detailed data table will be shown separately in
             print(f"   🌐 Web sources found: {len(sources)}")
         return sources
     
-    def format_response_stream(self, question: str, insights: Dict, results: Dict, intent_info: Dict, previous_response_id: Optional[str] = None):
+    def format_response_stream(self, question: str, insights: Dict, results: Dict, intent_info: Dict, previous_response_id: Optional[str], ctx: RequestContext):
         """
         Stream the formatted response token-by-token.
-        After the generator is exhausted, retrieve metadata via
-        self._stream_response_id and self._stream_tokens.
+        After the generator is exhausted, the response id, web sources and
+        token usage are available on ctx.
         
         Yields:
             str: text delta chunks
         """
-        self._stream_response_id = None
-        self._stream_tokens = None
-        self._web_sources = None
-        
-        system_prompt = """You are a helpful assistant presenting Industry Solutions Directory insights.
-
-Create a compelling, NARRATIVE response that tells a story with the data. Think like a business analyst presenting findings to executives.
-
-CRITICAL REQUIREMENTS:
-1. Write in flowing paragraphs, not bullet lists (except for specific findings)
-2. Use a conversational, insightful tone
-3. Highlight surprises, patterns, and strategic implications
-4. Connect the dots between different findings
-5. Use markdown effectively: **bold** for emphasis, ## for headers
-
-STRUCTURE:
-## Executive Summary
-[2-3 sentences painting the big picture - what's the most important takeaway?]
-
-## Market Landscape
-[Narrative paragraph about the competitive landscape, who dominates, interesting patterns]
-
-### Key Discoveries
-[Use bullets ONLY here for specific findings - 3-5 data-backed points]
-
-## Strategic Insights
-[Narrative paragraph about what this means for decision-makers, technology trends, opportunities]
-
-### Next Steps
-[Short list of 2-3 specific actions they can take]
-
-TONE EXAMPLES:
-❌ BAD: "The query found 50 solutions. DXC has 18. Adobe has 12."
-✅ GOOD: "The risk management landscape is dominated by two major players: **DXC Technology** commands 36% of the market with 18 solutions, while **Adobe** follows closely with 12 offerings focused primarily on behavioral analytics and customer journey intelligence."
-
-Do NOT just list raw data - tell the story behind the numbers!
-"""
-        
-        insights_content = insights.get('insights', {})
-        overview = insights_content.get('overview', '')
-        key_findings = insights_content.get('key_findings', [])
-        patterns = insights_content.get('patterns', [])
-        statistics = insights_content.get('statistics', {})
-        recommendations = insights_content.get('recommendations', [])
-        
-        # Determine partner names from results for targeted web search
-        partner_names = set()
-        if results.get('rows'):
-            for row in results['rows'][:10]:
-                org = getattr(row, 'orgName', None) if hasattr(row, 'orgName') else (row.get('orgName') if isinstance(row, dict) else None)
-                if org:
-                    partner_names.add(str(org))
-        
-        web_search_hint = ""
-        if self.web_search_enabled and partner_names:
-            partner_list = ", ".join(list(partner_names)[:5])
-            web_search_hint = f"\n\nIMPORTANT: You MUST use web search to find the latest news, press releases, partnerships, product launches, or market context about these partners: {partner_list}. Always perform at least one web search to enrich your narrative with recent, real-world context. This is required — do not skip it."
-        elif self.web_search_enabled:
-            web_search_hint = "\n\nIMPORTANT: You MUST use web search to find recent, relevant market news or partner announcements that would enrich the narrative. Always perform at least one web search to add real-world context. This is required — do not skip it."
-        
-        user_prompt = f"""Question: "{question}"
-
-Intent: {intent_info.get('intent', 'query')}
-
-Insights to present:
-- Overview: {overview}
-- Key Findings: {key_findings}
-- Patterns: {patterns}
-- Statistics: {statistics}
-- Recommendations: {recommendations}
-
-Create an engaging response. The detailed data table will be shown separately in another tab.{web_search_hint}
-"""
-
         try:
-            kwargs = {
-                "model": self.deployment,
-                "instructions": system_prompt,
-                "input": user_prompt,
-                "stream": True
-            }
-            if previous_response_id:
-                kwargs["previous_response_id"] = previous_response_id
-            if self.reasoning_effort and self.reasoning_effort != "none":
-                kwargs["reasoning"] = {"effort": self.reasoning_effort}
-            
-            # Enable web search for seller mode
-            if self.web_search_enabled:
-                kwargs["tools"] = [{"type": "web_search_preview"}]
-                print("   🌐 Web search enabled for streaming narrative")
-            
+            kwargs = self._build_request(question, insights, results, intent_info, previous_response_id, stream=True)
             response = self.llm_client.responses.create(**kwargs)
             
             for event in response:
                 if event.type == "response.output_text.delta":
                     yield event.delta
                 elif event.type == "response.completed":
-                    self._stream_response_id = event.response.id
-                    self._web_sources = self._extract_web_sources(event.response)
-                    if hasattr(event.response, 'usage') and event.response.usage:
-                        self._stream_tokens = {
-                            'prompt_tokens': event.response.usage.input_tokens,
-                            'completion_tokens': event.response.usage.output_tokens,
-                            'total_tokens': event.response.usage.total_tokens
-                        }
+                    self._on_stream_completed(event.response, ctx)
         
         except Exception as e:
             # Fallback: yield the error message as a single chunk
-            yield f"## Results for: {question}\n\n{overview}\n\n"
-            if key_findings:
-                yield "### Key Findings\n"
-                for finding in key_findings:
-                    yield f"- {finding}\n"
+            yield from self._fallback_chunks(question, insights)
+
+    async def format_response_stream_async(self, question: str, insights: Dict, results: Dict, intent_info: Dict, previous_response_id: Optional[str], ctx: RequestContext):
+        """
+        Non-blocking variant of format_response_stream (async generator of text deltas).
+        Closing or cancelling the generator aborts the Responses API stream, so a
+        disconnected client stops token generation.
+        """
+        try:
+            kwargs = self._build_request(question, insights, results, intent_info, previous_response_id, stream=True)
+            response = await self.async_llm_client.responses.create(**kwargs)
+            
+            try:
+                async for event in response:
+                    if event.type == "response.output_text.delta":
+                        yield event.delta
+                    elif event.type == "response.completed":
+                        self._on_stream_completed(event.response, ctx)
+            except (asyncio.CancelledError, GeneratorExit):
+                # Shielded: the close must go out even while this task is being cancelled
+                await asyncio.shield(response.close())
+                raise
+        
+        except Exception as e:
+            for chunk in self._fallback_chunks(question, insights):
+                yield chunk
+
+    def _on_stream_completed(self, response, ctx: RequestContext):
+        """Record response id, web sources and usage from the terminal stream event on ctx."""
+        ctx.formatter_response_id = response.id
+        ctx.web_sources = self._extract_web_sources(response)
+        ctx.add_usage(usage_tokens(response), 'formatter')
+
+    def _fallback_chunks(self, question: str, insights: Dict):
+        """Fallback narrative chunks when the formatter stream fails."""
+        insights_content = insights.get('insights', {})
+        key_findings = insights_content.get('key_findings', [])
+        yield f"## Results for: {question}\n\n{insights_content.get('overview', '')}\n\n"
+        if key_findings:
+            yield "### Key Findings\n"
+            for finding in key_findings:
+                yield f"- {finding}\n"
 
 
 class MultiAgentPipeline:
@@ -933,23 +967,35 @@ class MultiAgentPipeline:
     Orchestrates the 4-agent workflow for intelligent query processing.
     
     Flow: Query Planner → SQL Executor → Insight Analyzer → Response Formatter
+    
+    Reentrant: agents hold only configuration and clients. Per-run state lives
+    on a RequestContext and per-conversation state in self.sessions, so one
+    instance serves overlapping requests from asyncio tasks or threads.
     """
     
     def __init__(self):
         """Initialize all agents and dependencies"""
         # Initialize OpenAI client per official Azure Responses API docs
-        # Uses OpenAI with base_url pointing to Azure resource's /openai/v1/ path
-        azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/")
-        self.llm_client = OpenAI(
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            base_url=f"{azure_endpoint}/openai/v1/"
-        )
+        # Uses OpenAI with base_url pointing to Azure resource's /openai/v1/ path,
+        # on the process-wide tuned connection pool (see llm_transport)
+        self.llm_client = openai_client()
+        # Async twin used by the FastAPI endpoints so LLM round trips never block the event loop
+        self.async_llm_client = async_openai_client()
         
         # Initialize agents (each reads its own MODEL_* env var)
-        self.query_planner = QueryPlanner(self.llm_client)
-        self.sql_executor = NL2SQLPipeline(llm_client=self.llm_client)  # Shares OpenAI client for Responses API
-        self.insight_analyzer = InsightAnalyzer(self.llm_client)
-        self.response_formatter = ResponseFormatter(self.llm_client)
+        self.query_planner = QueryPlanner(self.llm_client, self.async_llm_client)
+        self.sql_executor = NL2SQLPipeline(llm_client=self.llm_client, async_llm_client=self.async_llm_client)  # Shares OpenAI clients for Responses API
+        self.insight_analyzer = InsightAnalyzer(self.llm_client, self.async_llm_client)
+        self.response_formatter = ResponseFormatter(self.llm_client, self.async_llm_client)
+        
+        # Paraphrases of answered questions reuse their validated SQL (see semantic_cache);
+        # off without an embeddings deployment
+        self.semantic_cache = SemanticCache(default_embedder(self.async_llm_client),
+                                            names=self.sql_executor.template_router.names)
+        
+        # Follow-up turns generate SQL (and optionally run it) while the planner is still deciding
+        self.speculative_sql = os.getenv("SPECULATIVE_SQL", "true").lower() == "true"
+        self.speculative_execution = os.getenv("SPECULATIVE_SQL_EXECUTE", "false").lower() == "true"
         
         # Log per-agent model assignments
         print(f"\n🤖 Agent Models:")
@@ -958,20 +1004,518 @@ class MultiAgentPipeline:
         print(f"   3. Insight Analyzer: {self.insight_analyzer.deployment} (reasoning: {self.insight_analyzer.reasoning_effort})")
         print(f"   4. Response Formatter: {self.response_formatter.deployment} (reasoning: {self.response_formatter.reasoning_effort})\n")
         
-        # Conversation state
-        self.conversation_history = []
+        # Conversation state (history + Responses API chain ids), one session per conversation_id
+        self.sessions = SessionManager()
+        
+        # Concurrent identical questions share one run (COALESCE_REQUESTS=false disables)
+        self.flights = SingleFlight()
+        self.coalesce_requests = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
         
-        # Response chaining state (Responses API previous_response_id)
-        self.last_planner_response_id = None
-        self.last_formatter_response_id = None
+        # Per-stage concurrency limits (LLM agents, DB) + request admission queue
+        self.admission = AdmissionController()
+        self.metrics = PipelineMetrics()
         
+        # Everything after the query returned, as one stage graph shared by both endpoints
+        self.answer_graph = self._build_answer_graph()
+        
+        # Private event loop backing the synchronous entry points (scripts, tests)
+        self._sync_loop = None
+        self._sync_loop_lock = threading.Lock()
+    
+    def _get_sync_loop(self) -> asyncio.AbstractEventLoop:
+        """Lazily start a background event loop thread for the sync wrappers."""
+        with self._sync_loop_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._sync_loop.run_forever, name="pipeline-sync-loop", daemon=True).start()
+            return self._sync_loop
+    
+    def _run_sync(self, coro):
+        """Run a pipeline coroutine to completion from synchronous code."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_sync_loop()).result()
+    
+    def _iterate_sync(self, agen):
+        """Drive an async generator from synchronous code, one event at a time."""
+        loop = self._get_sync_loop()
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+    
     def process_query(self, question: str, conversation_id: Optional[str] = None) -> Dict[str, Any]:
         """
+        Blocking wrapper around process_query_async for scripts and CLI tests.
+        
+        Must not be called from inside a running event loop — async callers
+        (the FastAPI endpoints) should await process_query_async directly.
+        """
+        return self._run_sync(self.process_query_async(question, conversation_id))
+    
+    def process_query_stream(self, question: str, conversation_id: Optional[str] = None):
+        """Blocking wrapper around process_query_stream_async (yields the same event dicts)."""
+        yield from self._iterate_sync(self.process_query_stream_async(question, conversation_id))
+    
+    @asynccontextmanager
+    async def _stage(self, ctx: RequestContext, stage: str, limiter: Optional[str] = None):
+        """Run a stage under its concurrency limit; ctx times the work, queue waits are recorded separately."""
+        async with self.admission.stage(limiter or stage) as waited:
+            if waited >= 0.001:
+                ctx.record(f"{stage}_wait", waited)
+            with ctx.timed(stage):
+                ctx.stage = stage
+                yield
+            ctx.stage = None  # left set when the stage raised or was cancelled
+    
+    async def _analyze_intent(self, ctx: RequestContext, session) -> Dict[str, Any]:
+        """Agent 1 call, recording its response id and usage on ctx."""
+        async with self._stage(ctx, 'planner'):
+            intent_info = await self.query_planner.analyze_intent_async(ctx.question, session.history, session.planner_response_id)
+        ctx.planner_response_id = intent_info.pop('_response_id', None)
+        ctx.add_usage(intent_info.pop('_tokens', None), 'planner')
+        return intent_info
+    
+    async def _plan_with_speculation(self, ctx: RequestContext, session) -> Tuple[Dict[str, Any], Optional[tuple]]:
+        """
+        Agent 1 call with Agent 2 already generating SQL next to it (SPECULATIVE_SQL).
+        
+        The planner does not change what SQL is generated for the question, only
+        whether a new query is needed, so the speculative SQL is exactly what a
+        sequential run would produce. With SPECULATIVE_SQL_EXECUTE it is also run,
+        on the streaming executor so that cancelling it cancels the statement.
+        When the planner wants no new query (and the previous results have rows)
+        the speculation is cancelled, or discarded if it already finished.
+        
+        Returns:
+            (intent_info, speculation) — speculation is (sql_result, query_results or
+            None) when it is used, else None
+        """
+        if not self.speculative_sql:
+            return await self._analyze_intent(ctx, session), None
+        start = time.perf_counter()
+        task = asyncio.ensure_future(self._speculate(ctx))
+        try:
+            intent_info = await self._analyze_intent(ctx, session)
+        except BaseException:
+            task.cancel()
+            raise
+        planner_seconds = time.perf_counter() - start
+        previous_rows = session.history[-1].get('raw_results', {}).get('row_count', 0) if session.history else 0
+        if intent_info['needs_new_query'] or not previous_rows:
+            sql_result, query_results, speculation_seconds = await task
+            saved = min(planner_seconds, speculation_seconds)
+            self.metrics.observe_speculation("used", saved_seconds=saved)
+            print(f"⚡ Speculative SQL used ({saved * 1000:.0f}ms overlapped with the planner)")
+            return intent_info, (sql_result, query_results)
+        
+        outcome = "discarded" if task.done() else "cancelled"
+        task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+        # Only the speculation records these stages; file its time and tokens under their own name
+        for stage in ('nl2sql_template', 'nl2sql_cache', 'nl2sql', 'sql_execution'):
+            seconds = ctx.timings.pop(stage, None)
+            if seconds is not None:
+                ctx.record('speculation_discarded', seconds)
+        wasted = sum(ctx.stage_tokens.pop(stage, 0) for stage in ('nl2sql_cache', 'nl2sql'))
+        if wasted:
+            ctx.stage_tokens['speculation_discarded'] = wasted
+        ctx.semantic_lookup = None  # nothing from this run should be stored as the question's SQL
+        ctx.row_count = None
+        self.metrics.observe_speculation(outcome, wasted_tokens=wasted)
+        print(f"🗑️  Speculative SQL {outcome} (planner: no new query, {wasted} tokens wasted)")
+        return intent_info, None
+    
+    async def _speculate(self, ctx: RequestContext) -> tuple:
+        """Agent 2 work started before the planner answers: (sql_result, query_results or None, seconds)."""
+        start = time.perf_counter()
+        sql_result = await self._generate_sql(ctx)
+        query_results = None
+        if (self.speculative_execution and isinstance(sql_result.get('sql'), str)
+                and not sql_result.get('needs_clarification')):
+            query_results = await self._execute_sql_cancellable(ctx, sql_result['sql'])
+        return sql_result, query_results, time.perf_counter() - start
+    
+    async def _generate_sql(self, ctx: RequestContext, use_cache: bool = True) -> Dict[str, Any]:
+        """
+        Agent 2 SQL generation, recording usage on ctx.
+        
+        Template-shaped questions get their SQL from the template router, and a
+        close enough paraphrase of an earlier question reuses that question's SQL
+        from the semantic cache; both skip the generation call. use_cache=False
+        (the syntax-error retry) always asks the model, and drops a cached SQL that failed.
+        """
+        if not use_cache:
+            self.semantic_cache.forget(ctx.semantic_lookup)
+        else:
+            with ctx.timed('nl2sql_template'):
+                routed = self.sql_executor.route_template(ctx.question)
+            if routed:
+                return routed
+            if ctx.semantic_lookup is None:
+                with ctx.timed('nl2sql_cache'):
+                    ctx.semantic_lookup = await self.semantic_cache.lookup(ctx.question, self.sql_executor.app_mode)
+                if ctx.semantic_lookup is not None:
+                    ctx.add_usage(ctx.semantic_lookup.tokens, 'nl2sql_cache')
+                    if ctx.semantic_lookup.hit:
+                        print(f"⚡ Semantic cache hit ({ctx.semantic_lookup.similarity:.2f}): "
+                              f"reusing SQL of \"{ctx.semantic_lookup.entry.question}\"")
+                        return ctx.semantic_lookup.sql_result()
+        async with self._stage(ctx, 'nl2sql'):
+            sql_result = await self.sql_executor.generate_sql_async(ctx.question, use_templates=False)
+        ctx.add_usage(sql_result.pop('_tokens', None), 'nl2sql')
+        return sql_result
+    
+    async def _execute_sql(self, ctx: RequestContext, sql: str) -> Dict[str, Any]:
+        """Agent 2 SQL execution (off the event loop)."""
+        async with self._stage(ctx, 'sql_execution', 'db'):
+            results = await self.sql_executor.execute_sql_async(sql)
+        ctx.row_count = results.get('row_count', len(results.get('rows', [])))
+        return results
+    
+    async def _execute_sql_cancellable(self, ctx: RequestContext, sql: str) -> Dict[str, Any]:
+        """
+        _execute_sql on the streaming executor, collected into one result.
+
+        execute_sql_async runs in a thread that a cancelled task cannot stop; here
+        cancellation reaches the executor, which cancels the statement and drops its
+        connection (a discarded speculation does not keep the database busy).
+        """
+        results = {"columns": [], "rows": [], "row_count": 0, "truncated": False, "error": None}
+        async with self._stage(ctx, 'sql_execution', 'db'):
+            async for event in self.sql_executor.execute_sql_stream_async(sql):
+                if event["type"] == "columns":
+                    results["columns"] = event["columns"]
+                elif event["type"] == "rows":
+                    results["rows"].extend(event["rows"])
+                else:
+                    results.update(truncated=event["truncated"], error=event["error"], cached=event.get("cached"))
+        results["row_count"] = len(results["rows"])
+        ctx.row_count = results["row_count"]
+        return results
+    
+    def _remember_sql(self, ctx: RequestContext, sql_result: Optional[Dict[str, Any]], query_results: Dict[str, Any]):
+        """Store a generated SQL that validated and returned rows; forget a cached one that did not."""
+        if ctx.semantic_lookup is None or not sql_result or not isinstance(sql_result.get('sql'), str):
+            return
+        failed = bool(query_results.get('error')) or not query_results.get('row_count')
+        if 'semantic_cache' in sql_result:
+            if failed:
+                self.semantic_cache.forget(ctx.semantic_lookup)
+        elif not failed and self.sql_executor.validate_sql(sql_result['sql']):
+            self.semantic_cache.add(ctx.semantic_lookup, sql_result)
+    
+    async def _execute_sql_streaming(self, ctx: RequestContext, sql_result: Dict[str, Any],
+                                     intent_info: Dict, query_results: Dict[str, Any]):
+        """
+        Agent 2 SQL execution with rows streamed to the client as they are fetched.
+
+        Fills query_results (columns, rows, row_count, truncated, error) in place and
+        yields SSE events: a 'results' event with the columns as soon as the statement
+        returns them, a 'rows' event per fetched batch, and a final 'rows' event with
+        done=True. Nothing is yielded when execution fails before returning columns,
+        so the caller can still retry (e.g. on a syntax error).
+        """
+        query_results.clear()
+        query_results.update({"columns": [], "rows": [], "row_count": 0, "truncated": False, "error": None})
+        async with self._stage(ctx, 'sql_execution', 'db'):
+            async for event in self.sql_executor.execute_sql_stream_async(sql_result['sql']):
+                if event["type"] == "columns":
+                    query_results["columns"] = event["columns"]
+                    yield {
+                        "type": "results",
+                        "success": True,
+                        "question": ctx.question,
+                        "intent": intent_info,
+                        "sql": sql_result.get('sql'),
+                        "explanation": sql_result.get('explanation'),
+                        "confidence": sql_result.get('confidence'),
+                        "semantic_cache": sql_result.get('semantic_cache'),
+                        "template": sql_result.get('template'),
+                        "data": {"columns": event["columns"], "rows": []},
+                        "row_count": 0,
+                        "streaming": True,
+                        "timestamp": ctx.timestamp
+                    }
+                elif event["type"] == "rows":
+                    query_results["rows"].extend(event["rows"])
+                    query_results["row_count"] = len(query_results["rows"])
+                    yield {"type": "rows", "rows": event["rows"]}
+                else:
+                    query_results["truncated"] = event["truncated"]
+                    query_results["error"] = event["error"]
+                    query_results["cached"] = event.get("cached")
+                    ctx.row_count = query_results["row_count"]
+                    if query_results["columns"] and not event["error"]:
+                        yield {
+                            "type": "rows",
+                            "rows": [],
+                            "done": True,
+                            "row_count": query_results["row_count"],
+                            "truncated": event["truncated"],
+                            "cached": event.get("cached")
+                        }
+    
+    async def _analyze_results(self, ctx: RequestContext, query_results: Dict[str, Any], intent_info: Dict,
+                               computed_stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Agent 3 call, recording usage on ctx."""
+        async with self._stage(ctx, 'insights'):
+            insights = await self.insight_analyzer.analyze_results_async(ctx.question, query_results, intent_info, computed_stats)
+        ctx.add_usage(insights.pop('_tokens', None), 'insights')
+        return insights
+    
+    def _build_answer_graph(self) -> StageGraph:
+        """
+        Stages from "the query returned" to "the narrative is written".
+        
+        results and statistics have no dependencies and run together: the table
+        goes out to a streaming client while the per-column statistics Agent 3
+        needs are computed on a worker thread. Agent 3 and Agent 4 follow, each
+        with a timeout (STAGE_TIMEOUT_INSIGHTS / STAGE_TIMEOUT_FORMATTER, 0 = none)
+        whose fallback is the agent's own stats-based output.
+        """
+        return StageGraph("answer", [
+            Stage("results", self._results_stage),
+            Stage("statistics", self._statistics_stage, thread=True, fallback=self._statistics_fallback),
+            Stage("insights", self._insights_stage, after=("statistics",),
+                  timeout=float(os.getenv("STAGE_TIMEOUT_INSIGHTS", "60")), fallback=self._insights_fallback),
+            Stage("formatter", self._formatter_stage, after=("results", "insights"),
+                  timeout=float(os.getenv("STAGE_TIMEOUT_FORMATTER", "0")), fallback=self._formatter_fallback),
+        ])
+    
+    def _answer_state(self, ctx: RequestContext, session, intent_info: Dict, sql_result: Dict[str, Any],
+                      query_results: Dict[str, Any], stream: bool = False, streamed: bool = False) -> Dict[str, Any]:
+        """Inputs of one answer_graph run (stage results are added under the stage names)."""
+        return {
+            "ctx": ctx,
+            "session": session,
+            "intent_info": intent_info,
+            "sql_result": sql_result,
+            "query_results": query_results,
+            "stream": stream,
+            "streamed": streamed,
+            "narrative_chunks": [],
+        }
+    
+    async def _results_stage(self, state: Dict[str, Any], emit) -> int:
+        """Send the data table to a streaming client unless its rows were already streamed."""
+        ctx, sql_result, query_results = state["ctx"], state["sql_result"], state["query_results"]
+        row_count = query_results.get('row_count', len(query_results.get('rows', [])))
+        if state["stream"] and not state["streamed"]:
+            emit({
+                "type": "results",
+                "success": True,
+                "question": ctx.question,
+                "intent": state["intent_info"],
+                "sql": sql_result.get('sql'),
+                "explanation": sql_result.get('explanation'),
+                "confidence": sql_result.get('confidence'),
+                "semantic_cache": sql_result.get('semantic_cache'),
+                "template": sql_result.get('template'),
+                "data": {
+                    "columns": query_results.get('columns', []),
+                    "rows": query_results.get('rows', [])
+                },
+                "row_count": row_count,
+                "timestamp": ctx.timestamp
+            })
+        emit({"type": "status", "phase": "analyzing", "message": f"Analyzing {row_count} results..."})
+        return row_count
+    
+    def _statistics_stage(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Agent 3's pre-computed statistics (runs on a worker thread)."""
+        query_results = state["query_results"]
+        if query_results.get('error') or not query_results.get('rows'):
+            return None
+        with state["ctx"].timed('statistics'):
+            return self.insight_analyzer._compute_statistics(query_results['rows'], query_results['columns'])
+    
+    def _statistics_fallback(self, state: Dict[str, Any], emit, exc: Exception) -> None:
+        return None  # Agent 3 computes them itself
+    
+    async def _insights_stage(self, state: Dict[str, Any], emit) -> Dict[str, Any]:
+        print("📊 Agent 3: Insight Analyzer extracting insights...")
+        insights = await self._analyze_results(state["ctx"], state["query_results"], state["intent_info"], state["statistics"])
+        print(f"   Confidence: {insights.get('confidence', 'unknown')}")
+        emit({"type": "insights", "insights": insights.get('insights', {})})
+        return insights
+    
+    def _insights_fallback(self, state: Dict[str, Any], emit, exc: Exception) -> Dict[str, Any]:
+        """Stats-only insights when Agent 3 failed or ran out of time."""
+        query_results = state["query_results"]
+        if isinstance(exc, asyncio.TimeoutError):
+            exc = TimeoutError(f"no insights within {self.answer_graph.stages['insights'].timeout:g}s (STAGE_TIMEOUT_INSIGHTS)")
+        if not state["statistics"]:
+            insights = self.insight_analyzer._empty_result()
+        else:
+            insights = self.insight_analyzer._fallback(exc, {
+                "computed_stats": dict(state["statistics"]),
+                "row_count": len(query_results['rows'])
+            })
+        emit({"type": "insights", "insights": insights.get('insights', {})})
+        return insights
+    
+    async def _formatter_stage(self, state: Dict[str, Any], emit) -> str:
+        """Agent 4: the whole narrative at once, or streamed as delta events."""
+        ctx, session, insights = state["ctx"], state["session"], state["insights"]
+        args = (ctx.question, insights, state["query_results"], state["intent_info"], session.formatter_response_id, ctx)
+        if not state["stream"]:
+            print("✍️  Agent 4: Response Formatter creating narrative...")
+            async with self._stage(ctx, 'formatter'):
+                narrative, formatter_tokens, _ = await self.response_formatter.format_response_async(*args)
+            ctx.add_usage(formatter_tokens, 'formatter')
+            return narrative
+        
+        emit({"type": "status", "phase": "writing", "message": "Writing response..."})
+        print("✍️  Agent 4: Response Formatter streaming narrative...")
+        narrative_chunks = state["narrative_chunks"]
+        async with self._stage(ctx, 'formatter'):
+            formatter_start = time.perf_counter()
+            async for chunk in self.response_formatter.format_response_stream_async(*args):
+                if not narrative_chunks:
+                    ctx.record('formatter_ttft', time.perf_counter() - formatter_start)
+                narrative_chunks.append(chunk)
+                ctx.streamed_chars += len(chunk)
+                emit({"type": "delta", "content": chunk})
+        return "".join(narrative_chunks)
+    
+    def _formatter_fallback(self, state: Dict[str, Any], emit, exc: Exception) -> str:
+        """Template narrative from the insights, after whatever text already streamed."""
+        fallback = self.response_formatter._fallback_text(state["ctx"].question, state["insights"])
+        if state["narrative_chunks"]:
+            fallback = "\n\n" + fallback
+        if state["stream"]:
+            emit({"type": "delta", "content": fallback})
+        return "".join(state["narrative_chunks"]) + fallback
+    
+    def _commit_exchange(self, session, ctx: RequestContext, exchange: Dict[str, Any]):
+        """Publish this run's response-chain ids and history entry to the conversation session."""
+        if ctx.planner_response_id:
+            session.planner_response_id = ctx.planner_response_id
+        if ctx.formatter_response_id:
+            session.formatter_response_id = ctx.formatter_response_id
+        self.sessions.record_exchange(session, exchange)
+    
+    async def _measured(self, ctx: RequestContext, run) -> Dict[str, Any]:
+        """Await a non-streaming run and record its metrics once it ends."""
+        outcome = "cancelled"
+        try:
+            result = await run
+            if result.get('needs_clarification'):
+                outcome = "clarification"
+            else:
+                outcome = "success" if result.get('success') else "error"
+            return result
+        finally:
+            self.metrics.observe(ctx, outcome)
+    
+    async def _measured_stream(self, ctx: RequestContext, events):
+        """
+        Relay a streaming run's events and record its metrics once it ends.
+
+        A run that stops before its terminal event was cancelled (client disconnect):
+        the LLM stream / SQL statement in flight were aborted by the cancellation and
+        nothing was written to conversation history.
+        """
+        outcome = "cancelled"
+        try:
+            async for event in events:
+                if event["type"] == "done":
+                    outcome = "success"
+                elif event["type"] == "metadata":
+                    outcome = "clarification" if event.get('needs_clarification') else "error"
+                yield event
+        finally:
+            saved = self.metrics.observe(ctx, outcome)
+            if outcome == "cancelled":
+                print(f"🛑 Run cancelled during {ctx.stage or 'handoff between stages'} "
+                      f"after {ctx.elapsed():.2f}s — {ctx.total_tokens} tokens spent, ~{saved} saved")
+    
+    def _flight_key(self, question: str, session) -> Optional[tuple]:
+        """
+        Identity of a request for single-flight coalescing (None = don't coalesce).
+
+        First messages depend only on the question and app mode, so they are shared
+        across conversations. Follow-ups depend on their conversation's history and
+        are only shared with duplicates in the same conversation state (double submits).
+        """
+        if not self.coalesce_requests:
+            return None
+        normalized = " ".join(question.lower().split()).rstrip("?!. ")
+        if not session.history:
+            return (normalized, self.sql_executor.app_mode)
+        if session.is_ephemeral:
+            return None
+        return (normalized, self.sql_executor.app_mode, session.conversation_id, len(session.history))
+    
+    def joins_running_flight(self, question: str, conversation_id: Optional[str] = None, stream: bool = True) -> bool:
+        """True if this request would be served by a coalesced run already in flight (no new work)."""
+        session = (self.sessions.peek(conversation_id) if conversation_id else None) or ConversationSession(None)
+        key = self._flight_key(question, session)
+        return key is not None and self.flights.is_running(("stream" if stream else "query",) + key)
+    
+    async def _self_admitted(self, run: Callable[[], Awaitable]):
+        """
+        Await run() under its own admission ticket — for a request that skipped admission
+        to join a flight that ended before it got there. Raises AdmissionRejected.
+        """
+        ticket = await self.admission.admit()
+        try:
+            return await run()
+        finally:
+            ticket.release()
+    
+    async def _self_admitted_stream(self, ctx: RequestContext, events):
+        """Streaming _self_admitted: a rejection becomes a terminal metadata event."""
+        try:
+            ticket = await self.admission.admit()
+        except AdmissionRejected as e:
+            yield {"type": "metadata", "success": False, "error": "Server busy — please retry shortly",
+                   "retry_after": e.retry_after, "timestamp": ctx.timestamp}
+            return
+        try:
+            async for event in events:
+                yield event
+        finally:
+            ticket.release()
+    
+    def _flight_session(self, flight, session):
+        """Session a coalesced run executes against: the caller's for follow-ups, a fresh one for first messages."""
+        run_session = session if session.history else ConversationSession(None)
+        flight.state["session"] = run_session
+        return run_session
+    
+    def _adopt_exchange(self, session, flight):
+        """Copy a coalesced first-message run's exchange into a subscriber's own session."""
+        run_session = flight.state.get("session")
+        if run_session is None or run_session is session or not run_session.history:
+            return
+        if run_session.planner_response_id:
+            session.planner_response_id = run_session.planner_response_id
+        if run_session.formatter_response_id:
+            session.formatter_response_id = run_session.formatter_response_id
+        # Shallow copy: record_exchange later pops raw_results per session
+        self.sessions.record_exchange(session, dict(run_session.history[-1]))
+    
+    async def process_query_async(self, question: str, conversation_id: Optional[str] = None, ctx: Optional[RequestContext] = None,
+                                  admitted: bool = True) -> Dict[str, Any]:
+        """
         Main orchestration method - processes user query through all agents.
         
         Args:
             question: User's natural language question
             conversation_id: Optional conversation ID for context
+            ctx: Optional per-request context (created if omitted); holds token
+                 usage, response ids, web sources and stage timings for this run
+            admitted: False when the caller holds no admission ticket because
+                      joins_running_flight() said it would join a running flight;
+                      a run it has to start after all then takes its own ticket
+                      (raises AdmissionRejected when saturated)
         
         Returns:
             {
@@ -995,18 +1539,33 @@ class MultiAgentPipeline:
                 "timestamp": ISO timestamp
             }
         """
-        start_time = time.time()
-        timestamp = datetime.now().isoformat()
+        ctx = ctx or RequestContext(question, conversation_id)
+        session = self.sessions.get(conversation_id)
+        key = self._flight_key(question, session)
+        if key is None:
+            run = lambda: self._measured(ctx, self._run_query(ctx, session))
+            return await (run() if admitted else self._self_admitted(run))
         
-        # Initialize token tracking
-        total_prompt_tokens = 0
-        total_completion_tokens = 0
-        total_tokens = 0
+        # Identical request already running — share its result
+        run = lambda f: self._measured(ctx, self._run_query(ctx, self._flight_session(f, session)))
+        flight = self.flights.acquire(("query",) + key, run if admitted else lambda f: self._self_admitted(lambda: run(f)))
+        try:
+            result = await flight.wait()
+        finally:
+            self.flights.release(flight)
+        self._adopt_exchange(session, flight)
+        return result
+    
+    async def _run_query(self, ctx: RequestContext, session) -> Dict[str, Any]:
+        """One full (non-streaming) pipeline run against the given session."""
+        question = ctx.question
+        timestamp = ctx.timestamp
         
         try:
             # AGENT 1: Query Planner - Analyze intent
             # Skip on first message — always needs a new query, saves 2-4s LLM call
-            if not self.conversation_history:
+            speculation = None
+            if not session.history:
                 print("🧠 Agent 1: Query Planner SKIPPED (first message — defaulting to new query)")
                 intent_info = {
                     "intent": "query",
@@ -1016,15 +1575,7 @@ class MultiAgentPipeline:
                 }
             else:
                 print("🧠 Agent 1: Query Planner analyzing intent...")
-                intent_info = self.query_planner.analyze_intent(question, self.conversation_history, self.last_planner_response_id)
-                self.last_planner_response_id = intent_info.pop('_response_id', None)
-                
-                # Track tokens from Agent 1
-                if '_tokens' in intent_info:
-                    tokens = intent_info.pop('_tokens')
-                    total_prompt_tokens += tokens['prompt_tokens']
-                    total_completion_tokens += tokens['completion_tokens']
-                    total_tokens += tokens['total_tokens']
+                intent_info, speculation = await self._plan_with_speculation(ctx, session)
             print(f"   Intent: {intent_info['intent']}, New Query: {intent_info['needs_new_query']}")
             
             # AGENT 2: SQL Executor - Execute query if needed
@@ -1033,7 +1584,10 @@ class MultiAgentPipeline:
             
             if intent_info['needs_new_query']:
                 print("🔍 Agent 2: SQL Executor generating query...")
-                sql_result = self.sql_executor.generate_sql(question)
+                if speculation:
+                    sql_result, query_results = speculation
+                else:
+                    sql_result = await self._generate_sql(ctx)
                 
                 # Check if query needs clarification
                 if sql_result.get('needs_clarification'):
@@ -1072,8 +1626,9 @@ class MultiAgentPipeline:
                             "timestamp": timestamp
                         }
                     
-                    print("⚙️  Agent 2: Executing SQL query...")
-                    query_results = self.sql_executor.execute_sql(sql_result['sql'])
+                    if query_results is None:
+                        print("⚙️  Agent 2: Executing SQL query...")
+                        query_results = await self._execute_sql(ctx, sql_result['sql'])
                 else:
                     return {
                         "success": False,
@@ -1083,8 +1638,8 @@ class MultiAgentPipeline:
                     }
             else:
                 # Use results from previous query in conversation
-                if self.conversation_history:
-                    last_exchange = self.conversation_history[-1]
+                if session.history:
+                    last_exchange = session.history[-1]
                     query_results = last_exchange.get('raw_results', {})
                     
                     # Check if previous results actually have data
@@ -1092,18 +1647,21 @@ class MultiAgentPipeline:
                     if previous_row_count == 0:
                         print("⚠️  Previous query had 0 results - running new query instead")
                         # Force new query since there's nothing to analyze
-                        sql_result = self.sql_executor.generate_sql(question)
-                        
-                        if sql_result.get('sql'):
-                            print("⚙️  Agent 2: Executing SQL query...")
-                            query_results = self.sql_executor.execute_sql(sql_result['sql'])
+                        if speculation:
+                            sql_result, query_results = speculation
                         else:
+                            sql_result, query_results = await self._generate_sql(ctx), None
+                        
+                        if not sql_result.get('sql'):
                             return {
                                 "success": False,
                                 "question": question,
                                 "error": "Failed to generate SQL query",
                                 "timestamp": timestamp
                             }
+                        if query_results is None:
+                            print("⚙️  Agent 2: Executing SQL query...")
+                            query_results = await self._execute_sql(ctx, sql_result['sql'])
                     else:
                         sql_result = {"sql": "-- Using cached results", "explanation": "Analyzing previous results"}
                 else:
@@ -1119,9 +1677,11 @@ class MultiAgentPipeline:
                 error_msg = str(query_results['error'])
                 if 'syntax' in error_msg.lower() or '42000' in error_msg:
                     print("⚠️  SQL syntax error — regenerating query (retry 1/1)...")
-                    sql_result = self.sql_executor.generate_sql(question)
+                    sql_result = await self._generate_sql(ctx, use_cache=False)
                     if sql_result.get('sql') and isinstance(sql_result['sql'], str):
-                        query_results = self.sql_executor.execute_sql(sql_result['sql'])
+                        query_results = await self._execute_sql(ctx, sql_result['sql'])
+            
+            self._remember_sql(ctx, sql_result, query_results)
             
             if query_results.get('error'):
                 return {
@@ -1132,34 +1692,15 @@ class MultiAgentPipeline:
                     "timestamp": timestamp
                 }
             
-            # AGENT 3: Insight Analyzer - Extract insights
-            print("📊 Agent 3: Insight Analyzer extracting insights...")
-            insights = self.insight_analyzer.analyze_results(question, query_results, intent_info)
-            print(f"   Confidence: {insights.get('confidence', 'unknown')}")
-            
-            # Track tokens from Agent 3
-            if '_tokens' in insights:
-                tokens = insights.pop('_tokens')
-                total_prompt_tokens += tokens['prompt_tokens']
-                total_completion_tokens += tokens['completion_tokens']
-                total_tokens += tokens['total_tokens']
-            
-            # AGENT 4: Response Formatter - Create narrative
-            print("✍️  Agent 4: Response Formatter creating narrative...")
-            narrative, formatter_tokens, formatter_resp_id = self.response_formatter.format_response(question, insights, query_results, intent_info, self.last_formatter_response_id)
-            self.last_formatter_response_id = formatter_resp_id
-            web_sources = self.response_formatter._web_sources or []
+            # AGENTS 3 + 4: Insight Analyzer and Response Formatter (see _build_answer_graph)
+            state = await self.answer_graph.run(self._answer_state(ctx, session, intent_info, sql_result, query_results))
+            insights, narrative = state["insights"], state["formatter"]
+            web_sources = ctx.web_sources
             if web_sources:
                 print(f"   🌐 {len(web_sources)} web sources enriching narrative")
             
-            # Track tokens from Agent 4
-            if formatter_tokens:
-                total_prompt_tokens += formatter_tokens['prompt_tokens']
-                total_completion_tokens += formatter_tokens['completion_tokens']
-                total_tokens += formatter_tokens['total_tokens']
-            
             # Calculate elapsed time
-            elapsed_time = time.time() - start_time
+            elapsed_time = ctx.elapsed()
             
             # Build response
             response = {
@@ -1169,6 +1710,8 @@ class MultiAgentPipeline:
                 "sql": sql_result.get('sql'),
                 "explanation": sql_result.get('explanation'),
                 "confidence": sql_result.get('confidence'),
+                "semantic_cache": sql_result.get('semantic_cache'),
+                "template": sql_result.get('template'),
                 "insights": insights.get('insights', {}),
                 "narrative": narrative,
                 "web_sources": web_sources,
@@ -1176,31 +1719,26 @@ class MultiAgentPipeline:
                     "columns": query_results.get('columns', []),
                     "rows": query_results.get('rows', [])
                 },
-                "usage_stats": {
-                    "prompt_tokens": total_prompt_tokens,
-                    "completion_tokens": total_completion_tokens,
-                    "total_tokens": total_tokens
-                },
+                "usage_stats": ctx.usage_stats(),
+                "timings": ctx.summary()["timings"],
                 "elapsed_time": round(elapsed_time, 2),
                 "timestamp": timestamp
             }
             
             # Print usage summary
-            print(f"📊 Token Usage: {total_tokens} total ({total_prompt_tokens} input, {total_completion_tokens} output)")
+            print(f"📊 Token Usage: {ctx.total_tokens} total ({ctx.prompt_tokens} input, {ctx.completion_tokens} output)")
             print(f"⏱️  Elapsed Time: {elapsed_time:.2f}s")
             
-            # Store in conversation history
-            self.conversation_history.append({
+            # Store in conversation history (bounded per session by SessionManager)
+            self._commit_exchange(session, ctx, {
                 "question": question,
                 "intent": intent_info['intent'],
                 "summary": insights.get('insights', {}).get('overview', ''),
+                "narrative": narrative,
+                "timestamp": timestamp,
                 "raw_results": query_results
             })
             
-            # Keep only last 10 exchanges
-            if len(self.conversation_history) > 10:
-                self.conversation_history = self.conversation_history[-10:]
-            
             print("✅ Multi-agent processing complete!\n")
             return response
         
@@ -1213,26 +1751,55 @@ class MultiAgentPipeline:
                 "timestamp": timestamp
             }
     
-    def process_query_stream(self, question: str, conversation_id: Optional[str] = None):
+    async def process_query_stream_async(self, question: str, conversation_id: Optional[str] = None, ctx: Optional[RequestContext] = None,
+                                         admitted: bool = True):
         """
-        Streaming orchestration — runs agents 1-3 synchronously, then streams agent 4.
+        Streaming orchestration — runs agents 1-3 without blocking the event loop, then streams agent 4.
+        
+        admitted works as in process_query_async; a self-admitted run that is
+        rejected yields a metadata event with "retry_after" instead of raising.
         
         Yields:
             dict: SSE-ready event dicts with 'type' key:
-                - {"type": "metadata", ...}  — intent, SQL, insights (before streaming)
+                - {"type": "results", ...}  — intent, SQL and the data table, as soon as the query returns
+                  (for executed queries: columns only, with "streaming": True)
+                - {"type": "rows", "rows": [...]}  — row batches while the database is still fetching;
+                  the last one has "done": True, "row_count", "truncated" and "cached"
+                  ("fresh"/"stale" when served from the SQL result cache, else None)
+                - {"type": "insights", "insights": {...}}  — Agent 3 output, before streaming
+                - {"type": "metadata", ...}  — clarification requests and errors (terminal)
                 - {"type": "delta", "content": "..."}  — text chunks from ResponseFormatter
                 - {"type": "done", ...}  — final usage stats and elapsed time
         """
-        start_time = time.time()
-        timestamp = datetime.now().isoformat()
-        total_prompt_tokens = 0
-        total_completion_tokens = 0
-        total_tokens = 0
+        ctx = ctx or RequestContext(question, conversation_id)
+        session = self.sessions.get(conversation_id)
+        key = self._flight_key(question, session)
+        if key is None:
+            events = self._measured_stream(ctx, self._run_query_stream(ctx, session))
+            async for event in (events if admitted else self._self_admitted_stream(ctx, events)):
+                yield event
+            return
+        
+        # Identical request already running — replay its events, then follow it live
+        run = lambda f: self._measured_stream(ctx, self._run_query_stream(ctx, self._flight_session(f, session)))
+        flight = self.flights.acquire(("stream",) + key, run if admitted else lambda f: self._self_admitted_stream(ctx, run(f)))
+        try:
+            async for event in flight.replay():
+                yield event
+        finally:
+            self.flights.release(flight)
+        self._adopt_exchange(session, flight)
+    
+    async def _run_query_stream(self, ctx: RequestContext, session):
+        """One streaming pipeline run against the given session (see process_query_stream_async)."""
+        question = ctx.question
+        timestamp = ctx.timestamp
         
         try:
             # AGENT 1: Query Planner
             # Skip on first message — always needs a new query, saves 2-4s LLM call
-            if not self.conversation_history:
+            speculation = None
+            if not session.history:
                 print("🧠 Agent 1: Query Planner SKIPPED (first message — defaulting to new query)")
                 intent_info = {
                     "intent": "query",
@@ -1243,18 +1810,21 @@ class MultiAgentPipeline:
             else:
                 yield {"type": "status", "phase": "planning", "message": "Analyzing your question..."}
                 print("🧠 Agent 1: Query Planner analyzing intent...")
-                intent_info = self.query_planner.analyze_intent(question, self.conversation_history, self.last_planner_response_id)
-                self.last_planner_response_id = intent_info.pop('_response_id', None)
+                intent_info, speculation = await self._plan_with_speculation(ctx, session)
             print(f"   Intent: {intent_info['intent']}, New Query: {intent_info['needs_new_query']}")
             
             # AGENT 2: SQL Executor
             sql_result = None
             query_results = None
+            streamed = False  # True once rows went out incrementally as 'results' + 'rows' events
             
             if intent_info['needs_new_query']:
                 yield {"type": "status", "phase": "generating_sql", "message": "Generating SQL query..."}
                 print("🔍 Agent 2: SQL Executor generating query...")
-                sql_result = self.sql_executor.generate_sql(question)
+                if speculation:
+                    sql_result, query_results = speculation
+                else:
+                    sql_result = await self._generate_sql(ctx)
                 
                 if sql_result.get('needs_clarification'):
                     yield {
@@ -1267,20 +1837,33 @@ class MultiAgentPipeline:
                     }
                     return
                 
-                if sql_result.get('sql') and isinstance(sql_result['sql'], str):
+                if query_results is not None:
+                    pass  # already run speculatively; sent below as one 'results' event
+                elif sql_result.get('sql') and isinstance(sql_result['sql'], str):
                     yield {"type": "status", "phase": "querying_database", "message": "Querying database..."}
-                    query_results = self.sql_executor.execute_sql(sql_result['sql'])
+                    query_results = {}
+                    async for event in self._execute_sql_streaming(ctx, sql_result, intent_info, query_results):
+                        streamed = streamed or event["type"] == "results"
+                        yield event
                 else:
                     yield {"type": "metadata", "success": False, "error": "Failed to generate SQL query", "timestamp": timestamp}
                     return
             else:
-                if self.conversation_history:
-                    last_exchange = self.conversation_history[-1]
+                if session.history:
+                    last_exchange = session.history[-1]
                     query_results = last_exchange.get('raw_results', {})
                     if query_results.get('row_count', 0) == 0:
-                        sql_result = self.sql_executor.generate_sql(question)
-                        if sql_result.get('sql'):
-                            query_results = self.sql_executor.execute_sql(sql_result['sql'])
+                        if speculation:
+                            sql_result, query_results = speculation
+                        else:
+                            sql_result, query_results = await self._generate_sql(ctx), None
+                        if query_results is not None:
+                            pass  # already run speculatively
+                        elif sql_result.get('sql'):
+                            query_results = {}
+                            async for event in self._execute_sql_streaming(ctx, sql_result, intent_info, query_results):
+                                streamed = streamed or event["type"] == "results"
+                                yield event
                         else:
                             yield {"type": "metadata", "success": False, "error": "Failed to generate SQL query", "timestamp": timestamp}
                             return
@@ -1295,77 +1878,49 @@ class MultiAgentPipeline:
                 error_msg = str(query_results['error'])
                 if 'syntax' in error_msg.lower() or '42000' in error_msg:
                     print("⚠️  SQL syntax error — regenerating query (retry 1/1)...")
-                    sql_result = self.sql_executor.generate_sql(question)
+                    sql_result = await self._generate_sql(ctx, use_cache=False)
                     if sql_result.get('sql') and isinstance(sql_result['sql'], str):
-                        query_results = self.sql_executor.execute_sql(sql_result['sql'])
+                        async for event in self._execute_sql_streaming(ctx, sql_result, intent_info, query_results):
+                            streamed = streamed or event["type"] == "results"
+                            yield event
+            
+            self._remember_sql(ctx, sql_result, query_results)
             
             if query_results.get('error'):
                 yield {"type": "metadata", "success": False, "error": query_results['error'], "sql": sql_result.get('sql'), "timestamp": timestamp}
                 return
             
-            # AGENT 3: Insight Analyzer
-            row_count = query_results.get('row_count', len(query_results.get('rows', [])))
-            yield {"type": "status", "phase": "analyzing", "message": f"Analyzing {row_count} results..."}
-            print("📊 Agent 3: Insight Analyzer extracting insights...")
-            insights = self.insight_analyzer.analyze_results(question, query_results, intent_info)
+            # AGENTS 3 + 4: the table (unless already streamed), insights, then the narrative
+            # as delta events — the same stage graph as the blocking endpoint
+            state = self._answer_state(ctx, session, intent_info, sql_result, query_results, stream=True, streamed=streamed)
+            async with aclosing(self.answer_graph.stream(state)) as events:  # closing it cancels the stages
+                async for event in events:
+                    yield event
+            insights, narrative = state["insights"], state["formatter"]
             
-            # Emit metadata (agents 1-3 results) before streaming
-            yield {
-                "type": "metadata",
-                "success": True,
-                "question": question,
-                "intent": intent_info,
-                "sql": sql_result.get('sql'),
-                "explanation": sql_result.get('explanation'),
-                "confidence": sql_result.get('confidence'),
-                "insights": insights.get('insights', {}),
-                "data": {
-                    "columns": query_results.get('columns', []),
-                    "rows": query_results.get('rows', [])
-                },
-                "timestamp": timestamp
-            }
-            
-            # AGENT 4: Response Formatter — STREAMING
-            yield {"type": "status", "phase": "writing", "message": "Writing response..."}
-            print("✍️  Agent 4: Response Formatter streaming narrative...")
-            for chunk in self.response_formatter.format_response_stream(
-                question, insights, query_results, intent_info, self.last_formatter_response_id
-            ):
-                yield {"type": "delta", "content": chunk}
-            
-            # Retrieve streaming metadata
-            self.last_formatter_response_id = self.response_formatter._stream_response_id
-            web_sources = self.response_formatter._web_sources or []
+            # Streaming metadata (response id, web sources, usage) was recorded on ctx
+            web_sources = ctx.web_sources
             if web_sources:
                 print(f"   🌐 {len(web_sources)} web sources enriching narrative")
-            formatter_tokens = self.response_formatter._stream_tokens
-            if formatter_tokens:
-                total_prompt_tokens += formatter_tokens['prompt_tokens']
-                total_completion_tokens += formatter_tokens['completion_tokens']
-                total_tokens += formatter_tokens['total_tokens']
             
-            elapsed_time = time.time() - start_time
+            elapsed_time = ctx.elapsed()
             
-            # Store in conversation history
-            self.conversation_history.append({
+            # Store in conversation history (bounded per session by SessionManager)
+            self._commit_exchange(session, ctx, {
                 "question": question,
                 "intent": intent_info['intent'],
                 "summary": insights.get('insights', {}).get('overview', ''),
+                "narrative": narrative,
+                "timestamp": timestamp,
                 "raw_results": query_results
             })
-            if len(self.conversation_history) > 10:
-                self.conversation_history = self.conversation_history[-10:]
             
             # Emit done event
             yield {
                 "type": "done",
                 "web_sources": web_sources,
-                "usage_stats": {
-                    "prompt_tokens": total_prompt_tokens,
-                    "completion_tokens": total_completion_tokens,
-                    "total_tokens": total_tokens
-                },
+                "usage_stats": ctx.usage_stats(),
+                "timings": ctx.summary()["timings"],
                 "elapsed_time": round(elapsed_time, 2)
             }
             
@@ -7,10 +7,18 @@ Converts natural language queries to SQL and executes against ISD database.
 import os
 import sys
 import json
+import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
 import pyodbc
-from openai import OpenAI
+from llm_transport import openai_client
+from db_pool import ConnectionPool
+from result_cache import ResultCache
+from template_router import TemplateRouter
+from query_guard import QueryGuard
+from local_replica import LocalReplica
+from facet_cube import FacetCube
+from sql_tokens import limit_rows, validate
 
 # Load environment variables
 load_dotenv()
@@ -27,20 +35,41 @@ RESET = '\033[0m'
 class NL2SQLPipeline:
     """Natural Language to SQL conversion and execution pipeline."""
     
-    def __init__(self, llm_client=None):
+    def __init__(self, llm_client=None, async_llm_client=None):
         """Initialize the pipeline with database and LLM connections.
         
         Args:
             llm_client: Optional OpenAI client (shared from MultiAgentPipeline).
                         If None, creates its own AzureOpenAI client for standalone use.
+            async_llm_client: Optional AsyncOpenAI client (shared from MultiAgentPipeline)
+                              used by generate_sql_async.
         """
         self.schema_context = self._load_schema_context()
         self._shared_client = llm_client  # OpenAI client from pipeline (uses responses API)
+        self._async_client = async_llm_client
         self.llm_client = llm_client if llm_client else self._init_llm_client()
         self.deployment = os.getenv("MODEL_NL2SQL", os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "gpt-5.4"))
         self.reasoning_effort = os.getenv("MODEL_NL2SQL_REASONING", "low")  # low, medium, high, or none
         self.query_history = []
         self.app_mode = os.getenv('APP_MODE', 'seller').lower()  # 'seller' or 'customer'
+        
+        # Execution limits (apply to execute_sql and execute_sql_stream_async)
+        self.max_rows = int(os.getenv("SQL_MAX_ROWS", "10000"))
+        self.query_timeout = int(os.getenv("SQL_QUERY_TIMEOUT_SECONDS", "30"))
+        self.stream_batch_size = int(os.getenv("SQL_STREAM_BATCH_SIZE", "200"))
+
+        # Read-only connections reused across queries (opened lazily; see db_pool)
+        self.db_pool = ConnectionPool(self._get_db_connection)
+        # Results of identical (canonicalized) statements, shared across questions
+        self.result_cache = ResultCache()
+        # Estimated-plan cost check before execution, byte / time budget while fetching
+        self.query_guard = QueryGuard()
+        # Fixed question shapes answered without a model call (vocabulary loaded from the view)
+        self.template_router = TemplateRouter(self.db_pool.acquire, self.app_mode)
+        # SQLite snapshot of the view that serves translatable statements without a round trip
+        self.replica = LocalReplica(self.db_pool.acquire)
+        # Distinct-solution counts per industry / area / geo / partner, answered from memory
+        self.facet_cube = FacetCube(self.db_pool.acquire)
     
     def _load_schema_context(self):
         """Load database schema context for the LLM."""
@@ -165,15 +194,11 @@ WHERE marketPlaceLink IS NOT NULL
 """
     
     def _init_llm_client(self):
-        """Initialize OpenAI client per official Azure Responses API docs."""
-        azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "").rstrip("/")
-        return OpenAI(
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            base_url=f"{azure_endpoint}/openai/v1/"
-        )
+        """Initialize OpenAI client per official Azure Responses API docs (on the shared connection pool)."""
+        return openai_client()
     
     def _get_db_connection(self):
-        """Get database connection."""
+        """Open a new database connection (use self.db_pool.acquire() to get a pooled one)."""
         server = os.getenv('SQL_SERVER')
         database = os.getenv('SQL_DATABASE')
         username = os.getenv('SQL_USERNAME')
@@ -190,20 +215,153 @@ WHERE marketPlaceLink IS NOT NULL
             f"ApplicationIntent=ReadOnly;"  # PRODUCTION SAFETY: Read-only mode
         )
         
-        return pyodbc.connect(conn_str)
+        conn = pyodbc.connect(conn_str)
+        conn.timeout = self.query_timeout  # Server-side query timeout (seconds, 0 = none)
+        return conn
     
-    def generate_sql(self, natural_query: str) -> dict:
+    def set_data_version(self, fingerprint):
+        """The view's data changed (or was first seen): refresh facet cube, local replica, result cache and template vocabulary."""
+        # Cube and replica first, so results cached after the cache is emptied come from the new data;
+        # one failing reload must not keep the others on stale data
+        for name, component in (("Facet cube", self.facet_cube), ("Local replica", self.replica),
+                                ("Result cache", self.result_cache), ("Template router", self.template_router)):
+            try:
+                component.set_data_version(fingerprint)
+            except Exception as e:
+                print(f"{YELLOW}⚠ {name} reload failed: {e}{RESET}")
+    
+    def route_template(self, natural_query: str):
+        """
+        SQL for a template-shaped question without a model call (see template_router).
+        
+        Returns:
+            generate_sql-shaped dict with a 'template' key, or None when no template
+            matches (or the built statement fails validate_sql)
+        """
+        routed = self.template_router.route(natural_query)
+        if routed is None:
+            return None
+        if not self.validate_sql(routed['sql']):
+            self.template_router.reject(routed)
+            return None
+        print(f"{GREEN}⚡ Template '{routed['template']}' matched — no model call{RESET}\n")
+        return routed
+    
+    def generate_sql(self, natural_query: str, use_templates: bool = True) -> dict:
         """
         Convert natural language query to SQL.
         
         Args:
             natural_query: Natural language question
+            use_templates: Try the deterministic templates before the model
         
         Returns:
             dict with 'sql', 'explanation', and 'confidence'
+            ('template' when a template produced it)
+        """
+        if use_templates:
+            routed = self.route_template(natural_query)
+            if routed:
+                return routed
+        
+        print(f"{BLUE}🤖 Generating SQL from natural language...{RESET}\n")
+        system_prompt = self._build_system_prompt()
+        
+        try:
+            print(f"{CYAN}   Model: {self.deployment}, Reasoning: {self.reasoning_effort}{RESET}")
+            
+            if self._shared_client:
+                # Use Responses API (shared OpenAI client from pipeline)
+                response = self._shared_client.responses.create(**self._build_responses_kwargs(system_prompt, natural_query))
+                result = json.loads(response.output_text)
+                result['_tokens'] = self._usage_tokens(response)
+            else:
+                # Fallback: AzureOpenAI chat.completions (standalone use)
+                response = self.llm_client.chat.completions.create(
+                    model=self.deployment,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": natural_query}
+                    ],
+                    response_format={"type": "json_object"}
+                )
+                result = json.loads(response.choices[0].message.content)
+            
+            print(f"{GREEN}✓ SQL generated successfully{RESET}")
+            print(f"{CYAN}Confidence: {result.get('confidence', 'unknown')}{RESET}\n")
+            
+            return result
+            
+        except Exception as e:
+            print(f"{RED}✗ Error generating SQL: {str(e)}{RESET}\n")
+            return {
+                "sql": None,
+                "explanation": f"Error: {str(e)}",
+                "confidence": "none"
+            }
+    
+    async def generate_sql_async(self, natural_query: str, use_templates: bool = True) -> dict:
+        """
+        Non-blocking variant of generate_sql.
+        
+        Uses the shared AsyncOpenAI client when available; otherwise runs the
+        blocking call in a worker thread so the caller's event loop stays free.
         """
+        if use_templates:
+            routed = self.route_template(natural_query)
+            if routed:
+                return routed
+        if not self._async_client:
+            return await asyncio.to_thread(self.generate_sql, natural_query, False)
+        
         print(f"{BLUE}🤖 Generating SQL from natural language...{RESET}\n")
+        system_prompt = self._build_system_prompt()
         
+        try:
+            print(f"{CYAN}   Model: {self.deployment}, Reasoning: {self.reasoning_effort}{RESET}")
+            response = await self._async_client.responses.create(**self._build_responses_kwargs(system_prompt, natural_query))
+            result = json.loads(response.output_text)
+            result['_tokens'] = self._usage_tokens(response)
+            
+            print(f"{GREEN}✓ SQL generated successfully{RESET}")
+            print(f"{CYAN}Confidence: {result.get('confidence', 'unknown')}{RESET}\n")
+            
+            return result
+            
+        except Exception as e:
+            print(f"{RED}✗ Error generating SQL: {str(e)}{RESET}\n")
+            return {
+                "sql": None,
+                "explanation": f"Error: {str(e)}",
+                "confidence": "none"
+            }
+    
+    def _build_responses_kwargs(self, system_prompt: str, natural_query: str) -> dict:
+        """Build Responses API kwargs for SQL generation."""
+        kwargs = {
+            "model": self.deployment,
+            "instructions": system_prompt,
+            "input": f"Generate a SQL query as JSON for: {natural_query}",
+            "text": {"format": {"type": "json_object"}}
+        }
+        # Add reasoning effort for models that support it (e.g., gpt-5.4, gpt-5.5)
+        if self.reasoning_effort and self.reasoning_effort != "none":
+            kwargs["reasoning"] = {"effort": self.reasoning_effort}
+        return kwargs
+    
+    def _usage_tokens(self, response):
+        """Token usage of a Responses API call (popped by MultiAgentPipeline for usage_stats)."""
+        usage = getattr(response, 'usage', None)
+        if not usage:
+            return None
+        return {
+            'prompt_tokens': usage.input_tokens,
+            'completion_tokens': usage.output_tokens,
+            'total_tokens': usage.total_tokens
+        }
+    
+    def _build_system_prompt(self) -> str:
+        """Build the mode-specific system prompt for SQL generation."""
         # Determine mode-specific requirements
         is_seller_mode = self.app_mode == 'seller'
         mode_label = "SELLER" if is_seller_mode else "CUSTOMER"
@@ -432,58 +590,19 @@ CRITICAL REMINDER BEFORE YOU GENERATE:
 - low: Very vague or likely to return no results
 """
         
-        try:
-            print(f"{CYAN}   Model: {self.deployment}, Reasoning: {self.reasoning_effort}{RESET}")
-            
-            if self._shared_client:
-                # Use Responses API (shared OpenAI client from pipeline)
-                kwargs = {
-                    "model": self.deployment,
-                    "instructions": system_prompt,
-                    "input": f"Generate a SQL query as JSON for: {natural_query}",
-                    "text": {"format": {"type": "json_object"}}
-                }
-                # Add reasoning effort for models that support it (e.g., gpt-5.4, gpt-5.5)
-                if self.reasoning_effort and self.reasoning_effort != "none":
-                    kwargs["reasoning"] = {"effort": self.reasoning_effort}
-                
-                response = self._shared_client.responses.create(**kwargs)
-                result = json.loads(response.output_text)
-            else:
-                # Fallback: AzureOpenAI chat.completions (standalone use)
-                response = self.llm_client.chat.completions.create(
-                    model=self.deployment,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": natural_query}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                result = json.loads(response.choices[0].message.content)
-            
-            print(f"{GREEN}✓ SQL generated successfully{RESET}")
-            print(f"{CYAN}Confidence: {result.get('confidence', 'unknown')}{RESET}\n")
-            
-            return result
-            
-        except Exception as e:
-            print(f"{RED}✗ Error generating SQL: {str(e)}{RESET}\n")
-            return {
-                "sql": None,
-                "explanation": f"Error: {str(e)}",
-                "confidence": "none"
-            }
+        return system_prompt
     
     def validate_sql(self, sql: str) -> bool:
         """
         Validate SQL query for safety - PRODUCTION DATABASE PROTECTION.
         
-        Multiple validation layers:
-        1. Block all write operations (INSERT, UPDATE, DELETE, etc.)
-        2. Block DDL operations (CREATE, DROP, ALTER, etc.)
-        3. Block stored procedures and functions (EXEC, EXECUTE)
-        4. Block transactions (BEGIN, COMMIT)
-        5. Only allow SELECT queries
+        One pass over the statement's tokens (sql_tokens.validate), so string
+        literals, [identifiers] and comments are never mistaken for keywords:
+        1. Block all write operations (INSERT, UPDATE, DELETE, MERGE, SELECT ... INTO)
+        2. Block DDL and permission changes (CREATE, DROP, ALTER, GRANT, etc.)
+        3. Block stored procedures and external data (EXEC, OPENROWSET, etc.)
+        4. Block transaction and batch control (BEGIN, COMMIT, DECLARE, SET, variables, #temp tables)
+        5. Only allow a single SELECT query (optionally with WITH common table expressions)
         
         Args:
             sql: SQL query to validate
@@ -491,76 +610,117 @@ CRITICAL REMINDER BEFORE YOU GENERATE:
         Returns:
             True if safe, False otherwise
         """
-        import re
-        
-        sql_upper = sql.upper()
-        
-        # LAYER 1: Block write operations
-        write_keywords = ['INSERT', 'UPDATE', 'DELETE', 'MERGE']
-        for keyword in write_keywords:
-            if re.search(r'\b' + keyword + r'\b', sql_upper):
-                print(f"{RED}✗ BLOCKED: Query contains WRITE operation: {keyword}{RESET}")
-                print(f"{RED}✗ This is a PRODUCTION database - READ-ONLY access only!{RESET}\n")
-                return False
-        
-        # LAYER 2: Block DDL operations
-        ddl_keywords = ['DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'RENAME']
-        for keyword in ddl_keywords:
-            if re.search(r'\b' + keyword + r'\b', sql_upper):
-                print(f"{RED}✗ BLOCKED: Query contains DDL operation: {keyword}{RESET}")
-                print(f"{RED}✗ This is a PRODUCTION database - READ-ONLY access only!{RESET}\n")
-                return False
-        
-        # LAYER 3: Block stored procedures and functions
-        exec_keywords = ['EXEC', 'EXECUTE', 'SP_', 'XP_']
-        for keyword in exec_keywords:
-            if re.search(r'\b' + keyword + r'\b', sql_upper):
-                print(f"{RED}✗ BLOCKED: Query attempts to execute code: {keyword}{RESET}")
-                print(f"{RED}✗ This is a PRODUCTION database - READ-ONLY access only!{RESET}\n")
-                return False
-        
-        # LAYER 4: Block transaction control
-        transaction_keywords = ['BEGIN TRAN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT']
-        for keyword in transaction_keywords:
-            if keyword in sql_upper:
-                print(f"{RED}✗ BLOCKED: Query contains transaction control: {keyword}{RESET}")
-                print(f"{RED}✗ This is a PRODUCTION database - READ-ONLY access only!{RESET}\n")
-                return False
-        
-        # LAYER 5: Ensure it's a SELECT query
-        if not sql_upper.strip().startswith('SELECT') and not sql_upper.strip().startswith('WITH'):
-            print(f"{RED}✗ BLOCKED: Only SELECT queries are allowed{RESET}")
+        check = validate(sql)
+        if not check.ok:
+            print(f"{RED}✗ BLOCKED: {check.reason}{RESET}")
             print(f"{RED}✗ This is a PRODUCTION database - READ-ONLY access only!{RESET}\n")
             return False
         
         print(f"{GREEN}✓ SQL validated - Safe READ-ONLY query{RESET}\n")
         return True
     
+    def prepare_sql(self, sql: str, max_rows: int) -> tuple:
+        """
+        Statement to execute for sql: validated, with the row cap applied on the server.
+        
+        Returns:
+            (statement, None), or (None, error message) when sql is not a read-only SELECT
+        """
+        check = validate(sql)
+        if not check.ok:
+            print(f"{RED}✗ BLOCKED: {check.reason}{RESET}\n")
+            return None, f"Blocked: {check.reason} (read-only SELECT queries only)"
+        # TOP one row over the cap, so a capped result is still reported as truncated
+        statement = limit_rows(sql, max_rows + 1)
+        if statement != sql:
+            print(f"{CYAN}   Row limit applied: TOP {max_rows + 1}{RESET}")
+        return statement, None
+    
     def execute_sql(self, sql: str) -> dict:
         """
         Execute SQL query against the database (READ-ONLY).
         
         SAFETY MEASURES:
         - Connection in READ-ONLY mode (ApplicationIntent=ReadOnly)
-        - Explicit ROLLBACK after each query
+        - Explicit ROLLBACK after each query (and again when the pooled connection is returned)
         - No transactions committed
+        - Query timeout (SQL_QUERY_TIMEOUT_SECONDS) and row cap (SQL_MAX_ROWS)
+        - Only a single SELECT runs (see prepare_sql); TOP is added or lowered to the row cap
+        - Estimated plan cost checked first (SQL_MAX_PLAN_COST); rows are fetched in
+          batches and fetching stops at the row, size (SQL_MAX_RESULT_MB) or time limit
         
         Args:
             sql: SQL query to execute
         
+        Results are served from the result cache when the same statement (after
+        canonicalization) ran recently; see result_cache. Otherwise a distinct-solution
+        count (optionally per industry, area, geo, partner...) is answered by the
+        facet cube, and with SQL_LOCAL_REPLICA=true a statement the local replica
+        can translate runs there instead of on Azure SQL; see facet_cube and local_replica.
+        
         Returns:
-            dict with 'columns', 'rows', 'row_count', 'error'
+            dict with 'columns', 'rows', 'row_count', 'truncated', 'error'
+            (and 'cached': "fresh" or "stale" on a cache hit; 'timed_out' when
+            fetching stopped at the time limit, which is never cached)
         """
+        sql, error = self.prepare_sql(sql, self.max_rows)
+        if error:
+            return {"columns": [], "rows": [], "row_count": 0, "truncated": False, "error": error}
+        key = self.result_cache.key(sql, self.max_rows)
+        cached = self.result_cache.get(key, reload=lambda: self._execute_uncached(sql))
+        if cached is not None:
+            print(f"{GREEN}⚡ SQL result cache hit ({cached['cached']}, {cached['row_count']} rows){RESET}\n")
+            return cached
+        version = self.result_cache.version
+        result = self._execute_uncached(sql)
+        if not result["error"] and not result.get("timed_out"):
+            self.result_cache.put(key, result["columns"], result["rows"], result["truncated"], version=version)
+        return result
+    
+    def _execute_uncached(self, sql: str) -> dict:
+        """execute_sql without the result cache."""
+        counted = self.facet_cube.execute(sql, self.max_rows)
+        if counted is not None:
+            return counted
+        local = self.replica.execute(sql, self.query_guard.budget(self.max_rows, self.query_timeout))
+        if local is not None:
+            return local
+        
         print(f"{BLUE}📊 Executing SQL query (READ-ONLY mode)...{RESET}\n")
         
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
+        conn = self.db_pool.acquire()
+        cursor = None
         
         try:
+            cursor = conn.cursor()
+            
+            # Refuse (or shrink) a statement whose estimated plan is over budget
+            verdict = self.query_guard.check(conn, sql)
+            if verdict.reconnect:
+                self._close_quietly(conn, cursor)
+                cursor = None
+                conn = self.db_pool.acquire()
+                cursor = conn.cursor()
+            if verdict.sql is None:
+                cursor.close()
+                conn.close()
+                return {"columns": [], "rows": [], "row_count": 0, "truncated": False, "error": verdict.error}
+            
             # Execute query
-            cursor.execute(sql)
+            cursor.execute(verdict.sql)
             columns = [column[0] for column in cursor.description]
-            rows = cursor.fetchall()
+            budget = self.query_guard.budget(self.max_rows, self.query_timeout)
+            rows = []
+            while budget.stopped is None:
+                batch = cursor.fetchmany(budget.next_size(1000))
+                if not batch:
+                    break
+                rows.extend(budget.take(batch))
+            if budget.stopped:
+                # Row, size or time limit reached — stop the statement instead of draining it
+                cursor.cancel()
+                self.query_guard.record_stop(budget)
+            truncated = budget.stopped is not None or verdict.rewritten
             
             # SAFETY: Explicitly rollback any transaction (even though we only SELECT)
             conn.rollback()
@@ -568,23 +728,34 @@ CRITICAL REMINDER BEFORE YOU GENERATE:
             cursor.close()
             conn.close()
             
-            print(f"{GREEN}✓ Query executed successfully ({len(rows)} rows) [READ-ONLY]{RESET}\n")
+            capped = f", stopped at the {budget.stopped} limit" if budget.stopped else ""
+            capped += f", rewritten to TOP {self.query_guard.rewrite_rows}" if verdict.rewritten else ""
+            print(f"{GREEN}✓ Query executed successfully ({len(rows)} rows{capped}) [READ-ONLY]{RESET}\n")
             
             return {
                 "columns": columns,
                 "rows": rows,
                 "row_count": len(rows),
+                "truncated": truncated,
+                "timed_out": budget.stopped == "time",
                 "error": None
             }
             
         except Exception as e:
+            if isinstance(e, pyodbc.OperationalError):
+                conn.invalidate()  # query timeout or broken link — don't hand this connection out again
+            
             # SAFETY: Rollback on error
             try:
                 conn.rollback()
             except:
                 pass
             
-            cursor.close()
+            try:
+                if cursor is not None:
+                    cursor.close()
+            except pyodbc.Error:
+                pass
             conn.close()
             
             print(f"{RED}✗ Query execution error: {str(e)}{RESET}\n")
@@ -596,6 +767,229 @@ CRITICAL REMINDER BEFORE YOU GENERATE:
                 "error": str(e)
             }
     
+    async def execute_sql_async(self, sql: str) -> dict:
+        """
+        Non-blocking variant of execute_sql.
+        
+        pyodbc has no async API, so the blocking connect/execute/fetch runs in
+        a worker thread and the caller's event loop keeps serving other requests.
+        """
+        return await asyncio.to_thread(self.execute_sql, sql)
+
+    async def execute_sql_stream_async(self, sql: str, batch_size: int = None,
+                                       max_rows: int = None, timeout: float = None):
+        """
+        Execute SQL and yield rows in batches while the database is still producing (READ-ONLY).
+
+        Same safety measures as execute_sql (including prepare_sql and the plan-cost
+        check). Rows are fetched with fetchmany in a
+        worker thread, so at most one batch is in flight per query. The row cap, the
+        size cap and the timeout cancel the statement on the server rather than draining it,
+        as does cancelling the consumer (e.g. the SSE client disconnected).
+
+        Args:
+            sql: SQL query to execute
+            batch_size: Rows per batch (default SQL_STREAM_BATCH_SIZE)
+            max_rows: Row cap (default SQL_MAX_ROWS)
+            timeout: Wall-clock budget for execute + all fetches (default SQL_QUERY_TIMEOUT_SECONDS)
+
+        Yields:
+            {"type": "columns", "columns": [...]}  — once, after the statement starts returning
+            {"type": "rows", "rows": [...]}  — up to batch_size rows each
+            {"type": "end", "row_count": n, "truncated": bool, "timed_out": bool, "error": str|None}
+        """
+        batch_size = batch_size or self.stream_batch_size
+        max_rows = max_rows or self.max_rows
+        timeout = timeout or self.query_timeout
+
+        sql, error = self.prepare_sql(sql, max_rows)
+        if error:
+            yield {"type": "end", "row_count": 0, "truncated": False, "timed_out": False, "error": error}
+            return
+
+        key = self.result_cache.key(sql, max_rows)
+        cached = self.result_cache.get(key, reload=lambda: self._execute_uncached(sql))
+        if cached is not None:
+            print(f"{GREEN}⚡ SQL result cache hit ({cached['cached']}, {cached['row_count']} rows){RESET}\n")
+            for event in self._replay(cached, batch_size):
+                yield event
+            return
+
+        counted = self.facet_cube.execute(sql, max_rows)
+        if counted is not None:
+            for event in self._replay(counted, batch_size):
+                yield event
+            return
+
+        version = self.result_cache.version
+        if self.replica.ready:
+            local = await asyncio.to_thread(self.replica.execute, sql, self.query_guard.budget(max_rows, timeout))
+            if local is not None:
+                if not local["timed_out"]:
+                    self.result_cache.put(key, local["columns"], local["rows"], local["truncated"], version=version)
+                for event in self._replay(local, batch_size):
+                    yield event
+                return
+
+        deadline = asyncio.get_running_loop().time() + timeout if timeout else None
+
+        print(f"{BLUE}📊 Executing SQL query (READ-ONLY mode, streaming {batch_size}-row batches)...{RESET}\n")
+
+        conn = await self._acquire()
+        cursor = None
+        row_count = 0
+        truncated = False
+        timed_out = False
+        error = None
+        worker = []  # blocking cursor call in flight, if any
+        fetched = [] if self.result_cache.enabled else None  # kept for the result cache
+        budget = self.query_guard.budget(max_rows)  # size cap; rows and time are checked below
+
+        try:
+            cursor = conn.cursor()
+            verdict = await self._run_until_deadline(cursor, deadline, self.query_guard.check, conn, sql, worker=worker)
+            if verdict.reconnect:
+                await asyncio.to_thread(self._close_quietly, conn, cursor)
+                cursor = None
+                conn = await self._acquire()
+                cursor = conn.cursor()
+            if verdict.sql is None:
+                raise RuntimeError(verdict.error)
+            truncated = verdict.rewritten
+            await self._run_until_deadline(cursor, deadline, cursor.execute, verdict.sql, worker=worker)
+            columns = [column[0] for column in cursor.description]
+            yield {"type": "columns", "columns": columns}
+
+            while row_count < max_rows:
+                batch = await self._run_until_deadline(
+                    cursor, deadline, cursor.fetchmany, min(batch_size, max_rows - row_count), worker=worker
+                )
+                if not batch:
+                    break
+                batch = budget.take(batch)
+                row_count += len(batch)
+                if fetched is not None:
+                    fetched.extend(batch)
+                if batch:
+                    yield {"type": "rows", "rows": batch}
+                if budget.stopped:
+                    # Size cap reached — stop the server from producing rows nobody will read
+                    truncated = True
+                    cursor.cancel()
+                    self.query_guard.record_stop(budget)
+                    break
+            else:
+                # Cap reached — stop the server from producing rows nobody will read
+                if await self._run_until_deadline(cursor, deadline, cursor.fetchone, worker=worker) is not None:
+                    truncated = True
+                    cursor.cancel()
+                    budget.stopped = "rows"
+                    self.query_guard.record_stop(budget)
+
+        except asyncio.TimeoutError:
+            timed_out = True
+            conn.invalidate()  # statement interrupted mid-flight — don't hand this connection out again
+            if row_count == 0:
+                error = f"Query timed out after {timeout}s"
+        except (asyncio.CancelledError, GeneratorExit):
+            # Consumer went away — stop the statement on the server instead of draining it
+            print(f"{YELLOW}⚠ Query cancelled after {row_count} rows (client disconnected or speculation discarded){RESET}\n")
+            if cursor is not None:
+                cursor.cancel()
+            conn.invalidate()
+            raise
+        except Exception as e:
+            if isinstance(e, pyodbc.OperationalError):
+                conn.invalidate()  # query timeout or broken link — don't hand this connection out again
+            error = str(e)
+        finally:
+            # SAFETY: rollback and release the connection off the event loop once the
+            # worker thread has unwound. Shielded: a cancelled request must still release it
+            await asyncio.shield(self._release(conn, cursor, worker))
+
+        if error:
+            print(f"{RED}✗ Query execution error: {error}{RESET}\n")
+        else:
+            notes = (", capped" if truncated else "") + (", timed out" if timed_out else "")
+            print(f"{GREEN}✓ Query streamed successfully ({row_count} rows{notes}) [READ-ONLY]{RESET}\n")
+            if fetched is not None and not timed_out:
+                self.result_cache.put(key, columns, fetched, truncated, version=version)
+
+        yield {"type": "end", "row_count": row_count, "truncated": truncated or timed_out,
+               "timed_out": timed_out, "error": error}
+
+    @staticmethod
+    def _replay(result: dict, batch_size: int):
+        """Stream events for a result that is already complete (result cache hit, facet cube, local replica)."""
+        yield {"type": "columns", "columns": result["columns"]}
+        for start in range(0, result["row_count"], batch_size):
+            yield {"type": "rows", "rows": result["rows"][start:start + batch_size]}
+        yield {"type": "end", "row_count": result["row_count"], "truncated": result["truncated"],
+               "timed_out": False, "error": None, "cached": result.get("cached")}
+
+    @staticmethod
+    async def _run_until_deadline(cursor, deadline, fn, *args, worker=None):
+        """
+        Run a blocking cursor call in a thread; past the deadline cancel the statement and raise TimeoutError.
+
+        The thread's future is left in worker so the caller can wait for it to unwind
+        before closing the connection when the await itself is cancelled.
+        """
+        future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        if worker is not None:
+            worker[:] = [future]
+        remaining = None if deadline is None else max(0.0, deadline - asyncio.get_running_loop().time())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), remaining)
+        except asyncio.TimeoutError:
+            cursor.cancel()
+            # Let the worker thread unwind before the connection is closed under it
+            try:
+                await future
+            except Exception:
+                pass
+            raise
+
+    async def _acquire(self):
+        """
+        Check a connection out of the pool off the event loop. Shielded: if the caller
+        is cancelled while the pool is still waiting, the connection the worker thread
+        eventually gets goes straight back instead of leaking.
+        """
+        checkout = asyncio.ensure_future(asyncio.to_thread(self.db_pool.acquire))
+        try:
+            return await asyncio.shield(checkout)
+        except asyncio.CancelledError:
+            checkout.add_done_callback(self._return_unclaimed)
+            raise
+
+    @staticmethod
+    def _return_unclaimed(checkout):
+        if not checkout.cancelled() and checkout.exception() is None:
+            asyncio.get_running_loop().run_in_executor(None, checkout.result().close)
+
+    async def _release(self, conn, cursor, worker):
+        """Return the connection to the pool after any in-flight cursor call has returned."""
+        for future in worker:
+            try:
+                await future
+            except BaseException:
+                pass
+        await asyncio.to_thread(self._close_quietly, conn, cursor)
+
+    @staticmethod
+    def _close_quietly(conn, cursor):
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        try:
+            if cursor is not None:
+                cursor.close()
+        except Exception:
+            pass
+        conn.close()
+
     def format_results(self, result: dict, max_width: int = 30):
         """
         Format and display query results.
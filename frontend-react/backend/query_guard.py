@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Pre-flight cost check and fetch budget for generated SQL.
+
+A statement that passed validation and got its TOP can still be expensive: a
+self-join the model made up, COUNT(DISTINCT ...) over a cross join, a LIKE
+'%...%' on every description. QueryGuard keeps one such query from holding a
+pooled connection and the shared read replica:
+
+- check() asks the database for the estimated plan without running the
+  statement and compares its cost with SQL_MAX_PLAN_COST. Over the threshold,
+  SQL_COST_GUARD=log only reports it and runs the statement; "reject" refuses
+  the statement; "rewrite" first re-plans it with TOP SQL_COST_GUARD_ROWS and
+  runs that when it is under the threshold (the result is then marked
+  truncated); "off" (the default) skips the check, which otherwise costs
+  SHOWPLAN round trips on every statement the caches don't answer. The default threshold was
+  set on the SQLite stand-in: run benchmark_query_guard.py --live and watch
+  "over_threshold" in /api/stats/runtime before switching to reject or rewrite.
+- budget() bounds a fetch by rows, approximate bytes (SQL_MAX_RESULT_MB) and
+  wall-clock time, so the caller stops fetching and cancels the statement as
+  soon as one limit is reached instead of draining the cursor.
+
+Plans come from the estimator the guard was built with:
+- showplan_estimate (SQL Server): SET SHOWPLAN_XML ON, then the statement's
+  StatementSubTreeCost / StatementEstRows; the statement is compiled, not run.
+  Costs are optimizer units, the "Estimated Subtree Cost" SSMS shows. If
+  SHOWPLAN cannot be switched off again the connection is invalidated, since
+  that session would return plans instead of rows; in log mode the verdict
+  asks the caller to run the statement on a fresh connection (reconnect),
+  otherwise the statement is refused.
+- sqlite_estimate (stand-in for benchmark_query_guard.py): EXPLAIN QUERY PLAN
+  of the statement as local_replica.translate() writes it for SQLite (outside
+  that subset the estimate fails and the statement runs), costed from the rows
+  each nested loop reads plus a quarter of n log n for each temp b-tree (sort,
+  DISTINCT, GROUP BY, automatic index), per 10,000 rows: a full read of the
+  view is about 0.5, a grouped count about 3.
+
+An estimate that fails lets the statement run; after MAX_ESTIMATE_ERRORS
+failures in a row (e.g. the login lacks SHOWPLAN permission) the check is
+switched off until restart, so it does not cost a round trip on every query.
+
+Environment:
+    SQL_COST_GUARD        - off | log | reject | rewrite (default off)
+    SQL_MAX_PLAN_COST     - estimated cost above which the guard acts (default 10)
+    SQL_COST_GUARD_ROWS   - TOP tried by rewrite (default 500)
+    SQL_MAX_RESULT_MB     - approximate result size at which fetching stops (default 32)
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from sql_tokens import limit_rows, tokenize
+
+MODE = os.getenv("SQL_COST_GUARD", "off").lower()
+MAX_COST = float(os.getenv("SQL_MAX_PLAN_COST", "10"))
+REWRITE_ROWS = int(os.getenv("SQL_COST_GUARD_ROWS", "500"))
+MAX_RESULT_BYTES = int(float(os.getenv("SQL_MAX_RESULT_MB", "32")) * 1024 * 1024)
+MAX_ESTIMATE_ERRORS = 3
+
+
+class PlanEstimate(NamedTuple):
+    cost: float
+    rows: float
+
+
+class Verdict(NamedTuple):
+    sql: Optional[str]  # statement to run, None when refused
+    error: Optional[str]
+    estimate: Optional[PlanEstimate]
+    rewritten: bool = False
+    reconnect: bool = False  # conn was discarded — run sql on a fresh connection
+
+
+class ShowplanStuck(RuntimeError):
+    """SET SHOWPLAN_XML OFF failed: the session still returns plans instead of rows."""
+
+
+_SHOWPLAN_COST_RE = re.compile(r'StatementSubTreeCost="([^"]+)"')
+_SHOWPLAN_ROWS_RE = re.compile(r'StatementEstRows="([^"]+)"')
+
+
+def showplan_estimate(cursor, sql: str) -> PlanEstimate:
+    """Estimated plan of sql on SQL Server (compiled, not executed)."""
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        cursor.execute(sql)
+        plan = "".join(str(row[0]) for row in cursor.fetchall())
+    finally:
+        try:
+            cursor.execute("SET SHOWPLAN_XML OFF")
+        except Exception as e:
+            raise ShowplanStuck(f"could not switch SHOWPLAN_XML off: {e}") from e
+    costs = [float(value) for value in _SHOWPLAN_COST_RE.findall(plan)]
+    if not costs:
+        raise ValueError("showplan has no StatementSubTreeCost")
+    rows = [float(value) for value in _SHOWPLAN_ROWS_RE.findall(plan)]
+    return PlanEstimate(max(costs), max(rows, default=0.0))
+
+
+_SQLITE_LOOP_RE = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(\S+)")
+
+
+def sqlite_estimate(cursor, sql: str) -> PlanEstimate:
+    """Estimated plan of sql on SQLite (EXPLAIN QUERY PLAN), in the units described in the module docstring."""
+    from local_replica import translate  # local_replica imports this module (FetchBudget)
+    local_sql = translate(sql)
+    if local_sql is None:
+        raise ValueError("statement is outside the SQLite subset")
+    plan = cursor.execute("EXPLAIN QUERY PLAN " + local_sql).fetchall()
+    largest = _sqlite_largest_table(cursor)
+    loops: Dict[int, float] = {}  # parent id -> rows read by its nested loops so far
+    cost = rows = 0.0
+    for _, parent, _, detail in plan:
+        match = _SQLITE_LOOP_RE.match(detail)
+        if match:
+            table_rows = _sqlite_rows(cursor, match.group(2), largest)
+            if match.group(1) == "SCAN":
+                per_loop = table_rows
+            elif "AUTOMATIC" in detail:
+                # Index built for this query; without statistics assume a tenth of the table matches each lookup
+                cost += _sort_cost(table_rows)
+                per_loop = max(1.0, table_rows / 10)
+            else:
+                per_loop = math.log2(table_rows + 1) + 1
+            loops[parent] = loops.get(parent, 1.0) * per_loop
+            cost += loops[parent]
+            if parent == 0:
+                rows = loops[parent]
+        elif detail.startswith("USE TEMP B-TREE"):
+            cost += _sort_cost(loops.get(parent, 1.0))
+    return PlanEstimate(cost / 10000, rows)
+
+
+def _sort_cost(rows: float) -> float:
+    return rows * math.log2(rows + 1) / 4
+
+
+def _sqlite_rows(cursor, name: str, largest: int) -> int:
+    # Aliases and CTE names are not tables: cost them as the largest table
+    try:
+        return cursor.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+    except Exception:
+        return largest
+
+
+def _sqlite_largest_table(cursor) -> int:
+    largest = 0
+    for _, schema, _ in cursor.execute("PRAGMA database_list").fetchall():
+        for (table,) in cursor.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'").fetchall():
+            largest = max(largest, cursor.execute(f'SELECT COUNT(*) FROM {schema}."{table}"').fetchone()[0])
+    return largest
+
+
+def row_bytes(row: Sequence[Any]) -> int:
+    """Approximate size of a fetched row: string lengths plus 8 bytes per other value."""
+    return sum(len(value) if isinstance(value, str) else 8 for value in row)
+
+
+class FetchBudget:
+    """
+    Rows, approximate bytes and time left for one fetch.
+
+    take() accepts rows up to max_rows + 1 (the extra row only tells that the
+    result is truncated) and sets stopped to "rows", "bytes" or "time" when a
+    limit is reached; the caller then cancels the statement.
+    """
+
+    def __init__(self, max_rows: int, max_bytes: int = 0, timeout: float = 0):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.rows = 0
+        self.bytes = 0
+        self.stopped: Optional[str] = None
+
+    def next_size(self, batch_size: int) -> int:
+        """Rows to ask for next (one over the cap at most)."""
+        return min(batch_size, self.max_rows + 1 - self.rows)
+
+    def take(self, batch: List[Any]) -> List[Any]:
+        """Account for a fetched batch; returns the rows within the budget."""
+        kept = batch[:self.max_rows - self.rows]
+        if len(kept) < len(batch):
+            self.stopped = "rows"
+        if self.max_bytes:
+            for index, row in enumerate(kept):
+                self.bytes += row_bytes(row)
+                if self.bytes > self.max_bytes:
+                    kept = kept[:index]
+                    self.stopped = "bytes"
+                    break
+        self.rows += len(kept)
+        if self.stopped is None and self.deadline is not None and time.monotonic() > self.deadline:
+            self.stopped = "time"
+        return kept
+
+
+class QueryGuard:
+    """Plan-cost check before execution and fetch budgets during it (see module docstring)."""
+
+    def __init__(self, estimator: Callable[[Any, str], PlanEstimate] = showplan_estimate,
+                 mode: str = MODE, max_cost: float = MAX_COST, rewrite_rows: int = REWRITE_ROWS,
+                 max_bytes: int = MAX_RESULT_BYTES):
+        self.estimator = estimator
+        self.mode = mode if mode in ("off", "log", "reject", "rewrite") else "off"
+        self.max_cost = max_cost
+        self.rewrite_rows = rewrite_rows
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._errors_in_a_row = 0
+        self._metrics = {
+            "checked": 0,
+            "over_threshold": 0,
+            "rejected": 0,
+            "rewritten": 0,
+            "estimate_errors": 0,
+            "estimate_ms_total": 0.0,
+            "max_cost_seen": 0.0,
+            "stopped_rows": 0,
+            "stopped_bytes": 0,
+            "stopped_time": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def estimate(self, conn, sql: str) -> PlanEstimate:
+        """Estimated plan of sql on conn (raises on failure)."""
+        cursor = conn.cursor()
+        try:
+            return self.estimator(cursor, sql)
+        finally:
+            cursor.close()
+
+    def check(self, conn, sql: str) -> Verdict:
+        """
+        Decide whether sql may run on conn.
+
+        Returns:
+            Verdict with the statement to run (sql, or its rewrite) or, when the
+            plan is over the threshold, sql=None and an error message; with
+            reconnect=True the statement must run on a fresh connection
+        """
+        if not self.enabled:
+            return Verdict(sql, None, None)
+        start = time.perf_counter()
+        try:
+            estimate = self.estimate(conn, sql)
+        except ShowplanStuck as e:
+            conn.invalidate()  # don't hand a session in SHOWPLAN mode out again
+            with self._lock:
+                self._metrics["estimate_errors"] += 1
+            if self.mode == "log":
+                print(f"⚠️  Plan estimate failed and the connection was discarded, running on a fresh one: {e}")
+                return Verdict(sql, None, None, reconnect=True)
+            print(f"⚠️  Plan estimate failed and the connection was discarded: {e}")
+            return Verdict(None, "Could not check the query plan; please try again", None)
+        except Exception as e:
+            with self._lock:
+                self._metrics["estimate_errors"] += 1
+                self._errors_in_a_row += 1
+                give_up = self._errors_in_a_row >= MAX_ESTIMATE_ERRORS
+                if give_up:
+                    self.mode = "off"
+            print(f"⚠️  Plan estimate failed, running without cost check: {e}")
+            if give_up:
+                print(f"⚠️  Cost guard switched off after {MAX_ESTIMATE_ERRORS} failed estimates")
+            return Verdict(sql, None, None)
+        verdict = Verdict(sql, None, estimate)
+        if estimate.cost > self.max_cost:
+            verdict = self._over_budget(conn, sql, estimate)
+        with self._lock:
+            self._errors_in_a_row = 0
+            self._metrics["checked"] += 1
+            self._metrics["estimate_ms_total"] += (time.perf_counter() - start) * 1000
+            self._metrics["max_cost_seen"] = max(self._metrics["max_cost_seen"], estimate.cost)
+            if estimate.cost > self.max_cost:
+                self._metrics["over_threshold"] += 1
+            if verdict.rewritten:
+                self._metrics["rewritten"] += 1
+            elif verdict.sql is None:
+                self._metrics["rejected"] += 1
+        return verdict
+
+    def _over_budget(self, conn, sql: str, estimate: PlanEstimate) -> Verdict:
+        if self.mode == "log":
+            print(f"📝 Estimated cost {estimate.cost:.2f} > {self.max_cost:g} "
+                  f"(~{estimate.rows:,.0f} rows): running anyway (SQL_COST_GUARD=log)")
+            return Verdict(sql, None, estimate)
+        if self.mode == "rewrite":
+            rewrite = limit_rows(sql, self.rewrite_rows)
+            if rewrite != sql:
+                try:
+                    smaller = self.estimate(conn, rewrite)
+                except Exception:
+                    smaller = None
+                if smaller is not None and smaller.cost <= self.max_cost:
+                    print(f"⚠️  Estimated cost {estimate.cost:.2f} > {self.max_cost:g}: "
+                          f"running with TOP {self.rewrite_rows} (cost {smaller.cost:.2f})")
+                    return Verdict(rewrite, None, smaller, rewritten=True)
+        print(f"🛑 Estimated cost {estimate.cost:.2f} > {self.max_cost:g} "
+              f"(~{estimate.rows:,.0f} rows): query refused")
+        return Verdict(None, f"Query too expensive (estimated cost {estimate.cost:.1f}, "
+                             f"limit {self.max_cost:g}); try a narrower question", estimate)
+
+    def budget(self, max_rows: int, timeout: float = 0) -> FetchBudget:
+        return FetchBudget(max_rows, self.max_bytes, timeout)
+
+    def record_stop(self, budget: FetchBudget):
+        """Count a fetch that hit one of its limits."""
+        if budget.stopped:
+            with self._lock:
+                self._metrics[f"stopped_{budget.stopped}"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        checked = metrics["checked"]
+        total_ms = metrics.pop("estimate_ms_total")
+        metrics["avg_estimate_ms"] = round(total_ms / checked, 2) if checked else 0.0
+        metrics["max_cost_seen"] = round(metrics["max_cost_seen"], 3)
+        return {"mode": self.mode, "max_cost": self.max_cost, "max_result_mb": round(self.max_bytes / 1048576, 1),
+                **metrics}
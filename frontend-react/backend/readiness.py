@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Deferred pipeline construction, startup prewarm and readiness probes.
+
+Importing main.py used to build MultiAgentPipeline at import time, pulling in
+openai and pyodbc before uvicorn could even bind the port. LazyPipeline defers
+that work to a background warm-up task started by the startup event:
+
+1. import    - multi_agent_pipeline and its heavy dependencies (in a thread)
+2. construct - MultiAgentPipeline() (in a thread)
+3. openai    - one cheap request to open the async client's HTTP/TLS pool
+4. database  - one pooled connection + SELECT 1 (driver load, TLS, login)
+5. db_pool   - the rest of the connection pool's DB_POOL_MIN_SIZE connections
+6. templates - the template router's partner / geo vocabulary, read from the view
+7. replica   - the local SQLite replica's first snapshot (SQL_LOCAL_REPLICA=true only)
+8. facets    - the facet cube's first load (FACET_CUBE_ENABLED=true only)
+
+Requests that arrive before construction finishes wait for it (not for the
+prewarm). /api/ready reports
+ready only once the pipeline exists and the probes named in
+READINESS_DEPENDENCIES pass. Probe results are cached for
+READINESS_PROBE_TTL_SECONDS, so a busy probe schedule costs one SELECT 1 (on a
+pooled connection) and one model-list call per TTL.
+"""
+
+import asyncio
+import importlib
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+PROBE_TTL = float(os.getenv("READINESS_PROBE_TTL_SECONDS", "30"))
+PROBE_TIMEOUT = float(os.getenv("READINESS_PROBE_TIMEOUT_SECONDS", "5"))
+REQUIRED = [name.strip() for name in os.getenv("READINESS_DEPENDENCIES", "openai,database").split(",") if name.strip()]
+
+
+class LazyPipeline:
+    """Owns the process's MultiAgentPipeline: built and warmed after startup, probed on demand."""
+
+    def __init__(self, module: str = "multi_agent_pipeline", cls: str = "MultiAgentPipeline"):
+        self._module = module
+        self._cls = cls
+        self.pipeline: Optional[Any] = None  # set once construction succeeds
+        self._build: Optional[asyncio.Task] = None   # import + construct
+        self._warmup: Optional[asyncio.Task] = None  # build + dependency prewarm
+        self._probe_lock: Optional[asyncio.Lock] = None
+        self.phases: Dict[str, float] = {}  # warm-up phase -> seconds
+        self.error: Optional[str] = None
+        self.ready_at: Optional[str] = None
+        self._probes: Dict[str, Dict[str, Any]] = {}  # name -> {"ok", "checked", "latency_ms", "error"}
+
+    # ------------------------------------------------------------------
+    # Construction and warm-up
+    # ------------------------------------------------------------------
+
+    def start(self) -> asyncio.Task:
+        """Start warm-up on the running loop; returns its task (idempotent, restarts after a failure)."""
+        if self._warmup is None or (self._warmup.done() and self.pipeline is None):
+            self._build = asyncio.create_task(self._construct())
+            self._warmup = asyncio.create_task(self._warm())
+        return self._warmup
+
+    async def get(self):
+        """The pipeline, waiting for construction (not the dependency prewarm) if still running."""
+        if self.pipeline is not None:
+            return self.pipeline
+        self.start()
+        await asyncio.shield(self._build)
+        if self.pipeline is None:
+            raise RuntimeError(f"Pipeline failed to start: {self.error}")
+        return self.pipeline
+
+    async def _construct(self):
+        try:
+            module = await self._phase("import", asyncio.to_thread(importlib.import_module, self._module))
+            self.pipeline = await self._phase("construct", asyncio.to_thread(getattr(module, self._cls)))
+            self.error = None
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ Pipeline warm-up failed: {e}")
+
+    async def _warm(self):
+        start = time.perf_counter()
+        await self._build
+        if self.pipeline is None:
+            return
+        # Dependency prewarm failures are reported by readiness, never fatal
+        await self._phase("openai", self._probe("openai", self._probe_openai))
+        if await self._phase("database", self._probe("database", self._probe_database)):
+            await self._phase("db_pool", self._prewarm_pool())
+            await self._phase("templates", asyncio.to_thread(self.pipeline.sql_executor.template_router.load))
+            if self.pipeline.sql_executor.replica.enabled:
+                await self._phase("replica", asyncio.to_thread(self.pipeline.sql_executor.replica.snapshot))
+            if self.pipeline.sql_executor.facet_cube.enabled:
+                await self._phase("facets", asyncio.to_thread(self.pipeline.sql_executor.facet_cube.load))
+        self.phases["total"] = time.perf_counter() - start
+        self.ready_at = datetime.now().isoformat(timespec="seconds")
+        summary = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items() if name != "total")
+        print(f"🚀 Pipeline warm in {self.phases['total']:.2f}s ({summary})")
+
+    async def _phase(self, name: str, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    # ------------------------------------------------------------------
+    # Probes
+    # ------------------------------------------------------------------
+
+    async def _probe_openai(self):
+        # Cheapest authenticated call; also leaves a warm connection in the pool
+        await self.pipeline.async_llm_client.models.list()
+
+    async def _probe_database(self):
+        def select_one():
+            conn = self.pipeline.sql_executor.db_pool.acquire()
+            try:
+                conn.cursor().execute("SELECT 1").fetchone()
+            finally:
+                conn.close()
+        await asyncio.to_thread(select_one)
+
+    async def _prewarm_pool(self):
+        try:
+            await asyncio.to_thread(self.pipeline.sql_executor.db_pool.prewarm)
+        except Exception as e:
+            print(f"⚠️  Connection pool prewarm failed: {e}")
+
+    async def _probe(self, name: str, check) -> bool:
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), PROBE_TIMEOUT)
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+            print(f"⚠️  Readiness probe '{name}' failed: {error}")
+        self._probes[name] = {
+            "ok": ok,
+            "checked": time.monotonic(),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "error": error,
+        }
+        return ok
+
+    async def check(self) -> Dict[str, Any]:
+        """Readiness report, re-running probes older than PROBE_TTL (one probe round at a time)."""
+        if self.pipeline is not None:
+            if self._probe_lock is None:
+                self._probe_lock = asyncio.Lock()
+            async with self._probe_lock:
+                now = time.monotonic()
+                for name, check in (("openai", self._probe_openai), ("database", self._probe_database)):
+                    last = self._probes.get(name)
+                    if last is None or now - last["checked"] > PROBE_TTL:
+                        await self._probe(name, check)
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        """Last known state without probing (cheap enough for liveness checks)."""
+        now = time.monotonic()
+        dependencies = {
+            name: {
+                "ok": probe["ok"],
+                "latency_ms": probe["latency_ms"],
+                "age_seconds": round(now - probe["checked"], 1),
+                **({"error": probe["error"]} if probe["error"] else {}),
+            }
+            for name, probe in self._probes.items()
+        }
+        if self.pipeline is None:
+            state = "failed" if self.error else "starting"
+        else:
+            state = "warming" if self.ready_at is None else "warm"
+        return {
+            "ready": state == "warm" and all(self._probes.get(name, {}).get("ok") for name in REQUIRED),
+            "state": state,
+            "dependencies": dependencies,
+            "warmup_seconds": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "ready_at": self.ready_at,
+            **({"error": self.error} if self.error else {}),
+        }
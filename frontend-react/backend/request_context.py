@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Per-request state for the multi-agent pipeline.
+
+Agents are stateless and shared by every request in the process; anything a
+single run produces (token usage, Responses API ids, web sources, stage
+timings) lives on a RequestContext that the orchestrator creates per call and
+threads through each agent. Overlapping requests therefore never see each
+other's values, whether they run as asyncio tasks or on separate threads.
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+def usage_tokens(response) -> Optional[Dict[str, int]]:
+    """Token usage of a Responses API response in the pipeline's dict shape."""
+    if hasattr(response, 'usage') and response.usage:
+        return {
+            'prompt_tokens': response.usage.input_tokens,
+            'completion_tokens': response.usage.output_tokens,
+            'total_tokens': response.usage.total_tokens
+        }
+    return None
+
+
+class RequestContext:
+    """Mutable state owned by exactly one pipeline run."""
+
+    def __init__(self, question: str, conversation_id: Optional[str] = None):
+        self.question = question
+        self.conversation_id = conversation_id
+        self.timestamp = datetime.now().isoformat()
+        self.start_time = time.time()
+
+        # Token accounting across all agents
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+
+        # Responses API chain ids produced by this run
+        self.planner_response_id: Optional[str] = None
+        self.formatter_response_id: Optional[str] = None
+
+        # Agent 4 outputs that arrive only when the stream completes
+        self.web_sources: List[Dict[str, str]] = []
+
+        # Stage name -> seconds (queue waits as "<stage>_wait", formatter time-to-first-token
+        # as "formatter_ttft"), stage name -> total tokens, and rows returned by SQL
+        self.timings: Dict[str, float] = {}
+        self.stage_tokens: Dict[str, int] = {}
+        self.row_count: Optional[int] = None
+
+        # Semantic cache lookup for this question (semantic_cache.Lookup), kept so the
+        # SQL can be stored once it has run, or forgotten if a reused SQL failed
+        self.semantic_lookup = None
+
+        # Stage currently running (left set if the run is cancelled inside it) and
+        # narrative characters already streamed — for cancellation metrics
+        self.stage: Optional[str] = None
+        self.streamed_chars = 0
+
+    def add_usage(self, tokens: Optional[Dict[str, int]], stage: Optional[str] = None):
+        """Accumulate a usage dict (as returned by usage_tokens), attributed to stage; None is ignored."""
+        if not tokens:
+            return
+        self.prompt_tokens += tokens.get('prompt_tokens', 0)
+        self.completion_tokens += tokens.get('completion_tokens', 0)
+        self.total_tokens += tokens.get('total_tokens', 0)
+        if stage:
+            self.stage_tokens[stage] = self.stage_tokens.get(stage, 0) + tokens.get('total_tokens', 0)
+
+    def usage_stats(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens
+        }
+
+    def record(self, stage: str, seconds: float):
+        """Add seconds to a stage's timing; repeated stages (e.g. SQL retry) accumulate."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timed(self, stage: str):
+        """Record wall time of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def elapsed(self) -> float:
+        return time.time() - self.start_time
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact view for logs / done events."""
+        return {
+            "usage_stats": self.usage_stats(),
+            "timings": {k: round(v, 3) for k, v in self.timings.items()},
+            "elapsed_time": round(self.elapsed(), 2)
+        }
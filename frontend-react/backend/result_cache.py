@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Cache of SQL query results, keyed by canonical SQL.
+
+Different questions often produce the same statement, give or take formatting
+and predicate order. ResultCache keys results by sql_tokens.canonicalize(sql)
+and the row cap, so those questions share one Azure SQL round trip.
+
+- entries are compact: column names plus rows as tuples that also read by
+  column name (row_cleaning.keyed_rows), so a hit reads like a pyodbc row
+- bounded by SQL_CACHE_MAX_ENTRIES and SQL_CACHE_MAX_MB, least-recently-used
+  evicted first; a single result may use at most a tenth of the memory budget
+- fresh for SQL_CACHE_TTL_SECONDS; for SQL_CACHE_STALE_SECONDS after that an
+  entry is still served, and one background reload per key refreshes it
+  (stale-while-revalidate)
+- errors, timeouts and cancelled runs are never stored
+- set_data_version() drops everything when the view's fingerprint changes
+  (the /api/stats refresher reports it), so new data is never masked by the TTL;
+  put() takes the version read before the query ran and skips results that
+  straddle a change
+
+SQL_CACHE_TTL_SECONDS=0 disables the cache.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from row_cleaning import keyed_rows
+from sql_tokens import canonicalize
+
+TTL = float(os.getenv("SQL_CACHE_TTL_SECONDS", "600"))
+STALE = float(os.getenv("SQL_CACHE_STALE_SECONDS", "1800"))
+MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000"))
+MAX_BYTES = int(float(os.getenv("SQL_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+_CURRENT = object()  # put() without a version: store against whatever data is current
+
+
+def _result_bytes(columns: Sequence[str], rows: Sequence[tuple]) -> int:
+    """Approximate memory of a stored result (containers plus cell values)."""
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(column) for column in columns)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class _Entry:
+    __slots__ = ("columns", "rows", "truncated", "bytes", "stored_at")
+
+    def __init__(self, columns: List[str], rows: Tuple[tuple, ...], truncated: bool):
+        self.columns = columns
+        self.rows = rows
+        self.truncated = truncated
+        self.bytes = _result_bytes(columns, rows)
+        self.stored_at = time.monotonic()
+
+
+class ResultCache:
+    """LRU + TTL cache of execute_sql results with stale-while-revalidate."""
+
+    def __init__(self, ttl: float = TTL, stale: float = STALE, max_entries: int = MAX_ENTRIES,
+                 max_bytes: int = MAX_BYTES):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._version: Any = None
+        self._revalidating = set()
+        self._reloader = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sql-cache-revalidate")
+        self._lock = threading.Lock()
+        self._metrics = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "skipped_too_large": 0,
+            "evictions": 0,
+            "expired": 0,
+            "revalidations": 0,
+            "revalidation_errors": 0,
+            "invalidations": 0,   # data-version changes
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @staticmethod
+    def key(sql: str, max_rows: int) -> Hashable:
+        return (canonicalize(sql), max_rows)
+
+    @property
+    def version(self) -> Any:
+        """Current data version; read it before running a query and pass it to put()."""
+        return self._version
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def get(self, key: Hashable, reload: Optional[Callable[[], Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Cached result for key, or None on a miss.
+
+        Args:
+            key: From ResultCache.key()
+            reload: Re-executes the query (blocking); when the entry is stale it is
+                    scheduled in the background and its result replaces the entry
+
+        Returns:
+            dict with 'columns', 'rows', 'row_count', 'truncated', 'error' (None) and
+            'cached' ("fresh" or "stale")
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry.stored_at if entry else None
+            if entry is None or age > self.ttl + self.stale:
+                if entry is not None:
+                    self._drop(key)
+                    self._metrics["expired"] += 1
+                self._metrics["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            fresh = age <= self.ttl
+            self._metrics["hits" if fresh else "stale_hits"] += 1
+            revalidate = not fresh and reload is not None and key not in self._revalidating
+            if revalidate:
+                self._revalidating.add(key)
+        if revalidate:
+            self._reloader.submit(self._revalidate, key, reload)
+        return {
+            "columns": list(entry.columns),
+            "rows": list(entry.rows),
+            "row_count": len(entry.rows),
+            "truncated": entry.truncated,
+            "error": None,
+            "cached": "fresh" if fresh else "stale",
+        }
+
+    def put(self, key: Hashable, columns: Sequence[str], rows: Sequence[Any], truncated: bool = False,
+            version: Any = _CURRENT) -> bool:
+        """
+        Store a successful result; returns False if it was too large to cache, or if
+        version (read before the query ran) is no longer current — the data changed
+        and the cache was emptied meanwhile.
+        """
+        if not self.enabled:
+            return False
+        entry = _Entry(list(columns), tuple(keyed_rows(columns, rows)), truncated)
+        with self._lock:
+            if version is not _CURRENT and version != self._version:
+                return False
+            if entry.bytes > self.max_bytes // 10:
+                self._metrics["skipped_too_large"] += 1
+                return False
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += entry.bytes
+            self._metrics["stores"] += 1
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+                self._metrics["evictions"] += 1
+        return True
+
+    def _drop(self, key: Hashable):
+        # caller holds the lock
+        self._bytes -= self._entries.pop(key).bytes
+
+    def _revalidate(self, key: Hashable, reload: Callable[[], Dict[str, Any]]):
+        version = self._version
+        try:
+            result = reload()
+            if result.get("error"):
+                raise RuntimeError(result["error"])
+            if result.get("timed_out"):
+                raise RuntimeError("stopped at the time limit")  # partial rows — keep the stale entry
+            self.put(key, result["columns"], result["rows"], result.get("truncated", False), version=version)
+            with self._lock:
+                self._metrics["revalidations"] += 1
+        except Exception as e:
+            # Keep serving the stale entry until it ages out
+            with self._lock:
+                self._metrics["revalidation_errors"] += 1
+            print(f"⚠️  SQL cache revalidation failed: {e}")
+        finally:
+            with self._lock:
+                self._revalidating.discard(key)
+
+    # ------------------------------------------------------------------
+    # Invalidation and stats
+    # ------------------------------------------------------------------
+
+    def set_data_version(self, version: Any):
+        """Record the data's current fingerprint; a change empties the cache."""
+        with self._lock:
+            if version == self._version:
+                return
+            changed = self._version is not None
+            self._version = version
+            if changed:
+                self._entries.clear()
+                self._bytes = 0
+                self._metrics["invalidations"] += 1
+        if changed:
+            print("🧹 SQL result cache cleared (view data changed)")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._metrics["hits"] + self._metrics["stale_hits"] + self._metrics["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "approx_mb": round(self._bytes / (1024 * 1024), 2),
+                "max_entries": self.max_entries,
+                "max_mb": round(self.max_bytes / (1024 * 1024), 1),
+                "ttl_seconds": self.ttl,
+                "stale_seconds": self.stale,
+                **self._metrics,
+                "hit_ratio": round((self._metrics["hits"] + self._metrics["stale_hits"]) / lookups, 3) if lookups else None,
+            }
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Row cleaning for API responses.
+
+Turns pyodbc rows (or dicts) into JSON-safe dicts: NULLs become "(Not Set)",
+dates become ISO strings and HTML is stripped from description-like columns.
+
+The per-column decisions (index, converter, HTML or not) are compiled once per
+result-set shape instead of being re-derived for every cell, and HTML stripping
+is memoized — vw_ISDSolution_All repeats the same description 10-20 times per
+solution, so most strip calls become a dict lookup.
+
+Two wire shapes are produced from the same plan:
+    clean_rows()      -> [{column: value, ...}, ...]        (default)
+    clean_columnar()  -> {"columns", "rows": [[...]], "dictionaries"}
+The columnar form sends each column name once and replaces low-cardinality
+string columns (industryName, orgName, solutionAreaName, ...) with indexes
+into a per-column dictionary.
+
+keyed_rows() gives rows that did not come from pyodbc (result cache, local
+replica, facet cube) the same access by column name as pyodbc.Row, so the
+agents read them like rows fresh from Azure SQL.
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+NOT_SET = "(Not Set)"
+
+# Columns that carry HTML markup from the ISD CMS
+HTML_COLUMNS = frozenset([
+    'solutionDescription', 'industryDescription', 'SubIndustryDescription',
+    'solAreaDescription', 'orgDescription', 'areaSolutionDescription',
+    'industryThemeDesc', 'solutionPlayDesc', 'resourceLinkDescription',
+    'THEME', 'DESCRIPTION', 'DESC', 'SOLUTION_DESCRIPTION'
+])
+HTML_KEYWORDS = ('desc', 'description', 'theme')
+
+# Max distinct/rows ratio for dictionary-encoding a column in columnar output
+COLUMNAR_DICT_RATIO = float(os.getenv("COLUMNAR_DICT_RATIO", "0.5"))
+
+_TAG_RE = re.compile(r'<.*?>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=int(os.getenv("ROW_CLEANING_CACHE_SIZE", "8192")))
+def _strip_html_cached(text: str) -> str:
+    return _WHITESPACE_RE.sub(' ', _TAG_RE.sub('', text)).strip()
+
+
+def strip_html(text):
+    """Remove HTML tags from text"""
+    if text is None or text == NOT_SET:
+        return text
+    return _strip_html_cached(str(text))
+
+
+def is_html_column(col: str) -> bool:
+    col_lower = col.lower()
+    return col in HTML_COLUMNS or any(keyword in col_lower for keyword in HTML_KEYWORDS)
+
+
+def _convert_plain(value: Any) -> str:
+    if value is None:
+        return NOT_SET
+    if type(value) is str:
+        return NOT_SET if value == "NULL" else value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _convert_html(value: Any) -> str:
+    if value is None:
+        return NOT_SET
+    if type(value) is str:
+        return NOT_SET if value == "NULL" else _strip_html_cached(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    value = str(value)
+    return NOT_SET if value == "NULL" else _strip_html_cached(value)
+
+
+@lru_cache(maxsize=256)
+def compile_plan(columns: Tuple[str, ...]) -> Tuple[Tuple[int, str, Callable[[Any], str]], ...]:
+    """Per-column (index, name, converter) plan, cached per result-set shape."""
+    return tuple(
+        (idx, col, _convert_html if is_html_column(col) else _convert_plain)
+        for idx, col in enumerate(columns)
+    )
+
+
+class KeyedRow(tuple):
+    """A tuple whose values also read by column name: row.orgName, row["orgName"] (see row_type)."""
+
+    __slots__ = ()
+    _index: Dict[str, int] = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return tuple.__getitem__(self, self._index[key])
+            except KeyError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name: str):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+@lru_cache(maxsize=256)
+def row_type(columns: Tuple[str, ...]) -> type:
+    """KeyedRow subclass for one result-set shape (a repeated name reads its first column)."""
+    index: Dict[str, int] = {}
+    for idx, col in enumerate(columns):
+        index.setdefault(col, idx)
+    return type("KeyedRow", (KeyedRow,), {"__slots__": (), "_index": index})
+
+
+def keyed_rows(columns: Sequence[str], rows: Sequence[Any]) -> List[KeyedRow]:
+    """rows (tuples, pyodbc rows or KeyedRows) as KeyedRows of columns."""
+    keyed = row_type(tuple(columns))
+    return [row if type(row) is keyed else keyed(row) for row in rows]
+
+
+def clean_rows(columns: Sequence[str], rows: Optional[Sequence[Any]]) -> List[Dict[str, str]]:
+    """Convert pyodbc rows (or dict rows) to JSON-safe dicts with HTML stripping."""
+    if not rows:
+        return []
+    plan = compile_plan(tuple(columns))
+
+    if isinstance(rows[0], dict):
+        return [
+            {col: convert(row.get(col)) for _, col, convert in plan}
+            for row in rows
+        ]
+    return [
+        {col: convert(row[idx]) for idx, col, convert in plan}
+        for row in rows
+    ]
+
+
+def clean_columnar(columns: Sequence[str], rows: Optional[Sequence[Any]]) -> Dict[str, Any]:
+    """
+    Convert rows to the columnar wire format.
+
+    Returns {"columns": [...], "rows": [[...], ...], "dictionaries": {col: [...]}}.
+    A column is dictionary-encoded when its distinct values are at most
+    COLUMNAR_DICT_RATIO of the row count; its cells then hold an int index
+    into dictionaries[col]. Other cells are the same strings clean_rows() emits.
+    """
+    columns = list(columns)
+    if not rows:
+        return {"columns": columns, "rows": [], "dictionaries": {}}
+    plan = compile_plan(tuple(columns))
+
+    if isinstance(rows[0], dict):
+        values = [[convert(row.get(col)) for _, col, convert in plan] for row in rows]
+    else:
+        values = [[convert(row[idx]) for idx, _, convert in plan] for row in rows]
+
+    dictionaries: Dict[str, List[str]] = {}
+    max_distinct = int(len(values) * COLUMNAR_DICT_RATIO)
+    for idx, col, _ in plan:
+        codes: Dict[str, int] = {}
+        for row in values:
+            value = row[idx]
+            if value not in codes:
+                codes[value] = len(codes)
+                if len(codes) > max_distinct:
+                    break
+        else:
+            for row in values:
+                row[idx] = codes[row[idx]]
+            dictionaries[col] = list(codes)
+
+    return {"columns": columns, "rows": values, "dictionaries": dictionaries}
+
+
+def cache_info() -> Dict[str, int]:
+    """Hit/miss counters of the HTML strip memo (for benchmarks and /api/stats)."""
+    info = _strip_html_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Semantic question -> SQL cache in front of NL2SQL generation.
+
+Most questions are paraphrases of ones already answered ("healthcare AI
+solutions" vs "Show me AI solutions for healthcare"), yet each one costs a full
+reasoning-model call in generate_sql. SemanticCache embeds the normalized
+question and looks for the nearest question answered before. Above the
+similarity threshold, its SQL is reused and Agent 2's generation call is skipped.
+
+- only validated pairs are stored: the SQL passed validate_sql and returned rows
+- a match also needs the same numbers, negations and industries ("top 10" never
+  reuses "top 20", "without Azure" never reuses "with Azure", "fraud detection
+  for retail" never reuses "fraud detection for banking"), and the same geos,
+  partners and solution areas the template vocabulary recognizes ("in France"
+  never reuses "in Germany", "from Avanade" never reuses "from Accenture")
+- entries are scoped (APP_MODE), least-recently-used evicted past the size limit
+- a cached SQL that later fails is forgotten
+
+Embedders:
+    AzureEmbedder - the Azure OpenAI embeddings deployment in
+                    SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT (on the shared async client)
+    LocalEmbedder - offline hashed bag of words + character trigrams, no network;
+                    for tests and benchmarks, which pass it explicitly. Without
+                    a deployment the pipeline's cache is off: bag-of-words
+                    similarity is too coarse to reuse SQL in production
+
+Environment:
+    SEMANTIC_CACHE_ENABLED                  - true/false (default true)
+    SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT     - embeddings deployment (unset: cache off)
+    SEMANTIC_CACHE_EMBEDDING_DIMENSIONS     - requested embedding size (default 256)
+    SEMANTIC_CACHE_THRESHOLD                - min cosine similarity (default 0.92 azure, 0.80 local)
+    SEMANTIC_CACHE_MAX_ENTRIES              - stored question/SQL pairs (default 1000)
+
+See benchmark_semantic_cache.py for precision/recall per threshold.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_DEPLOYMENT = os.getenv("SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT", "")
+EMBEDDING_DIMENSIONS = int(os.getenv("SEMANTIC_CACHE_EMBEDDING_DIMENSIONS", "256"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+DEFAULT_THRESHOLDS = {"azure": 0.92, "local": 0.80}
+
+Vector = Dict[int, float]  # sparse, L2-normalized
+
+# Leading phrases that never change what is being asked
+_FILLER_PREFIX = re.compile(
+    r"^(?:(?:please|can you|could you|would you|i want to|i'd like to|i would like to|i need|i want|"
+    r"show me|show|give me|list|find|find me|tell me about|tell me|what are|what is|which are|which|"
+    r"are there any|are there|do you have|do we have|any)\s+)+"
+)
+_PHRASES = {
+    "artificial intelligence": "ai",
+    "machine learning": "ml",
+    "cyber security": "cybersecurity",
+    "health care": "healthcare",
+    "internet of things": "iot",
+}
+_NEGATIONS = frozenset(("not", "no", "without", "excluding", "except", "non", "never"))
+# Words naming an industry (industryName filter) -> canonical industry
+_INDUSTRY_TERMS = {
+    "defense": "defense", "defence": "defense", "military": "defense",
+    "education": "education", "student": "education", "campus": "education", "university": "education",
+    "energy": "energy", "oil": "energy", "utility": "energy", "utilities": "energy",
+    "financial": "financial", "banking": "financial", "bank": "financial", "insurance": "financial",
+    "government": "government", "public": "government", "citizen": "government", "city": "government",
+    "healthcare": "healthcare", "health": "healthcare", "hospital": "healthcare", "patient": "healthcare",
+    "clinical": "healthcare", "manufacturing": "manufacturing", "factory": "manufacturing",
+    "automotive": "manufacturing", "media": "media", "entertainment": "media", "broadcasting": "media",
+    "retail": "retail", "consumer": "retail", "telecommunications": "telecom", "telecom": "telecom",
+}
+_STOPWORDS = frozenset("""
+    a an the for of in on to with and or me my our we i you your us is are be that this these those
+    what which who how do does can could would should please show give list find get all any some
+    there about by from as at into solution solutions help helps helping
+""".split())
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cased, punctuation-free question without leading filler ("show me", "what are")."""
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = re.sub(r"[^\w\s&'-]", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = _FILLER_PREFIX.sub("", text)
+    for phrase, replacement in _PHRASES.items():
+        text = text.replace(phrase, replacement)
+    return text
+
+
+def signature(normalized: str, names: Optional[Callable[[str], FrozenSet]] = None) -> Tuple[FrozenSet, ...]:
+    """
+    Numbers, negations, industries and named values of a normalized question;
+    matches must agree on all four. names (e.g. TemplateRouter.names) finds the
+    geos, partners and solution areas; without it the fourth part is empty.
+    """
+    words = normalized.replace("-", " ").split()
+    industries = (_INDUSTRY_TERMS.get(word) or _INDUSTRY_TERMS.get(word.rstrip("s")) for word in words)
+    return (
+        frozenset(re.findall(r"\d+", normalized)),
+        frozenset(word for word in words if word in _NEGATIONS),
+        frozenset(industry for industry in industries if industry),
+        names(normalized) if names else frozenset(),
+    )
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping so "solutions"/"solution" and "improve"/"improving" meet."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(word) > len(suffix) + 3 and word.endswith(suffix) and not word.endswith("ss"):
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if len(word) > 4 and word.endswith("e") else word
+
+
+def _normalize_vector(weights: Dict[int, float]) -> Vector:
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {i: w / norm for i, w in weights.items()} if norm else {}
+
+
+def cosine(a: Vector, b: Vector) -> float:
+    """Dot product of two L2-normalized sparse vectors."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(i, 0.0) for i, w in a.items())
+
+
+class LocalEmbedder:
+    """Offline embedding: hashed content words plus their character trigrams (order-insensitive)."""
+
+    name = "local"
+
+    def __init__(self, dimensions: int = 4096):
+        self.dimensions = dimensions
+
+    def _slot(self, feature: str) -> int:
+        return zlib.crc32(feature.encode("utf-8")) % self.dimensions
+
+    def embed_sync(self, normalized: str) -> Vector:
+        weights: Dict[int, float] = {}
+        for word in normalized.replace("-", " ").split():
+            word = word.strip("'&")
+            if word in _STOPWORDS:
+                continue
+            word = _stem(word)
+            if not word or word in _STOPWORDS:
+                continue
+            slot = self._slot("w:" + word)
+            weights[slot] = weights.get(slot, 0.0) + 1.0
+            padded = f"<{word}>"
+            grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+            for gram in grams:  # spelling variants ("manufacturer" / "manufacturing") still overlap
+                slot = self._slot("g:" + gram)
+                weights[slot] = weights.get(slot, 0.0) + 0.5 / len(grams)
+        return _normalize_vector(weights)
+
+    async def embed(self, normalized: str) -> Tuple[Vector, Optional[Dict[str, int]]]:
+        return self.embed_sync(normalized), None
+
+
+class AzureEmbedder:
+    """Azure OpenAI embeddings deployment (one short request per question)."""
+
+    def __init__(self, async_client, deployment: str, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.client = async_client
+        self.deployment = deployment
+        self.dimensions = dimensions
+        self.name = f"azure:{deployment}"
+
+    async def embed(self, normalized: str) -> Tuple[Vector, Optional[Dict[str, int]]]:
+        response = await self.client.embeddings.create(
+            model=self.deployment, input=normalized, dimensions=self.dimensions
+        )
+        vector = _normalize_vector(dict(enumerate(response.data[0].embedding)))
+        usage = getattr(response, "usage", None)
+        tokens = {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": 0,
+            "total_tokens": usage.total_tokens,
+        } if usage else None
+        return vector, tokens
+
+
+class _Entry:
+    __slots__ = ("question", "normalized", "signature", "vector", "sql_result", "hits", "created")
+
+    def __init__(self, question: str, normalized: str, signature: Tuple[FrozenSet, ...], vector: Vector,
+                 sql_result: Dict[str, Any]):
+        self.question = question
+        self.normalized = normalized
+        self.signature = signature
+        self.vector = vector
+        self.sql_result = sql_result
+        self.hits = 0
+        self.created = time.time()
+
+
+class Lookup:
+    """Outcome of one lookup; pass it back to add() or forget()."""
+
+    def __init__(self, question: str, normalized: str, scope: Any, vector: Vector, seconds: float,
+                 tokens: Optional[Dict[str, int]] = None):
+        self.question = question
+        self.normalized = normalized
+        self.scope = scope
+        self.vector = vector
+        self.seconds = seconds
+        self.tokens = tokens
+        self.entry: Optional[_Entry] = None
+        self.similarity = 0.0
+
+    @property
+    def hit(self) -> bool:
+        return self.entry is not None
+
+    def sql_result(self) -> Dict[str, Any]:
+        """The cached generate_sql result, annotated with where it came from."""
+        return {
+            **self.entry.sql_result,
+            "semantic_cache": {"similarity": round(self.similarity, 3), "matched_question": self.entry.question},
+        }
+
+
+def default_embedder(async_client=None):
+    """AzureEmbedder when SEMANTIC_CACHE_EMBEDDING_DEPLOYMENT and a client are available, else None (cache off)."""
+    if EMBEDDING_DEPLOYMENT and async_client is not None:
+        return AzureEmbedder(async_client, EMBEDDING_DEPLOYMENT)
+    return None
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of validated question -> SQL pairs."""
+
+    def __init__(self, embedder=None, threshold: Optional[float] = None, max_entries: int = MAX_ENTRIES,
+                 enabled: bool = ENABLED, names: Optional[Callable[[str], FrozenSet]] = None):
+        """
+        Args:
+            embedder: AzureEmbedder, or LocalEmbedder in tests and benchmarks; None turns the cache off
+            names: Geos / partners / solution areas in a question, for signature() (e.g. TemplateRouter.names)
+        """
+        self.embedder = embedder
+        self.names = names
+        kind = "local" if isinstance(embedder, LocalEmbedder) else "azure"
+        self.threshold = threshold if threshold is not None else float(
+            os.getenv("SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLDS[kind]))
+        self.max_entries = max_entries
+        self.enabled = enabled and embedder is not None
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # id -> entry, least recently used first
+        self._scopes: Dict[Any, Dict[int, _Entry]] = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "rejected_by_signature": 0,  # similar enough, but numbers/negations/industries/names differ
+            "stores": 0,
+            "duplicates": 0,
+            "forgotten": 0,
+            "evictions": 0,
+            "embedding_errors": 0,
+            "lookup_seconds": 0.0,
+        }
+
+    async def lookup(self, question: str, scope: Any = None) -> Optional[Lookup]:
+        """
+        Embed question and find the most similar stored question in scope.
+
+        Returns:
+            Lookup (check .hit), or None when disabled or the embedding failed
+        """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        normalized = normalize_question(question)
+        try:
+            vector, tokens = await self.embedder.embed(normalized)
+        except Exception as e:
+            with self._lock:
+                self._metrics["embedding_errors"] += 1
+            print(f"⚠️  Semantic cache embedding failed: {e}")
+            return None
+        result = Lookup(question, normalized, scope, vector, 0.0, tokens)
+        best, best_similarity, rejected = self._nearest(result)
+        result.seconds = time.perf_counter() - start
+        with self._lock:
+            self._metrics["lookups"] += 1
+            self._metrics["lookup_seconds"] += result.seconds
+            self._metrics["rejected_by_signature"] += rejected
+            if best is not None and id(best) in self._entries:  # not evicted meanwhile
+                best.hits += 1
+                self._entries.move_to_end(id(best))
+                self._metrics["hits"] += 1
+                result.entry, result.similarity = best, best_similarity
+            else:
+                self._metrics["misses"] += 1
+                result.similarity = best_similarity
+        return result
+
+    def _nearest(self, probe: Lookup) -> Tuple[Optional[_Entry], float, int]:
+        """Best entry at or above the threshold with a matching signature."""
+        with self._lock:
+            candidates = list(self._scopes.get(probe.scope, {}).values())
+        probe_signature = signature(probe.normalized, self.names)
+        best, best_similarity, rejected = None, 0.0, 0
+        for entry in candidates:
+            similarity = cosine(probe.vector, entry.vector)
+            if similarity < self.threshold or similarity <= best_similarity:
+                continue
+            if entry.signature != probe_signature:
+                rejected = 1
+                continue
+            best, best_similarity = entry, similarity
+        return best, best_similarity, rejected
+
+    def add(self, probe: Optional[Lookup], sql_result: Dict[str, Any]) -> bool:
+        """Remember probe's question with its validated, successfully executed SQL."""
+        if probe is None or probe.hit or not sql_result.get("sql"):
+            return False
+        with self._lock:
+            if probe.similarity >= 0.99:
+                self._metrics["duplicates"] += 1
+                return False
+            entry = _Entry(probe.question, probe.normalized, signature(probe.normalized, self.names), probe.vector, {
+                key: sql_result.get(key) for key in ("sql", "explanation", "confidence")
+            })
+            self._entries[id(entry)] = entry
+            self._scopes.setdefault(probe.scope, {})[id(entry)] = entry
+            self._metrics["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._remove_from_scope(evicted)
+                self._metrics["evictions"] += 1
+        return True
+
+    def forget(self, probe: Optional[Lookup]):
+        """Drop the entry a lookup matched (its SQL failed or returned nothing)."""
+        if probe is None or not probe.hit:
+            return
+        entry = probe.entry
+        with self._lock:
+            if self._entries.pop(id(entry), None) is not None:
+                self._remove_from_scope(entry)
+                self._metrics["forgotten"] += 1
+        # The probe becomes a miss, so the regenerated SQL can be stored in its place
+        probe.entry, probe.similarity = None, 0.0
+        print(f"🧹 Semantic cache forgot \"{entry.question}\" (cached SQL failed)")
+
+    def _remove_from_scope(self, entry: _Entry):
+        # caller holds the lock
+        for scoped in self._scopes.values():
+            scoped.pop(id(entry), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            entries = len(self._entries)
+        lookups, lookup_seconds = metrics["lookups"], metrics.pop("lookup_seconds")
+        return {
+            "enabled": self.enabled,
+            "embedder": self.embedder.name if self.embedder else None,
+            "threshold": self.threshold,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            **metrics,
+            "hit_ratio": round(metrics["hits"] / lookups, 3) if lookups else None,
+            "avg_lookup_ms": round(lookup_seconds / lookups * 1000, 2) if lookups else None,
+        }
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+JSON serialization and negotiated compression for API responses.
+
+dumps() is the single serializer used by the JSON endpoints (FastJSONResponse)
+and the SSE stream (sse_event). It uses orjson when installed — native
+datetime/UUID handling, bytes output, several times faster than the stdlib on
+large row payloads — and falls back to json.dumps(default=str) otherwise.
+JSON_SERIALIZER=json forces the stdlib path.
+
+CompressionMiddleware picks br or gzip from Accept-Encoding for JSON and
+text/event-stream responses. Complete bodies below COMPRESSION_MIN_BYTES are
+sent as-is. Streams are compressed as one continuous stream, flushed after
+every chunk: the big metadata event shrinks like a normal JSON response, and
+small delta events still reach the browser immediately.
+"""
+
+import hashlib
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+SERIALIZER = os.getenv("JSON_SERIALIZER", "orjson" if orjson is not None else "json")
+if SERIALIZER == "orjson" and orjson is None:
+    print("⚠️  JSON_SERIALIZER=orjson but orjson is not installed — using stdlib json")
+    SERIALIZER = "json"
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/event-stream")
+
+
+def _default(value: Any) -> str:
+    return str(value)
+
+
+if SERIALIZER == "orjson":
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Serialize to UTF-8 JSON bytes (orjson)."""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(obj: Any) -> bytes:
+        """Serialize to UTF-8 JSON bytes (stdlib)."""
+        return json.dumps(obj, default=_default, ensure_ascii=False).encode("utf-8")
+
+
+def sse_event(event: Dict[str, Any]) -> bytes:
+    """Frame one event as a Server-Sent Events data line."""
+    return b"data: " + dumps(event) + b"\n\n"
+
+
+class CachedJSON:
+    """
+    A payload serialized once, with a validator for conditional GETs.
+
+    The ETag is weak because CompressionMiddleware may re-encode the body;
+    the JSON it describes is identical either way.
+    """
+
+    def __init__(self, content: Any):
+        self.content = content
+        self.body = dumps(content)
+        self.etag = 'W/"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """True if an If-None-Match header already names this version."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        opaque = self.etag[2:]
+        return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+try:
+    from fastapi.responses import JSONResponse
+
+    class FastJSONResponse(JSONResponse):
+        """JSONResponse rendered with dumps() (set as the app's default_response_class)."""
+
+        def render(self, content: Any) -> bytes:
+            return dumps(content)
+except ImportError:  # benchmarks import this module without FastAPI installed
+    FastJSONResponse = None
+
+
+# ---------------------------------------------------------------------------
+# Compression
+# ---------------------------------------------------------------------------
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce, in preference order."""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header (honours q=0 and *)."""
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """One-shot compression of a complete body."""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return zlib.compress(data, GZIP_LEVEL, wbits=31)
+
+
+class StreamCompressor:
+    """Incremental compressor whose output is decodable after every chunk."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+_stats: Dict[str, Any] = {
+    "responses": 0,
+    "compressed": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "cpu_seconds": 0.0,
+    "by_encoding": {},
+}
+
+
+def compression_stats() -> Dict[str, Any]:
+    """Bytes before/after compression and CPU spent compressing (for /api/stats/runtime)."""
+    stats = dict(_stats)
+    stats["by_encoding"] = dict(_stats["by_encoding"])
+    stats["ratio"] = round(_stats["bytes_out"] / _stats["bytes_in"], 3) if _stats["bytes_in"] else None
+    stats["cpu_seconds"] = round(_stats["cpu_seconds"], 4)
+    stats["serializer"] = SERIALIZER
+    stats["encodings"] = available_encodings()
+    return stats
+
+
+def _record(encoding: str, bytes_in: int, bytes_out: int, cpu: float):
+    _stats["bytes_in"] += bytes_in
+    _stats["bytes_out"] += bytes_out
+    _stats["cpu_seconds"] += cpu
+    _stats["by_encoding"][encoding] = _stats["by_encoding"].get(encoding, 0) + 1
+
+
+def _get_header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware: Accept-Encoding negotiated br/gzip for JSON and SSE responses."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = _get_header(scope.get("headers", []), b"accept-encoding")
+        encoding = negotiate_encoding(accept.decode("latin-1") if accept else None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, _CompressingSender(send, encoding, self.minimum_size).send)
+
+
+class _CompressingSender:
+    """Wraps the ASGI send callable for a single response."""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self._start = None
+        self._active: Optional[bool] = None  # None until the first body chunk decides
+        self._stream: Optional[StreamCompressor] = None
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._cpu = 0.0
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self._start = message
+            _stats["responses"] += 1
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._active is None:
+            self._active = self._should_compress(body, more_body)
+            if not self._active:
+                await self._send(self._start)
+                await self._send(message)
+                return
+            if not more_body:
+                await self._send_complete(body)
+                return
+            self._stream = StreamCompressor(self.encoding)
+            await self._send(self._with_encoding_headers(self._start, length=None))
+        elif not self._active:
+            await self._send(message)
+            return
+
+        cpu_start = time.process_time()
+        chunk = self._stream.compress(body) if body else b""
+        if not more_body:
+            chunk += self._stream.finish()
+        self._cpu += time.process_time() - cpu_start
+        self._bytes_in += len(body)
+        self._bytes_out += len(chunk)
+
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            _stats["compressed"] += 1
+            _record(self.encoding, self._bytes_in, self._bytes_out, self._cpu)
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = self._start.get("headers", [])
+        if _get_header(headers, b"content-encoding") is not None:
+            return False
+        content_type = (_get_header(headers, b"content-type") or b"").split(b";")[0].strip()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return False
+        # Streams are always compressed; complete bodies only when worth it
+        return more_body or len(body) >= self.minimum_size
+
+    async def _send_complete(self, body: bytes):
+        cpu_start = time.process_time()
+        compressed = compress(body, self.encoding)
+        cpu = time.process_time() - cpu_start
+        await self._send(self._with_encoding_headers(self._start, length=len(compressed)))
+        await self._send({"type": "http.response.body", "body": compressed})
+        _stats["compressed"] += 1
+        _record(self.encoding, len(body), len(compressed), cpu)
+
+    def _with_encoding_headers(self, start, length: Optional[int]):
+        headers = [
+            (key, value) for key, value in start.get("headers", [])
+            if key.lower() not in (b"content-length", b"vary")
+        ]
+        vary = _get_header(start.get("headers", []), b"vary")
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode("latin-1")))
+        return {**start, "headers": headers}
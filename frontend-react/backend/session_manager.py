@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Per-conversation session storage for the multi-agent pipeline.
+
+Each conversation_id owns its own history, Responses API chain ids and the
+cached raw results of its latest query, so concurrent users never see each
+other's context. The store is bounded by conversation count and approximate
+memory, evicting least-recently-used sessions first and sweeping sessions that
+have been idle longer than the TTL.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+class ConversationSession:
+    """State for a single conversation (history, response-chain ids, cached results)."""
+
+    def __init__(self, conversation_id: Optional[str]):
+        self.conversation_id = conversation_id
+        self.history: List[Dict[str, Any]] = []
+        self.planner_response_id: Optional[str] = None
+        self.formatter_response_id: Optional[str] = None
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.approx_bytes = 0
+
+    @property
+    def is_ephemeral(self) -> bool:
+        """Sessions without a conversation_id are never stored."""
+        return self.conversation_id is None
+
+    def transcript(self) -> List[Dict[str, Any]]:
+        """User-facing view of the history (no cached rows)."""
+        return [
+            {
+                "question": exchange.get("question"),
+                "narrative": exchange.get("narrative"),
+                "timestamp": exchange.get("timestamp"),
+            }
+            for exchange in self.history
+        ]
+
+
+def _estimate_bytes(value: Any, _depth: int = 0) -> int:
+    """Cheap recursive size estimate — good enough for a memory ceiling, not exact."""
+    if _depth > 4:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            _estimate_bytes(k, _depth + 1) + _estimate_bytes(v, _depth + 1) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_estimate_bytes(v, _depth + 1) for v in value)
+    # pyodbc.Row behaves like a sequence but is not a tuple subclass
+    if hasattr(value, "cursor_description"):
+        return sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SessionManager:
+    """
+    Thread-safe LRU + idle-TTL store of ConversationSession objects.
+
+    Limits (env overridable):
+        SESSION_MAX_CONVERSATIONS  - max stored conversations (default 5000)
+        SESSION_MAX_MEMORY_MB      - approximate memory ceiling (default 256)
+        SESSION_IDLE_TTL_SECONDS   - idle time before a session expires (default 3600)
+        SESSION_MAX_HISTORY        - exchanges kept per conversation (default 10)
+    """
+
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        max_memory_mb: Optional[float] = None,
+        idle_ttl_seconds: Optional[float] = None,
+        max_history: Optional[int] = None,
+    ):
+        self.max_sessions = max_sessions or int(os.getenv("SESSION_MAX_CONVERSATIONS", "5000"))
+        memory_mb = max_memory_mb or float(os.getenv("SESSION_MAX_MEMORY_MB", "256"))
+        self.max_bytes = int(memory_mb * 1024 * 1024)
+        self.idle_ttl = idle_ttl_seconds or float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600"))
+        self.max_history = max_history or int(os.getenv("SESSION_MAX_HISTORY", "10"))
+
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = {
+            "hits": 0,
+            "created": 0,
+            "evicted_lru": 0,
+            "evicted_ttl": 0,
+            "evicted_memory": 0,
+            "evicted_bytes": 0,
+        }
+
+    def get(self, conversation_id: Optional[str]) -> ConversationSession:
+        """Return the session for conversation_id, creating it if needed (None → ephemeral)."""
+        if conversation_id is None:
+            return ConversationSession(None)
+
+        now = time.time()
+        with self._lock:
+            self._sweep_expired(now)
+            session = self._sessions.get(conversation_id)
+            if session is None:
+                session = ConversationSession(conversation_id)
+                self._sessions[conversation_id] = session
+                self._metrics["created"] += 1
+                self._enforce_limits(keep=conversation_id)
+            else:
+                self._sessions.move_to_end(conversation_id)
+                self._metrics["hits"] += 1
+            session.last_access = now
+            return session
+
+    def peek(self, conversation_id: str) -> Optional[ConversationSession]:
+        """Look up a session without creating it or refreshing its LRU position."""
+        with self._lock:
+            self._sweep_expired(time.time())
+            return self._sessions.get(conversation_id)
+
+    def record_exchange(self, session: ConversationSession, exchange: Dict[str, Any]):
+        """
+        Append an exchange to the session history and re-apply memory limits.
+
+        Only the newest exchange keeps its raw_results (the planner and the
+        "analyze previous results" path never look further back), so a long
+        conversation costs one result set rather than ten.
+        """
+        with self._lock:
+            for previous in session.history:
+                previous.pop("raw_results", None)
+            session.history.append(exchange)
+            if len(session.history) > self.max_history:
+                session.history = session.history[-self.max_history:]
+            session.last_access = time.time()
+
+            if session.is_ephemeral or self._sessions.get(session.conversation_id) is not session:
+                return
+
+            new_size = _estimate_bytes(session.history)
+            self._total_bytes += new_size - session.approx_bytes
+            session.approx_bytes = new_size
+            self._sessions.move_to_end(session.conversation_id)
+            self._enforce_limits(keep=session.conversation_id)
+
+    def clear(self, conversation_id: str) -> bool:
+        """Drop a conversation explicitly (e.g. user cleared the chat)."""
+        with self._lock:
+            session = self._sessions.pop(conversation_id, None)
+            if session is None:
+                return False
+            self._total_bytes -= session.approx_bytes
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of occupancy and eviction counters."""
+        with self._lock:
+            self._sweep_expired(time.time())
+            return {
+                "active_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "approx_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_seconds": self.idle_ttl,
+                **self._metrics,
+            }
+
+    def _evict(self, conversation_id: str, reason: str):
+        session = self._sessions.pop(conversation_id)
+        self._total_bytes -= session.approx_bytes
+        self._metrics[f"evicted_{reason}"] += 1
+        self._metrics["evicted_bytes"] += session.approx_bytes
+
+    def _sweep_expired(self, now: float):
+        """Drop idle sessions; the OrderedDict is in access order so we stop at the first fresh one."""
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_access <= self.idle_ttl:
+                break
+            self._evict(oldest_id, "ttl")
+
+    def _enforce_limits(self, keep: Optional[str] = None):
+        """Evict least-recently-used sessions until count and memory are within bounds."""
+        while len(self._sessions) > self.max_sessions:
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep:
+                break
+            self._evict(oldest_id, "lru")
+        while self._total_bytes > self.max_bytes and len(self._sessions) > 1:
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep:
+                break
+            self._evict(oldest_id, "memory")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Single-flight coalescing of identical in-flight work.
+
+When many users ask the same thing at the same moment (a demo, a Teams
+broadcast, everyone clicking the same /api/examples question), only the first
+request starts a pipeline run; the others subscribe to it. For streaming work
+every subscriber replays the run's events from the beginning, so late joiners
+still see the results table, and then follow live. The run is cancelled if
+every subscriber goes away before it finishes.
+
+Nothing is cached: a flight is forgotten as soon as it completes, so the next
+identical request starts a fresh run.
+"""
+
+import asyncio
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class Flight:
+    """One in-progress execution and everything it has produced so far."""
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.state: Dict[str, Any] = {}  # scratch space for the owner (e.g. the run's session)
+        self.events: List[Any] = []
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _run(self, work):
+        """Drive an awaitable (result) or async iterator (events) to completion."""
+        try:
+            if hasattr(work, "__aiter__"):
+                async for event in work:
+                    self.events.append(event)
+                    self._notify()
+            else:
+                self.result = await work
+        except Exception as e:
+            # Surfaced to subscribers by wait()/replay(); not re-raised so the
+            # task never logs "exception was never retrieved"
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def wait(self) -> Any:
+        """Result of an awaitable flight."""
+        await asyncio.shield(self.task)
+        if self.error:
+            raise self.error
+        return self.result
+
+    async def replay(self):
+        """All events of a streaming flight from the first one, then live until it completes.
+
+        Events are shared between subscribers — consumers must not mutate them.
+        """
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                break
+            await self._changed.wait()
+        if self.error:
+            raise self.error
+
+
+class SingleFlight:
+    """Registry of in-flight work keyed by request identity, with coalescing counters."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            "executions": 0,   # runs actually started
+            "coalesced": 0,    # requests served by joining a run already in flight
+            "abandoned": 0,    # runs cancelled because every subscriber left
+            "max_fanout": 0,   # most subscribers seen on a single run
+        }
+
+    def acquire(self, key: Hashable, factory: Callable[[Flight], Any]) -> Flight:
+        """
+        Join the flight for key, starting it with factory(flight) if none is running.
+
+        factory must return an awaitable or an async iterator. Every acquire must be
+        paired with release(). Flights are per event loop, so the key is scoped to
+        the running loop.
+        """
+        scoped_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            flight = self._flights.get(scoped_key)
+            if flight is None or flight.done:
+                flight = Flight(scoped_key)
+                self._flights[scoped_key] = flight
+                flight.task = asyncio.ensure_future(flight._run(factory(flight)))
+                flight.task.add_done_callback(lambda _task, f=flight: self._forget(f))
+                self._metrics["executions"] += 1
+            else:
+                self._metrics["coalesced"] += 1
+            flight.subscribers += 1
+            self._metrics["max_fanout"] = max(self._metrics["max_fanout"], flight.subscribers)
+            return flight
+
+    def is_running(self, key: Hashable) -> bool:
+        """True if acquire(key, ...) would join an existing flight on this event loop."""
+        scoped_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            flight = self._flights.get(scoped_key)
+            return flight is not None and not flight.done
+
+    def release(self, flight: Flight):
+        """Leave a flight; the last subscriber to leave an unfinished flight cancels it."""
+        with self._lock:
+            flight.subscribers -= 1
+            abandon = flight.subscribers == 0 and not flight.done
+            if abandon:
+                self._metrics["abandoned"] += 1
+        if abandon:
+            self._forget(flight)
+            flight.task.cancel()
+
+    def _forget(self, flight: Flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._flights), **self._metrics}
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+T-SQL tokenizer, read-only validator, row limit and canonical form.
+
+tokenize() splits a statement into tokens in one regex pass, keeping string
+literals, [bracketed] / "quoted" identifiers and comments intact, so nothing
+inside a literal is ever mistaken for a keyword.
+
+validate() classifies a statement in one pass over its tokens and accepts only
+a single SELECT (optionally behind WITH common table expressions). It rejects
+writes (including SELECT ... INTO), DDL, permissions, EXEC and bare procedure
+calls ("sp_who"), external data sources (OPENROWSET, ...), transaction and
+batch control (BEGIN, COMMIT, DECLARE, SET, USE, WAITFOR), variables, #temp
+tables, multiple statements and unterminated literals or comments. "WHERE
+solutionName LIKE '%update%'" or a column named [Delete Flag] is fine.
+
+limit_rows() bounds the result on the server: it adds TOP n to the outermost
+SELECT when there is none and lowers a larger TOP to n.
+
+canonicalize() turns SQL that differs only in formatting into one string, used
+as the result cache key:
+- comments and a trailing semicolon dropped, whitespace collapsed
+- keywords upper-cased (identifiers and literals are left exactly as written)
+- the AND-ed predicates of each WHERE / HAVING clause sorted, when the clause
+  has no top-level OR (BETWEEN ... AND ... and CASE ... END stay whole)
+
+So "select top 50 * from v where b=2 and a='x'" and
+"SELECT TOP 50 *\\nFROM v\\nWHERE a = 'x' AND b = 2" share one cache entry.
+"""
+
+import re
+from typing import List, NamedTuple, Optional
+
+KEYWORDS = frozenset("""
+    ADD ALL ALTER AND ANY AS ASC BETWEEN BY CASE CAST COLLATE CONVERT CROSS CURRENT_DATE
+    CURRENT_TIMESTAMP DATEADD DATEDIFF DELETE DESC DISTINCT DROP ELSE END ESCAPE EXCEPT EXEC
+    EXECUTE EXISTS FETCH FIRST FOR FROM FULL GETDATE GROUP HAVING IN INNER INSERT INTERSECT
+    INTO IS ISNULL JOIN LEFT LIKE MERGE NEXT NOT NULL OFFSET ON ONLY OPTION OR ORDER OUTER
+    OVER PARTITION PERCENT RIGHT ROW ROWS SELECT SET SOME THEN TIES TOP TRUNCATE UNION UPDATE
+    VALUES WHEN WHERE WITH
+    AVG COUNT COUNT_BIG COALESCE MAX MIN SUM LOWER UPPER LTRIM RTRIM TRIM LEN STRING_AGG
+""".split())
+
+# Keywords that end a WHERE / HAVING clause at the same parenthesis depth
+CLAUSE_END = frozenset(("GROUP", "HAVING", "ORDER", "UNION", "EXCEPT", "INTERSECT", "OPTION", "FOR", "WINDOW"))
+
+
+class Token(NamedTuple):
+    kind: str  # word, string, ident, number, param, op, comment, space
+    text: str
+
+
+# Alternatives ordered by frequency in generated SQL (words, spaces, operators, strings)
+_TOKEN_RE = re.compile(r"""
+      (?P<space>\s+)
+    | (?P<word>(?![Nn]')[^\W\d]\w*|\#\#?\w+)
+    | (?P<op><=|>=|<>|!=|!<|!>|\|\||::|[+*%=<>(),.;~&|^!:]|-(?!-)|/(?!\*))
+    | (?P<string>[Nn]?'[^']*(?:''[^']*)*(?:'|\Z))
+    | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    | (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<ident>\[[^\]]*(?:\]\][^\]]*)*(?:\]|\Z)|"[^"]*(?:""[^"]*)*(?:"|\Z))
+    | (?P<param>@@?\w+)
+    | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+def tokenize(sql: str) -> List[Token]:
+    """All tokens of sql, including whitespace and comments (single pass)."""
+    return [Token(match.lastgroup if match.lastgroup != "other" else "op", match.group())
+            for match in _TOKEN_RE.finditer(sql)]
+
+
+# Keywords that make a statement more than a read-only query -> statement class
+BLOCKED = {
+    "INSERT": "write", "UPDATE": "write", "DELETE": "write", "MERGE": "write",
+    "INTO": "write",  # SELECT ... INTO creates a table
+    "CREATE": "ddl", "ALTER": "ddl", "DROP": "ddl", "TRUNCATE": "ddl", "RENAME": "ddl",
+    "GRANT": "permission", "REVOKE": "permission", "DENY": "permission",
+    "EXEC": "exec", "EXECUTE": "exec", "OPENROWSET": "exec", "OPENQUERY": "exec",
+    "OPENDATASOURCE": "exec", "OPENXML": "exec",
+    "BEGIN": "transaction", "COMMIT": "transaction", "ROLLBACK": "transaction", "SAVE": "transaction",
+    "DECLARE": "batch", "SET": "batch", "USE": "batch", "GO": "batch", "WAITFOR": "batch",
+    "SHUTDOWN": "batch", "KILL": "batch", "DBCC": "batch", "BACKUP": "batch", "RESTORE": "batch",
+    "BULK": "batch", "RECONFIGURE": "batch",
+}
+
+
+class Validation(NamedTuple):
+    ok: bool
+    kind: str  # select, with | write, ddl, permission, exec, transaction, batch, multiple, invalid, empty
+    reason: Optional[str] = None
+
+
+def _unterminated(kind: str, text: str) -> bool:
+    if kind == "string":
+        body = text[1:] if text[0] in "Nn" else text
+        return len(body) < 2 or body.count("'") % 2 == 1
+    if kind == "ident":
+        closing = "]" if text[0] == "[" else '"'
+        return len(text) < 2 or not text.endswith(closing) or text[1:].count(closing) % 2 == 0
+    return kind == "comment" and text.startswith("/*") and (len(text) < 4 or not text.endswith("*/"))
+
+
+def validate(sql: str) -> Validation:
+    """Classify sql and check it is one read-only SELECT (see module docstring); single pass."""
+    first = None
+    has_select = False
+    ended = False  # a top-level ";" was seen
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        text = match.group()
+        if kind == "word":
+            if ended:
+                return Validation(False, "multiple", "more than one statement")
+            word = text.upper()
+            if first is None:
+                first = word
+            if word in BLOCKED:
+                return Validation(False, BLOCKED[word], f"{word} is not allowed in a read-only query")
+            if word[0] == "#":
+                return Validation(False, "batch", f"temporary table {text} is not allowed")
+            has_select = has_select or word == "SELECT"
+            continue
+        if kind in ("string", "ident", "comment"):
+            if _unterminated(kind, text):
+                return Validation(False, "invalid", f"unterminated {kind}")
+            if kind == "comment":
+                continue
+        if ended:
+            return Validation(False, "multiple", "more than one statement")
+        if text == ";":
+            ended = True
+        elif kind == "param":
+            return Validation(False, "batch", f"variables are not allowed ({text})")
+        elif first is None:
+            return Validation(False, "invalid", f"statement starts with {text!r}")
+    if first is None:
+        return Validation(False, "empty", "no statement")
+    if first not in ("SELECT", "WITH"):
+        kind = "exec" if first.startswith(("SP_", "XP_")) else "invalid"
+        return Validation(False, kind, f"only SELECT queries are allowed (got {first})")
+    if not has_select:
+        return Validation(False, "invalid", "WITH without a SELECT")
+    return Validation(True, first.lower())
+
+
+def limit_rows(sql: str, limit: int) -> str:
+    """
+    sql with its outermost SELECT returning at most limit rows.
+
+    Adds TOP limit after SELECT [DISTINCT | ALL] when there is no TOP, and lowers
+    a numeric TOP above limit. Left unchanged: TOP ... PERCENT or a computed TOP,
+    OFFSET / FETCH paging, and UNION / EXCEPT / INTERSECT (a TOP would bound only
+    the first branch) — execution still caps the rows it fetches.
+    """
+    tokens = tokenize(sql)
+    significant = [i for i, token in enumerate(tokens) if token.kind not in ("space", "comment")]
+    depth = 0
+    select = None  # index in significant of the outermost SELECT
+    for position, i in enumerate(significant):
+        token = tokens[i]
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        elif depth == 0 and token.kind == "word":
+            word = token.text.upper()
+            if word == "SELECT" and select is None:
+                select = position
+            elif word in ("UNION", "EXCEPT", "INTERSECT", "OFFSET"):
+                return sql
+    if select is None:
+        return sql
+
+    position = select + 1
+    if position < len(significant) and _word(tokens[significant[position]]) in ("DISTINCT", "ALL"):
+        position += 1
+    if position >= len(significant):
+        return sql
+    at = significant[position]
+    if _word(tokens[at]) != "TOP":
+        tokens.insert(at, Token("word", f"TOP {limit} "))
+        return "".join(token.text for token in tokens)
+
+    # Existing TOP n / TOP (n), possibly followed by PERCENT
+    def text(i):
+        return tokens[i].text if i is not None else ""
+
+    following = significant[position + 1:position + 5] + [None] * 4
+    if text(following[0]) == "(":
+        if text(following[2]) != ")":
+            return sql
+        number_at, after_at = following[1], following[3]
+    else:
+        number_at, after_at = following[0], following[1]
+    number = text(number_at)
+    if not number.isdigit() or text(after_at).upper() == "PERCENT" or int(number) <= limit:
+        return sql
+    tokens[number_at] = Token("number", str(limit))
+    return "".join(token.text for token in tokens)
+
+
+def _word(token: Token) -> str:
+    return token.text.upper() if token.kind == "word" else ""
+
+
+def _sort_predicates(tokens: List[Token]) -> List[Token]:
+    """Sort top-level AND-ed predicates of every WHERE/HAVING clause (innermost/last first)."""
+    tokens = list(tokens)
+    starts = [i for i, token in enumerate(tokens) if _word(token) in ("WHERE", "HAVING")]
+    for start in reversed(starts):
+        depth = 0
+        end = len(tokens)
+        cuts = []  # indexes of top-level AND tokens
+        has_or = False
+        pending_between = 0
+        case_depth = 0  # AND inside CASE ... END belongs to the CASE
+        for i in range(start + 1, len(tokens)):
+            token = tokens[i]
+            word = _word(token)
+            if token.text == "(":
+                depth += 1
+            elif token.text == ")":
+                depth -= 1
+                if depth < 0:
+                    end = i
+                    break
+            elif depth == 0:
+                if word in CLAUSE_END or token.text == ";":
+                    end = i
+                    break
+                if word == "CASE":
+                    case_depth += 1
+                elif word == "END" and case_depth:
+                    case_depth -= 1
+                elif case_depth:
+                    continue
+                elif word == "BETWEEN":
+                    pending_between += 1
+                elif word == "AND":
+                    if pending_between:
+                        pending_between -= 1
+                    else:
+                        cuts.append(i)
+                elif word == "OR":
+                    has_or = True
+        if has_or or not cuts:
+            continue
+        bounds = [start + 1] + [cut + 1 for cut in cuts]
+        stops = cuts + [end]
+        predicates = [tokens[lo:hi] for lo, hi in zip(bounds, stops)]
+        predicates.sort(key=lambda predicate: " ".join(token.text for token in predicate))
+        and_token = tokens[cuts[0]]
+        rebuilt = []
+        for index, predicate in enumerate(predicates):
+            if index:
+                rebuilt.append(and_token)
+            rebuilt.extend(predicate)
+        tokens[start + 1:end] = rebuilt
+    return tokens
+
+
+def canonicalize(sql: str) -> str:
+    """Formatting-independent form of sql (see module docstring)."""
+    tokens = []
+    for token in tokenize(sql):
+        if token.kind in ("space", "comment"):
+            continue
+        if token.kind == "word" and token.text.upper() in KEYWORDS:
+            token = Token("word", token.text.upper())
+        tokens.append(token)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    return " ".join(token.text for token in _sort_predicates(tokens))
@@ -0,0 +1,189 @@
+"""
+Declarative stage graph: runs a pipeline's stages as soon as their inputs exist.
+
+A StageGraph is a set of named stages, each listing the stages it depends on
+(`after`). A run starts every stage whose dependencies have finished, so
+independent stages overlap instead of waiting on each other in script order.
+Each stage may have a timeout and a fallback: when it raises or runs out of
+time the fallback's value stands in for its result and dependants carry on.
+A stage that fails without a fallback cancels the rest of the run and the
+error propagates to the caller.
+
+Stages share one `state` dict: the caller seeds it with the run's inputs and
+each stage's result is stored under the stage's name. Stages also get an
+`emit` callback for progress events. run() ignores those events; stream()
+yields them while the graph runs, so one definition drives both the blocking
+and the streaming endpoint. Closing the stream (client disconnect) cancels
+every stage still running.
+
+Stage callables are coroutine functions taking (state, emit); with
+thread=True a plain function taking (state) runs on a worker thread, for
+CPU-bound work that would otherwise stall the event loop. Fallbacks take
+(state, emit, exc) and may be plain or coroutine functions.
+"""
+
+import asyncio
+import inspect
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class Stage:
+    """One node of a StageGraph."""
+
+    def __init__(self, name: str, run: Callable, after: Iterable[str] = (), timeout: Optional[float] = None,
+                 fallback: Optional[Callable] = None, thread: bool = False):
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.fallback = fallback
+        self.thread = thread
+
+    async def _call(self, state: Dict[str, Any], emit: Callable):
+        if self.thread:
+            return await asyncio.to_thread(self.run, state)
+        return await self.run(state, emit)
+
+
+class StageGraph:
+    """
+    Executes a fixed set of stages concurrently in dependency order.
+
+    The graph is validated once (unknown dependencies and cycles raise
+    ValueError) and is stateless between runs apart from its counters, so one
+    instance serves overlapping requests.
+    """
+
+    def __init__(self, name: str, stages: List[Stage]):
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError(f"{name}: duplicate stage names")
+        for stage in stages:
+            unknown = [dep for dep in stage.after if dep not in self.stages]
+            if unknown:
+                raise ValueError(f"{name}: stage '{stage.name}' depends on unknown stage(s) {unknown}")
+        self.order = self._topological_order()
+
+        self.runs = 0
+        self.failed = 0
+        self.fallbacks = Counter()  # (stage, "timeout" | "error") -> count
+        self._overlap_seconds = 0.0
+
+    def _topological_order(self) -> List[str]:
+        order, visiting, done = [], set(), set()
+
+        def visit(name, path):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"{self.name}: dependency cycle {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dep in self.stages[name].after:
+                visit(dep, path + [name])
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    async def run(self, state: Dict[str, Any], emit: Optional[Callable] = None) -> Dict[str, Any]:
+        """Run every stage; returns state with each stage's result under its name."""
+        emit = emit or (lambda event: None)
+        started = time.perf_counter()
+        busy = 0.0
+        tasks: Dict[str, asyncio.Task] = {}
+        finished = set()
+
+        async def execute(stage: Stage):
+            nonlocal busy
+            stage_start = time.perf_counter()
+            try:
+                if stage.timeout:
+                    result = await asyncio.wait_for(stage._call(state, emit), stage.timeout)
+                else:
+                    result = await stage._call(state, emit)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if stage.fallback is None:
+                    raise
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+                self.fallbacks[(stage.name, reason)] += 1
+                print(f"⚠️  Stage {self.name}.{stage.name} {'timed out' if reason == 'timeout' else f'failed ({e})'} "
+                      f"— using its fallback")
+                result = stage.fallback(state, emit, e)
+                if inspect.isawaitable(result):
+                    result = await result
+            finally:
+                busy += time.perf_counter() - stage_start
+            state[stage.name] = result
+
+        def start_ready():
+            for name in self.order:
+                if name not in tasks and all(dep in finished for dep in self.stages[name].after):
+                    tasks[name] = asyncio.create_task(execute(self.stages[name]), name=f"{self.name}.{name}")
+
+        self.runs += 1
+        try:
+            start_ready()
+            while len(finished) < len(self.stages):
+                pending = [task for name, task in tasks.items() if name not in finished]
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for name, task in tasks.items():
+                    if task in done:
+                        task.result()  # re-raises a stage failure without a fallback
+                        finished.add(name)
+                start_ready()
+        except BaseException as e:
+            if not isinstance(e, asyncio.CancelledError):
+                self.failed += 1
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        self._overlap_seconds += max(0.0, busy - (time.perf_counter() - started))
+        return state
+
+    async def stream(self, state: Dict[str, Any]):
+        """
+        Run the graph, yielding each emitted event as it happens.
+
+        The stages' final results are left in `state` once the generator is
+        exhausted; a stage failure without a fallback is raised from it.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def drive():
+            try:
+                await self.run(state, queue.put_nowait)
+            finally:
+                queue.put_nowait(done)
+
+        runner = asyncio.create_task(drive(), name=f"{self.name}.run")
+        try:
+            while True:
+                event = await queue.get()
+                if event is done:
+                    break
+                yield event
+            await runner  # surfaces the run's exception, if any
+        finally:
+            if not runner.done():
+                runner.cancel()
+                await asyncio.gather(runner, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Run / fallback counters for the runtime stats endpoint."""
+        return {
+            "stages": {name: list(self.stages[name].after) for name in self.order},
+            "runs": self.runs,
+            "failed": self.failed,
+            "fallbacks": {f"{stage}:{reason}": count for (stage, reason), count in sorted(self.fallbacks.items())},
+            "overlap_seconds": round(self._overlap_seconds, 3),
+        }
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Live database statistics for /api/stats, refreshed in the background.
+
+A background task recomputes the statistics of dbo.vw_ISDSolution_All every
+STATS_REFRESH_SECONDS and keeps the result in memory as a pre-serialized
+CachedJSON (body + ETag), so requests never touch the database and cost a
+header comparison.
+
+Refreshes are incremental: each cycle first runs a cheap fingerprint query
+(row count + aggregate checksum). The aggregate queries only run again when
+the fingerprint has changed. An unchanged view keeps the same body and ETag,
+so clients that cached it keep getting 304s. The fingerprint is also handed to
+the SQL result cache, which empties itself when the data changes, and to the
+template router, which reloads its partner / geo names. That happens after the
+refresh has given its connection back, and a failing reload is counted without
+failing the refresh.
+"""
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from serialization import CachedJSON
+
+VIEW = "dbo.vw_ISDSolution_All"
+
+FINGERPRINT_SQL = f"SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM {VIEW}"
+COLUMNS_SQL = (
+    "SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS "
+    "WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME = 'vw_ISDSolution_All'"
+)
+SUMMARY_SQL = f"""
+SELECT
+    COUNT(DISTINCT solutionName),
+    COUNT(DISTINCT CASE WHEN solutionStatus = 'Approved' THEN solutionName END),
+    COUNT(DISTINCT orgName),
+    COUNT(DISTINCT industryName),
+    COUNT(DISTINCT solutionAreaName)
+FROM {VIEW}
+"""
+BY_INDUSTRY_SQL = f"""
+SELECT industryName, COUNT(DISTINCT solutionName)
+FROM {VIEW}
+GROUP BY industryName
+ORDER BY 2 DESC
+"""
+BY_SOLUTION_AREA_SQL = f"""
+SELECT solutionAreaName, COUNT(DISTINCT solutionName)
+FROM {VIEW}
+GROUP BY solutionAreaName
+ORDER BY 2 DESC
+"""
+
+
+class StatsRefresher:
+    """Background-refreshed, ETag'd snapshot of the view's statistics."""
+
+    def __init__(self, connect: Callable[[], Any], static: Optional[Dict[str, Any]] = None,
+                 interval: Optional[float] = None, on_fingerprint: Optional[Callable[[Any], None]] = None):
+        """
+        Args:
+            connect: Returns a read-only DB connection, closed after each refresh (e.g. NL2SQLPipeline.db_pool.acquire)
+            static: Fixed sections merged into every snapshot (safety mode, model info)
+            interval: Seconds between refreshes (default STATS_REFRESH_SECONDS, 300)
+            on_fingerprint: Called with the view's fingerprint after every check
+                            (e.g. NL2SQLPipeline.set_data_version)
+        """
+        self._connect = connect
+        self._static = static or {}
+        self.interval = interval or float(os.getenv("STATS_REFRESH_SECONDS", "300"))
+        self._fingerprint = None
+        self._on_fingerprint = on_fingerprint
+        self._task: Optional[asyncio.Task] = None
+        self.snapshot = CachedJSON(self._payload({"view": VIEW, "status": "pending"}))
+        self._metrics = {
+            "refreshes": 0,
+            "unchanged": 0,
+            "errors": 0,
+            "last_error": None,
+            "reload_errors": 0,
+            "last_checked": None,
+            "last_duration_ms": None,
+        }
+
+    def _payload(self, database: Dict[str, Any]) -> Dict[str, Any]:
+        return {"database": database, **self._static}
+
+    def refresh(self) -> bool:
+        """
+        Check the view and recompute the snapshot if it changed (blocking — run in a thread).
+
+        Returns:
+            True if a new snapshot was published
+        """
+        fingerprint, changed = self._check()
+        # The connection is back in the pool: the reloads take their own
+        self._notify(fingerprint)
+        return changed
+
+    def _check(self):
+        """(fingerprint, whether a new snapshot was published), on one pooled connection."""
+        start = time.perf_counter()
+        conn = self._connect()
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute(FINGERPRINT_SQL)
+            total_rows, checksum = cursor.fetchone()
+            fingerprint = (total_rows, checksum)
+            if fingerprint == self._fingerprint:
+                self._metrics["unchanged"] += 1
+                return fingerprint, False
+
+            cursor.execute(COLUMNS_SQL)
+            total_columns = cursor.fetchone()[0]
+            cursor.execute(SUMMARY_SQL)
+            solutions, approved, partners, industries, areas = cursor.fetchone()
+            cursor.execute(BY_INDUSTRY_SQL)
+            by_industry = {(name or "(Not Set)"): count for name, count in cursor.fetchall()}
+            cursor.execute(BY_SOLUTION_AREA_SQL)
+            by_area = {(name or "(Not Set)"): count for name, count in cursor.fetchall()}
+
+            self.snapshot = CachedJSON(self._payload({
+                "view": VIEW,
+                "status": "live",
+                "total_rows": total_rows,
+                "total_columns": total_columns,
+                "solutions": solutions,
+                "approved_solutions": approved,
+                "partners": partners,
+                "industries": industries,
+                "solution_areas": areas,
+                "solutions_by_industry": by_industry,
+                "solutions_by_area": by_area,
+                "refreshed_at": datetime.now().isoformat(timespec="seconds"),
+            }))
+            self._fingerprint = fingerprint
+            self._metrics["refreshes"] += 1
+            return fingerprint, True
+        finally:
+            self._metrics["last_checked"] = datetime.now().isoformat(timespec="seconds")
+            self._metrics["last_duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            try:
+                if cursor is not None:
+                    cursor.close()
+            except Exception:
+                pass
+            conn.close()
+
+    def _notify(self, fingerprint):
+        """Hand the fingerprint to on_fingerprint; a failing reload keeps the new snapshot."""
+        if not self._on_fingerprint:
+            return
+        try:
+            self._on_fingerprint(fingerprint)
+        except Exception as e:
+            self._metrics["reload_errors"] += 1
+            print(f"⚠️  Data-version reload failed: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                changed = await asyncio.to_thread(self.refresh)
+                if changed:
+                    print(f"📈 Stats refreshed ({self._metrics['last_duration_ms']}ms)")
+            except Exception as e:
+                # Keep serving the last good snapshot
+                self._metrics["errors"] += 1
+                self._metrics["last_error"] = str(e)
+                print(f"⚠️  Stats refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the background refresher on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"interval_seconds": self.interval, "etag": self.snapshot.etag, **self._metrics}
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Deterministic question templates in front of NL2SQL generation.
+
+A large share of questions are fixed shapes over dbo.vw_ISDSolution_All:
+"how many solutions per industry", "show Adastra's solutions", "healthcare
+security solutions in Canada". TemplateRouter recognizes those without a model
+call and builds their SQL directly, in microseconds:
+
+1. the question is lower-cased and split into words
+2. known names are replaced by slots, longest phrase first: industries and
+   solution areas (built-in aliases, e.g. "healthcare", "fsi", "security"),
+   geos and partner names (loaded from the view)
+3. every remaining word must be glue ("show", "me", "solutions", "for", ...),
+   a count marker ("how many") or a dimension ("per industry", "top partners").
+   Any other word ("fraud", "not", "agentic") means the question is not a
+   template shape and generate_sql falls back to the model
+
+Shapes:
+    list             - SELECT DISTINCT TOP 50 solutions matching the slots
+    count            - COUNT(DISTINCT solutionName) matching the slots
+    count_by         - solution counts grouped by industry / area / partner / geo
+                       ("how many solutions per industry", "top 10 partners")
+
+Values come only from the vocabulary, never from the question text, and every
+generated statement is checked by NL2SQLPipeline.validate_sql. Partner
+templates are off in customer mode (no partner names are shown there). A
+generic solution-area word on its own ("AI solutions", "cloud solutions") is
+left to the model, which asks for clarification on such questions.
+
+Environment:
+    TEMPLATE_ROUTER_ENABLED     - true/false (default true)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+ENABLED = os.getenv("TEMPLATE_ROUTER_ENABLED", "true").lower() == "true"
+
+VIEW = "dbo.vw_ISDSolution_All"
+TOP_ROWS = 50
+
+# Canonical industryName -> aliases (the canonical name itself is always an alias)
+INDUSTRIES = {
+    "Defense Industrial Base": ("defense", "defence", "defense industrial base", "dib", "military"),
+    "Education": ("education", "higher education", "higher ed", "k12", "k 12", "schools", "universities"),
+    "Energy & Resources": ("energy", "energy and resources", "energy resources", "utilities", "oil and gas"),
+    "Financial Services": ("financial services", "financial", "finance", "fsi", "banking", "insurance"),
+    "Government": ("government", "public sector"),
+    "Healthcare & Life Sciences": ("healthcare", "health care", "life sciences", "healthcare and life sciences",
+                                   "hls"),
+    "Manufacturing & Mobility": ("manufacturing", "manufacturing and mobility", "mobility", "automotive"),
+    "Media & Entertainment": ("media", "media and entertainment", "entertainment"),
+    "Retail & Consumer Goods": ("retail", "retail and consumer goods", "consumer goods", "cpg"),
+    "Telecommunications": ("telecommunications", "telecom", "telco", "telecoms"),
+}
+# Canonical solutionAreaName -> aliases; "weak" aliases need another slot to route
+SOLUTION_AREAS = {
+    "AI Business Solutions": ("ai business solutions", "ai business", "business ai"),
+    "Cloud and AI Platforms": ("cloud and ai platforms", "cloud and ai platform", "cloud platforms", "cloud platform"),
+    "Security": ("security", "cybersecurity", "cyber security"),
+}
+WEAK_AREA_ALIASES = {"ai": "AI Business Solutions", "cloud": "Cloud and AI Platforms"}
+GEO_ALIASES = {"usa": "United States", "uk": "United Kingdom", "uae": "United Arab Emirates"}
+
+# Words that carry no meaning for these shapes
+GLUE = frozenset("""
+    a all an and any are available can could do does display find for from get give have i in is list me
+    of offer offered offering offerings on or our please provide provided see show solution solutions
+    tell that the there their we what which with you
+""".split())
+COUNT_WORDS = frozenset(("how", "many", "count", "number", "total"))
+RANK_WORDS = frozenset(("top", "most", "biggest", "largest", "leading"))
+DIMENSION_MARKERS = frozenset(("per", "by", "each", "across", "every"))
+DIMENSIONS = {
+    "industry": "industryName", "industries": "industryName",
+    "area": "solutionAreaName", "areas": "solutionAreaName",
+    "partner": "orgName", "partners": "orgName", "organization": "orgName", "organizations": "orgName",
+    "org": "orgName", "orgs": "orgName", "vendor": "orgName", "vendors": "orgName",
+    "region": "geoName", "regions": "geoName", "geo": "geoName", "geos": "geoName",
+    "country": "geoName", "countries": "geoName", "geography": "geoName",
+}
+# Legal-form suffixes dropped to give partners a short alias ("Adastra Corporation" -> "adastra")
+_LEGAL_SUFFIXES = frozenset(("inc", "llc", "llp", "lp", "ltd", "limited", "corp", "corporation", "co", "gmbh",
+                             "plc", "ag", "bv", "nv", "pty", "srl", "spa", "sa", "ab", "company", "group"))
+# One-word partner names that are also everyday topic words; "data solutions" must reach the model
+_COMMON_WORDS = frozenset("""
+    agile analytics apex cloud connect data digital edge global health impact insight insights
+    intelligence modern network nexus smart software summit systems technology vision
+""".split())
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+VOCABULARY_SQL = {
+    "industries": f"SELECT DISTINCT industryName FROM {VIEW} WHERE solutionStatus = 'Approved' AND industryName IS NOT NULL",
+    "areas": f"SELECT DISTINCT solutionAreaName FROM {VIEW} WHERE solutionStatus = 'Approved' AND solutionAreaName IS NOT NULL",
+    "geos": f"SELECT DISTINCT geoName FROM {VIEW} WHERE solutionStatus = 'Approved' AND geoName IS NOT NULL",
+    "partners": f"SELECT DISTINCT orgName FROM {VIEW} WHERE solutionStatus = 'Approved' AND orgName IS NOT NULL",
+}
+
+
+def words(text: str) -> Tuple[str, ...]:
+    """Lower-cased words of text; possessive 's and punctuation dropped ("&" reads as "and")."""
+    text = text.lower().replace("’", "'").replace("&", " and ")
+    text = re.sub(r"'s\b", "", text)
+    return tuple(_WORD_RE.findall(text))
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class Vocabulary:
+    """Phrase (tuple of words) -> (slot, canonical value), matched longest first."""
+
+    def __init__(self, industries: Optional[Iterable[str]] = None, areas: Optional[Iterable[str]] = None,
+                 geos: Iterable[str] = (), partners: Iterable[str] = ()):
+        """
+        Args:
+            industries / areas: Names present in the view (None: trust the built-in lists)
+            geos / partners: geoName / orgName values present in the view
+        """
+        self.phrases: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        self.weak = {words(alias): ("solutionAreaName", name) for alias, name in WEAK_AREA_ALIASES.items()}
+        known_industries = set(industries) if industries is not None else set(INDUSTRIES)
+        known_areas = set(areas) if areas is not None else set(SOLUTION_AREAS)
+        for slot, table, known in (("industryName", INDUSTRIES, known_industries),
+                                   ("solutionAreaName", SOLUTION_AREAS, known_areas)):
+            for name in known:
+                for alias in (name,) + table.get(name, ()):
+                    self.phrases.setdefault(words(alias), (slot, name))
+        geos = set(geos)
+        for name in geos:
+            self._add(words(name), "geoName", name)
+        for alias, name in GEO_ALIASES.items():
+            if name in geos:
+                self._add(words(alias), "geoName", name)
+        self.partner_count = 0
+        for name in partners:
+            phrase = words(name)
+            if self._add(phrase, "orgName", name):
+                self.partner_count += 1
+            short = phrase
+            while len(short) > 1 and short[-1] in _LEGAL_SUFFIXES:
+                short = short[:-1]
+            if short != phrase:
+                self._add(short, "orgName", name)
+        self.geo_count = len(geos)
+        self.max_len = max((len(phrase) for phrase in self.phrases), default=1)
+
+    def _add(self, phrase: Tuple[str, ...], slot: str, name: str) -> bool:
+        # Never shadow an industry/area alias, and never let a bare glue or
+        # dimension word ("solutions", "partners") become a name
+        if not phrase or phrase in self.phrases or phrase in self.weak:
+            return False
+        if len(phrase) == 1 and (phrase[0] in GLUE or phrase[0] in DIMENSIONS or phrase[0] in COUNT_WORDS
+                                 or phrase[0] in _COMMON_WORDS):
+            return False
+        self.phrases[phrase] = (slot, name)
+        return True
+
+    def tag(self, tokens: Tuple[str, ...]) -> List[Tuple[str, Any]]:
+        """Tokens with known phrases replaced by ("slot", (column, value)); other words as ("word", w)."""
+        tagged, i = [], 0
+        while i < len(tokens):
+            for size in range(min(self.max_len, len(tokens) - i), 0, -1):
+                match = self.phrases.get(tokens[i:i + size])
+                if match:
+                    tagged.append(("slot", match))
+                    i += size
+                    break
+            else:
+                weak = self.weak.get(tokens[i:i + 1])
+                tagged.append(("weak", weak) if weak else ("word", tokens[i]))
+                i += 1
+        return tagged
+
+
+class TemplateRouter:
+    """Turns template-shaped questions into SQL; None means "ask the model"."""
+
+    def __init__(self, connect: Optional[Callable[[], Any]] = None, app_mode: str = "seller",
+                 enabled: bool = ENABLED):
+        """
+        Args:
+            connect: Returns a read-only DB connection for load() (closed afterwards),
+                     e.g. NL2SQLPipeline.db_pool.acquire
+            app_mode: 'seller' or 'customer' (customer mode never routes on partners)
+        """
+        self._connect = connect
+        self.app_mode = app_mode
+        self.enabled = enabled
+        self.vocabulary = Vocabulary()
+        self.loaded_at: Optional[str] = None
+        self._version: Any = None
+        self._lock = threading.Lock()
+        self._by_template: Counter = Counter()
+        self._unmatched: Counter = Counter()  # first unknown word of each fallback
+        self._metrics = {
+            "routed": 0,
+            "fallbacks": 0,
+            "rejected_by_validation": 0,
+            "vocabulary_loads": 0,
+            "vocabulary_errors": 0,
+            "route_seconds": 0.0,
+        }
+
+    # ------------------------------------------------------------------
+    # Vocabulary
+    # ------------------------------------------------------------------
+
+    def load(self) -> bool:
+        """Read industry / area / geo / partner names from the view (blocking — run in a thread)."""
+        if self._connect is None:
+            return False
+        try:
+            conn = self._connect()
+            cursor = conn.cursor()
+            try:
+                values = {}
+                for name, sql in VOCABULARY_SQL.items():
+                    cursor.execute(sql)
+                    values[name] = [row[0] for row in cursor.fetchall() if row[0]]
+                conn.rollback()
+            finally:
+                cursor.close()
+                conn.close()
+        except Exception as e:
+            with self._lock:
+                self._metrics["vocabulary_errors"] += 1
+            print(f"⚠️  Template vocabulary load failed: {e}")
+            return False
+        vocabulary = Vocabulary(values["industries"], values["areas"], values["geos"], values["partners"])
+        with self._lock:
+            self.vocabulary = vocabulary
+            self.loaded_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+            self._metrics["vocabulary_loads"] += 1
+        print(f"📚 Template vocabulary: {vocabulary.partner_count} partners, {vocabulary.geo_count} geos")
+        return True
+
+    def set_data_version(self, version: Any):
+        """Reload the vocabulary when the view's fingerprint changes (called by the stats refresher)."""
+        with self._lock:
+            changed = version != self._version
+            # First fingerprint: only load if the startup prewarm could not
+            reload = changed and (self._version is not None or self.loaded_at is None)
+            self._version = version
+        if reload:
+            self.load()
+
+    def names(self, question: str) -> FrozenSet[Tuple[str, str]]:
+        """(column, value) of every geo, partner and solution area the vocabulary finds in question."""
+        return frozenset(value for kind, value in self.vocabulary.tag(words(question))
+                         if kind == "slot" and value[0] != "industryName")
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def route(self, question: str) -> Optional[Dict[str, Any]]:
+        """
+        SQL for a template-shaped question.
+
+        Returns:
+            generate_sql-shaped dict ('sql', 'explanation', 'confidence', plus
+            'template': shape name), or None when no template matches
+        """
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        result, unmatched = self._match(question)
+        with self._lock:
+            self._metrics["route_seconds"] += time.perf_counter() - start
+            if result:
+                self._metrics["routed"] += 1
+                self._by_template[result["template"]] += 1
+            else:
+                self._metrics["fallbacks"] += 1
+                if unmatched and (unmatched in self._unmatched or len(self._unmatched) < 1000):
+                    self._unmatched[unmatched] += 1
+        return result
+
+    def reject(self, result: Dict[str, Any]):
+        """Count a routed statement that failed validation (it is then generated by the model)."""
+        with self._lock:
+            self._metrics["routed"] -= 1
+            self._metrics["fallbacks"] += 1
+            self._metrics["rejected_by_validation"] += 1
+            self._by_template[result["template"]] -= 1
+
+    def _match(self, question: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """(result or None, first word no template accounts for)."""
+        filters: Dict[str, List[str]] = {}
+        weak: Dict[str, List[str]] = {}
+        count = rank = marker = False  # marker: a "per" / "by" / "each" is waiting for its dimension
+        group_by: Optional[str] = None
+        dimensions: List[str] = []  # dimension words without a marker ("top partners", "partner X")
+        limit: Optional[int] = None
+        for kind, value in self.vocabulary.tag(words(question)):
+            if kind != "word":
+                column, name = value
+                target = filters if kind == "slot" else weak
+                if name not in target.setdefault(column, []):
+                    target[column].append(name)
+                marker = False
+            elif value in GLUE:
+                continue  # "per solution area" keeps its marker across "solution"
+            elif value in COUNT_WORDS:
+                count = True
+            elif value in RANK_WORDS:
+                rank = True
+            elif value in DIMENSION_MARKERS:
+                marker = True
+                continue
+            elif value in DIMENSIONS:
+                if marker:
+                    if group_by not in (None, DIMENSIONS[value]):
+                        return None, value
+                    group_by = DIMENSIONS[value]
+                else:
+                    dimensions.append(DIMENSIONS[value])
+            elif value.isdigit() and limit is None:
+                limit = int(value)
+            else:
+                return None, value
+            marker = False
+
+        if group_by is None and dimensions and (count or rank):
+            if len(set(dimensions)) > 1:
+                return None, None
+            group_by = dimensions[0]
+        elif dimensions and not filters and group_by is None:
+            return None, None  # "partner solutions" names no partner
+        if weak:
+            # "AI" / "cloud" only narrow a question that already names something concrete
+            if not (filters or group_by) or "solutionAreaName" in filters:
+                return None, "ai" if "AI Business Solutions" in weak["solutionAreaName"] else "cloud"
+            filters.update(weak)
+        if self.app_mode != "seller" and ("orgName" in filters or group_by == "orgName"):
+            return None, "partner"
+        if limit is not None and not (rank and group_by):
+            return None, str(limit)
+
+        if group_by:
+            if not (count or rank):
+                return None, None  # a "breakdown by" without counts wants solution rows
+            if limit is None and group_by == "orgName":
+                limit = TOP_ROWS  # thousands of partners
+            return self._count_by(group_by, filters, min(limit, TOP_ROWS) if limit else None), None
+        if rank:
+            return None, "top"
+        if count:
+            return self._count(filters), None
+        if filters:
+            return self._list(filters), None
+        return None, None
+
+    # ------------------------------------------------------------------
+    # SQL builders
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _where(filters: Dict[str, List[str]]) -> str:
+        clauses = ["solutionStatus = 'Approved'"]
+        for column in ("industryName", "solutionAreaName", "geoName", "orgName"):
+            values = filters.get(column)
+            if not values:
+                continue
+            if len(values) == 1:
+                clauses.append(f"{column} = {_quote(values[0])}")
+            else:
+                clauses.append(f"{column} IN ({', '.join(_quote(value) for value in values)})")
+        return "\n  AND ".join(clauses)
+
+    @staticmethod
+    def _describe(filters: Dict[str, List[str]]) -> str:
+        parts = []
+        for column, label in (("orgName", "from {}"), ("industryName", "for {}"),
+                              ("solutionAreaName", "in {}"), ("geoName", "available in {}")):
+            if filters.get(column):
+                parts.append(label.format(" / ".join(filters[column])))
+        return " ".join(parts)
+
+    def _list(self, filters: Dict[str, List[str]]) -> Dict[str, Any]:
+        if self.app_mode == "seller":
+            columns = "solutionName, orgName, industryName, solutionAreaName, solutionDescription"
+        else:
+            columns = "solutionName, industryName, solutionAreaName, geoName, solutionDescription"
+        sql = (f"SELECT DISTINCT TOP {TOP_ROWS} {columns}\nFROM {VIEW}\n"
+               f"WHERE {self._where(filters)}\nORDER BY solutionName")
+        return {
+            "sql": sql,
+            "explanation": f"Approved solutions {self._describe(filters)} (up to {TOP_ROWS}).",
+            "confidence": "high",
+            "template": "list",
+        }
+
+    def _count(self, filters: Dict[str, List[str]]) -> Dict[str, Any]:
+        sql = (f"SELECT COUNT(DISTINCT solutionName) AS solution_count\nFROM {VIEW}\n"
+               f"WHERE {self._where(filters)}")
+        scope = self._describe(filters)
+        return {
+            "sql": sql,
+            "explanation": f"Number of distinct approved solutions{' ' + scope if scope else ''}.",
+            "confidence": "high",
+            "template": "count",
+        }
+
+    def _count_by(self, column: str, filters: Dict[str, List[str]], limit: Optional[int]) -> Dict[str, Any]:
+        top = f"TOP {limit} " if limit else ""
+        sql = (f"SELECT {top}{column}, COUNT(DISTINCT solutionName) AS solution_count\nFROM {VIEW}\n"
+               f"WHERE {self._where(filters)}\nGROUP BY {column}\nORDER BY solution_count DESC")
+        scope = self._describe(filters)
+        return {
+            "sql": sql,
+            "explanation": f"Distinct approved solutions per {column}{' ' + scope if scope else ''}, largest first.",
+            "confidence": "high",
+            "template": "count_by",
+        }
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = dict(self._metrics)
+            by_template = {name: count for name, count in self._by_template.items() if count}
+            unmatched = self._unmatched.most_common(10)
+        route_seconds = metrics.pop("route_seconds")
+        lookups = metrics["routed"] + metrics["fallbacks"]
+        return {
+            "enabled": self.enabled,
+            "vocabulary": {
+                "phrases": len(self.vocabulary.phrases),
+                "partners": self.vocabulary.partner_count,
+                "geos": self.vocabulary.geo_count,
+                "loaded_at": self.loaded_at,
+            },
+            **metrics,
+            "hit_ratio": round(metrics["routed"] / lookups, 3) if lookups else None,
+            "avg_route_us": round(route_seconds / lookups * 1e6, 1) if lookups else None,
+            "by_template": by_template,
+            "top_unmatched_words": dict(unmatched),
+        }
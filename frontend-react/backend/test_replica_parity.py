@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Local replica parity: the same SQL on Azure SQL and on the SQLite replica.
+
+Generates the SQL of every sample question (docs/SAMPLE_QUESTIONS.md and
+test_queries.py, plus the template router's shapes), takes a fresh snapshot
+of the view and runs each statement on both engines. A statement matches when
+both return the same columns and the same rows in any order; with TOP and an
+ORDER BY that has ties, SQL Server and SQLite may legitimately keep different
+rows, which is reported separately. It also reports statements the replica
+sends to Azure SQL (untranslatable) and the time per statement on each engine.
+
+Needs .env (database and, without --templates-only, the NL2SQL model). Exits
+with status 1 when any statement differs.
+
+Usage:
+    python test_replica_parity.py
+    python test_replica_parity.py --templates-only
+    python test_replica_parity.py --show
+"""
+
+import argparse
+import decimal
+import re
+import statistics
+import sys
+import time
+
+from benchmark_semantic_cache import load_questions, percentile
+from benchmark_template_router import SHAPES
+from local_replica import translate
+from nl2sql_pipeline import NL2SQLPipeline
+
+
+def normalized(result):
+    """Columns and rows of an execute_sql result, comparable across engines."""
+    def value(v):
+        if isinstance(v, (float, decimal.Decimal)):
+            return round(float(v), 6)
+        return v.isoformat(sep=" ") if hasattr(v, "isoformat") and not isinstance(v, str) else v
+    columns = [column.lower() for column in result["columns"]]
+    rows = sorted((tuple(value(v) for v in row) for row in result["rows"]), key=repr)
+    return columns, rows
+
+
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--templates-only", action="store_true", help="Only questions the template router answers (no model calls)")
+    parser.add_argument("--show", action="store_true", help="Print every statement and its translation")
+    args = parser.parse_args()
+
+    pipeline = NL2SQLPipeline()
+    replica = pipeline.replica
+    replica.enabled = True
+    pipeline.template_router.enabled = True
+    pipeline.template_router.load()
+    if not replica.snapshot():
+        sys.exit("Could not snapshot the view")
+
+    statements = []
+    for question in SHAPES + load_questions():
+        generated = pipeline.route_template(question) if args.templates_only else pipeline.generate_sql(question)
+        if generated and isinstance(generated.get("sql"), str):
+            sql, error = pipeline.prepare_sql(generated["sql"], pipeline.max_rows)
+            if not error:
+                statements.append((question, sql))
+
+    matched, ties, differ, untranslatable = [], [], [], []
+    local_ms, remote_ms = [], []
+    for question, sql in statements:
+        if translate(sql) is None:
+            untranslatable.append((question, sql))
+            continue
+        local, elapsed = timed(lambda: replica.execute(sql, pipeline.query_guard.budget(pipeline.max_rows, pipeline.query_timeout)))
+        if local is None:
+            untranslatable.append((question, sql))
+            continue
+        local_ms.append(elapsed)
+        replica.enabled = False
+        remote, elapsed = timed(lambda: pipeline._execute_uncached(sql))
+        replica.enabled = True
+        remote_ms.append(elapsed)
+        if remote["error"]:
+            print(f"  Azure SQL error, skipped: {question}: {remote['error']}")
+            continue
+        if normalized(local) == normalized(remote):
+            matched.append((question, sql))
+        elif re.search(r"\bTOP\b", sql, re.I) and local["row_count"] == remote["row_count"] \
+                and normalized(local)[0] == normalized(remote)[0]:
+            ties.append((question, sql))
+        else:
+            differ.append((question, sql, local["row_count"], remote["row_count"]))
+        if args.show:
+            print(f"\n  {question}\n    {sql}\n    -> {translate(sql)}")
+
+    print(f"\n{len(statements)} statements: {len(matched)} identical, {len(ties)} same shape under TOP "
+          f"(ties may keep different rows), {len(differ)} different, {len(untranslatable)} left to Azure SQL")
+    if local_ms:
+        print(f"  local replica  p50 {statistics.median(local_ms):8.2f} ms  p95 {percentile(local_ms, 95):8.2f} ms")
+        print(f"  Azure SQL      p50 {statistics.median(remote_ms):8.2f} ms  p95 {percentile(remote_ms, 95):8.2f} ms")
+    for question, sql, local_rows, remote_rows in differ:
+        print(f"  DIFFERENT ({local_rows} local vs {remote_rows} Azure rows): {question}\n      {sql[:160]!r}")
+    for question, sql in untranslatable:
+        print(f"  Azure SQL only: {question}\n      {sql[:160]!r}")
+    sys.exit(1 if differ else 0)
+
+
+if __name__ == "__main__":
+    main()
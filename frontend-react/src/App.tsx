@@ -16,6 +16,8 @@ function App() {
   const [selectedCategory, setSelectedCategory] = useState<string>('');
   const [appMode, setAppMode] = useState<string>('seller');
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Server-side session key: keeps follow-up context per chat instead of per backend process
+  const conversationIdRef = useRef<string>(crypto.randomUUID());
 
   useEffect(() => {
     // Load example questions
@@ -70,6 +72,38 @@ function App() {
     let narrativeAccumulator = '';
     let metadataResult: Partial<QueryResult> = {};
 
+    // Store result metadata and show table/data immediately
+    const showResults = (event: Record<string, any>, phase: string) => {
+      metadataResult = {
+        success: true,
+        question,
+        intent: event.intent,
+        sql: event.sql as string | undefined,
+        explanation: event.explanation as string | undefined,
+        confidence: event.confidence as string | undefined,
+        insights: event.insights as QueryResult['insights'],
+        columns: event.data?.columns,
+        rows: event.data?.rows,
+        row_count: event.row_count ?? event.data?.rows?.length ?? 0,
+        needs_clarification: event.needs_clarification,
+        clarification_question: event.clarification_question,
+        suggested_refinements: event.suggested_refinements,
+        timestamp: event.timestamp || new Date().toISOString(),
+      };
+      const rowCount = metadataResult.row_count ?? 0;
+      setMessages(prev => prev.map(m =>
+        m.id === assistantId ? {
+          ...m,
+          content: metadataResult.needs_clarification
+            ? 'I need clarification to provide the best results'
+            : `Found ${rowCount} results`,
+          data: metadataResult as QueryResult,
+          isStreaming: true,
+          streamingPhase: phase,
+        } : m
+      ));
+    };
+
     try {
       await executeQueryStream(question, {
         onStatus: (phase, message) => {
@@ -99,34 +133,32 @@ function App() {
             setStreamingStatus('');
             return;
           }
-          // Store metadata and show table/data immediately
-          metadataResult = {
-            success: true,
-            question,
-            intent: event.intent,
-            sql: event.sql as string | undefined,
-            explanation: event.explanation as string | undefined,
-            confidence: event.confidence as string | undefined,
-            insights: event.insights as QueryResult['insights'],
-            columns: event.data?.columns,
-            rows: event.data?.rows,
-            row_count: event.row_count ?? event.data?.rows?.length ?? 0,
-            needs_clarification: event.needs_clarification,
-            clarification_question: event.clarification_question,
-            suggested_refinements: event.suggested_refinements,
-            timestamp: event.timestamp || new Date().toISOString(),
-          };
           setStreamingStatus('Writing response...');
+          showResults(event, 'writing');
+        },
+        onResults: (event) => {
+          // Table is ready — render it while Agent 3 is still analyzing
+          showResults(event, 'analyzing');
+        },
+        onRows: (rows, info) => {
+          // Append each batch as it is fetched; the final batch carries the total
+          const allRows = [...(metadataResult.rows || []), ...rows];
+          metadataResult = { ...metadataResult, rows: allRows, row_count: info.row_count ?? allRows.length };
           const rowCount = metadataResult.row_count ?? 0;
           setMessages(prev => prev.map(m =>
             m.id === assistantId ? {
               ...m,
-              content: metadataResult.needs_clarification
-                ? 'I need clarification to provide the best results'
-                : `Found ${rowCount} results`,
-              data: metadataResult as QueryResult,
-              isStreaming: true,
-              streamingPhase: 'writing',
+              content: `Found ${rowCount}${info.truncated ? '+' : ''} results`,
+              data: { ...m.data!, rows: allRows, row_count: rowCount },
+            } : m
+          ));
+        },
+        onInsights: (insights) => {
+          metadataResult = { ...metadataResult, insights: insights as QueryResult['insights'] };
+          setMessages(prev => prev.map(m =>
+            m.id === assistantId ? {
+              ...m,
+              data: { ...m.data!, insights: insights as QueryResult['insights'] },
             } : m
           ));
         },
@@ -154,6 +186,7 @@ function App() {
                 web_sources: doneData.web_sources,
                 usage_stats: doneData.usage_stats,
                 elapsed_time: doneData.elapsed_time,
+                timings: doneData.timings,
               },
             } : m
           ));
@@ -178,7 +211,7 @@ function App() {
           setIsLoading(false);
           setStreamingStatus('');
         },
-      });
+      }, conversationIdRef.current);
 
       // If stream ended without a done event, finalize
       setIsLoading(false);
@@ -500,6 +533,7 @@ function App() {
   const handleClear = () => {
     if (confirm('Clear all messages?')) {
       setMessages([]);
+      conversationIdRef.current = crypto.randomUUID();
     }
   };
 
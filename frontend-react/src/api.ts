@@ -10,29 +10,80 @@ const api = axios.create({
   },
 });
 
-export const executeQuery = async (question: string): Promise<QueryResult> => {
-  const response = await api.post<QueryResult>('/api/query', { question });
-  return response.data;
+// Results are requested in the columnar wire format (column names sent once,
+// repeated strings dictionary-encoded) and expanded back to row objects here.
+const WIRE_FORMAT = 'columnar';
+
+export const decodeColumnar = (
+  columns: string[],
+  rows: any[][],
+  dictionaries: Record<string, string[]> = {}
+): Record<string, any>[] => {
+  const lookups = columns.map((col) => dictionaries[col]);
+  return rows.map((row) => {
+    const obj: Record<string, any> = {};
+    columns.forEach((col, i) => {
+      const lookup = lookups[i];
+      obj[col] = lookup ? lookup[row[i]] : row[i];
+    });
+    return obj;
+  });
+};
+
+const decodeEventData = (event: Record<string, any>): Record<string, any> => {
+  if (event.format === 'columnar' && event.data) {
+    event.data = {
+      columns: event.data.columns,
+      rows: decodeColumnar(event.data.columns, event.data.rows, event.data.dictionaries),
+    };
+    delete event.format;
+  }
+  return event;
+};
+
+export const executeQuery = async (question: string, conversationId?: string): Promise<QueryResult> => {
+  const response = await api.post<QueryResult>('/api/query', {
+    question,
+    conversation_id: conversationId,
+    format: WIRE_FORMAT,
+  });
+  const result = response.data;
+  if (result.format === 'columnar' && result.columns && result.rows) {
+    result.rows = decodeColumnar(result.columns, result.rows as unknown as any[][], result.dictionaries);
+    result.format = 'rows';
+    delete result.dictionaries;
+  }
+  return result;
 };
 
 export interface StreamCallbacks {
   onStatus: (phase: string, message: string) => void;
-  onMetadata: (data: Record<string, any>) => void;
+  onMetadata: (data: Record<string, any>) => void;  // Clarification requests and errors
+  onResults: (data: Record<string, any>) => void;  // Data table, right after SQL execution
+  onRows: (rows: Record<string, any>[], info: { done?: boolean; row_count?: number; truncated?: boolean }) => void;  // Row batches while fetching
+  onInsights: (insights: Record<string, any>) => void;  // Agent 3 insights
   onDelta: (content: string) => void;
-  onDone: (data: { web_sources?: any[]; usage_stats?: any; elapsed_time?: number }) => void;
+  onDone: (data: { web_sources?: any[]; usage_stats?: any; elapsed_time?: number; timings?: Record<string, number> }) => void;
   onError: (error: string) => void;
 }
 
 export const executeQueryStream = async (
   question: string,
-  callbacks: StreamCallbacks
+  callbacks: StreamCallbacks,
+  conversationId?: string
 ): Promise<void> => {
   const response = await fetch(`${API_BASE_URL}/api/query/stream`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ question }),
+    body: JSON.stringify({ question, conversation_id: conversationId, format: WIRE_FORMAT }),
   });
 
+  if (response.status === 429) {
+    const retryAfter = response.headers.get('Retry-After');
+    callbacks.onError(`The server is busy right now — please try again${retryAfter ? ` in ${retryAfter}s` : ' shortly'}.`);
+    return;
+  }
+
   if (!response.ok || !response.body) {
     callbacks.onError(`HTTP error ${response.status}`);
     return;
@@ -41,6 +92,7 @@ export const executeQueryStream = async (
   const reader = response.body.getReader();
   const decoder = new TextDecoder();
   let buffer = '';
+  let streamColumns: string[] = [];  // Columns of the table that 'rows' batches belong to
 
   while (true) {
     const { done, value } = await reader.read();
@@ -64,7 +116,22 @@ export const executeQueryStream = async (
             callbacks.onStatus(event.phase, event.message);
             break;
           case 'metadata':
-            callbacks.onMetadata(event);
+            callbacks.onMetadata(decodeEventData(event));
+            break;
+          case 'results':
+            callbacks.onResults(decodeEventData(event));
+            streamColumns = event.data?.columns || [];
+            break;
+          case 'rows':
+            callbacks.onRows(
+              event.format === 'columnar'
+                ? decodeColumnar(streamColumns, event.rows, event.dictionaries)
+                : event.rows,
+              { done: event.done, row_count: event.row_count, truncated: event.truncated }
+            );
+            break;
+          case 'insights':
+            callbacks.onInsights(event.insights);
             break;
           case 'delta':
             callbacks.onDelta(event.content);
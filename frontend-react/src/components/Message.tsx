@@ -79,7 +79,7 @@ export default function Message({ message, onFollowUpClick }: MessageProps) {
       <div className="flex-1">
         <div className="bg-slate-800 rounded-lg p-4 border border-slate-700">
           {/* Streaming status indicator */}
-          {isStreaming && phaseInfo && !data?.rows && (
+          {isStreaming && phaseInfo && (!data?.rows || phase === 'analyzing') && (
             <div className="flex items-center gap-3 text-blue-300 mb-3">
               <Loader2 size={18} className="animate-spin" />
               <span className="text-sm font-medium">
@@ -352,7 +352,12 @@ export default function Message({ message, onFollowUpClick }: MessageProps) {
             </span>
           )}
           {data?.elapsed_time && (
-            <span className="text-gray-400">⏱️ {data.elapsed_time}s</span>
+            <span
+              className="text-gray-400"
+              title={data.timings ? Object.entries(data.timings).map(([stage, s]) => `${stage}: ${s.toFixed(2)}s`).join('\n') : undefined}
+            >
+              ⏱️ {data.elapsed_time}s
+            </span>
           )}
         </div>
       </div>
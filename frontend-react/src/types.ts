@@ -50,6 +50,8 @@ export interface QueryResult {
   columns?: string[];
   rows?: Record<string, any>[];
   row_count: number;
+  format?: 'rows' | 'columnar';  // Wire format; api.ts decodes columnar back to rows
+  dictionaries?: Record<string, string[]>;  // Columnar only: column -> distinct values
   web_sources?: WebSource[];  // Web search sources from Agent 4
   error?: string;
   usage_stats?: {
@@ -58,6 +60,7 @@ export interface QueryResult {
     total_tokens: number;
   };
   elapsed_time?: number;  // Time in seconds
+  timings?: Record<string, number>;  // Seconds per pipeline stage
   timestamp: string;
 }
 